@@ -42,11 +42,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'findexapp.middleware.RequestMetricsMiddleware',
+    'findexapp.middleware.NPlusOneMiddleware',
+    'findexapp.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'findexapp.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,7 +83,20 @@ WSGI_APPLICATION = 'findex.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # FINDEX_DATABASE selects another database file, e.g. for benchmarks
+        'NAME': os.environ.get('FINDEX_DATABASE', BASE_DIR / 'db.sqlite3'),
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Use a shared backend (memcached, redis) when running several workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'findex',
     }
 }
 
@@ -143,3 +160,102 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 
 # Custom User Model
 AUTH_USER_MODEL = 'findexapp.User'
+
+# Text extraction for full-text search
+FINDEX_EXTRACT_ON_SAVE = True
+FINDEX_EXTRACTION_MAX_FILE_MB = 200
+FINDEX_EXTRACTION_MAX_CHARS = 2000000  # characters stored per document
+FINDEX_EXTRACTION_MEMORY_LIMIT_MB = 1024  # address space per worker process
+FINDEX_EXTRACTION_WORKERS = 1  # processes per web worker extracting uploads
+
+# Result counts above this value are shown as "1000+" instead of being counted
+FINDEX_COUNT_CAP = 1000
+
+# Seconds facet counts of a filter combination are cached
+FINDEX_FACET_CACHE_TIMEOUT = 60
+
+# Ordered result ids of a search are cached until the next document write
+FINDEX_RESULT_CACHE_TIMEOUT = 300
+FINDEX_RESULT_CACHE_MAX_IDS = 5000
+
+# Seconds sidebar and header data is cached at most (document writes invalidate it)
+FINDEX_COMMON_DATA_TIMEOUT = 300
+
+# Seconds until SystemSettings and reference data changes made by another
+# worker are picked up by the in-process caches
+FINDEX_LOCAL_CACHE_CHECK_INTERVAL = 5
+
+# Request metrics: per-view latency and query statistics, written to the
+# database every FINDEX_METRICS_FLUSH_INTERVAL seconds by each worker
+FINDEX_METRICS_ENABLED = True
+FINDEX_METRICS_FLUSH_INTERVAL = 60
+FINDEX_METRICS_RETENTION_DAYS = 14
+# Who gets the request's timings in a Server-Timing header: 'admin', 'all' or 'off'
+FINDEX_SERVER_TIMING = 'admin'
+
+# /metrics is open to admins and to scrapers sending
+# "Authorization: Bearer <FINDEX_METRICS_TOKEN>". FINDEX_METRICS_ALLOWED_IPS
+# is compared with REMOTE_ADDR, which behind nginx or another local proxy is
+# the proxy's address for every request: only list hosts there when the app
+# server is reached directly
+FINDEX_METRICS_TOKEN = os.environ.get('FINDEX_METRICS_TOKEN')
+FINDEX_METRICS_ALLOWED_IPS = []
+
+# Queries repeated FINDEX_NPLUSONE_THRESHOLD times within one request are
+# reported as N+1 queries: 'log', 'raise' or 'off'
+FINDEX_NPLUSONE = 'log' if DEBUG else 'off'
+FINDEX_NPLUSONE_THRESHOLD = 5
+
+# Admins can profile single requests with ?_profile=1; the newest
+# FINDEX_PROFILE_KEEP profiles are kept in FINDEX_PROFILE_DIR
+FINDEX_PROFILER_ENABLED = True
+FINDEX_PROFILE_DIR = BASE_DIR / 'profiles'
+FINDEX_PROFILE_KEEP = 50
+
+# Document downloads are streamed in chunks of FINDEX_DOWNLOAD_CHUNK_SIZE bytes.
+# FINDEX_DOWNLOAD_OFFLOAD = 'x-accel-redirect' (nginx, internal location at
+# FINDEX_DOWNLOAD_ACCEL_PREFIX aliasing MEDIA_ROOT) or 'x-sendfile' (Apache,
+# lighttpd) lets the web server send the files instead
+FINDEX_DOWNLOAD_CHUNK_SIZE = 256 * 1024
+FINDEX_DOWNLOAD_OFFLOAD = None
+FINDEX_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Batch downloads of at least FINDEX_ARCHIVE_JOB_MIN_FILES files or
+# FINDEX_ARCHIVE_JOB_MIN_MB megabytes are built in the background, with
+# FINDEX_ARCHIVE_COMPRESS_WORKERS threads (None: CPU count, at most 4).
+# Archives are deleted after FINDEX_ARCHIVE_MAX_AGE_HOURS or, oldest first,
+# once they exceed FINDEX_ARCHIVE_DISK_BUDGET_MB together
+FINDEX_ARCHIVE_JOB_MIN_FILES = 200
+FINDEX_ARCHIVE_JOB_MIN_MB = 500
+FINDEX_ARCHIVE_JOB_WORKERS = 2
+FINDEX_ARCHIVE_COMPRESS_WORKERS = None
+FINDEX_ARCHIVE_JOB_TIMEOUT_MINUTES = 120
+FINDEX_ARCHIVE_MAX_AGE_HOURS = 24
+FINDEX_ARCHIVE_DISK_BUDGET_MB = 5120
+
+# Large files are uploaded in resumable chunks of FINDEX_UPLOAD_CHUNK_SIZE
+# bytes (keep below the web server's request size limit); unfinished uploads
+# are deleted after FINDEX_UPLOAD_SESSION_MAX_AGE_HOURS without a new chunk
+FINDEX_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+FINDEX_UPLOAD_SESSION_MAX_AGE_HOURS = 48
+
+# Statements slower than FINDEX_SLOW_QUERY_MS are logged as JSON and kept in
+# the SlowQuery table (newest FINDEX_SLOW_QUERY_MAX_ROWS); 0 disables the log
+FINDEX_SLOW_QUERY_MS = 200
+FINDEX_SLOW_QUERY_MAX_ROWS = 10000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'findexapp.slow_queries.JsonFormatter'},
+    },
+    'handlers': {
+        'slow_queries': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'findexapp.slow_queries': {
+            'handlers': ['slow_queries'], 'level': 'INFO', 'propagate': False,
+        },
+    },
+}
@@ -2,8 +2,10 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (
     User, Project, DocType, ExportControl, Document, 
-    BarcodeRange, BarcodeAssignment, SystemSettings, UserActivity
+    BarcodeRange, BarcodeAssignment, SystemSettings, UserActivity, RequestMetric, SlowQuery,
+    ArchiveJob, Blob, UploadSession
 )
+from . import search
 
 
 @admin.register(User)
@@ -74,7 +76,7 @@ class DocumentAdmin(admin.ModelAdmin):
     )
     ordering = ('-uploaded_at',)
     readonly_fields = (
-        'uploaded_at', 'updated_at', 'file_size', 'file_type'
+        'uploaded_at', 'updated_at', 'file_size', 'file_type', 'original_filename', 'blob'
     )
     
     fieldsets = (
@@ -95,11 +97,17 @@ class DocumentAdmin(admin.ModelAdmin):
         ('Metadata', {
             'fields': (
                 'uploaded_by', 'uploaded_at', 'updated_at', 
-                'file_size', 'file_type'
+                'file_size', 'file_type', 'original_filename', 'blob'
             ),
             'classes': ('collapse',)
         }),
     )
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Use the FTS index instead of an icontains scan over search_fields"""
+        if search_term.strip() and search.fts_available():
+            return search.search_documents(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(BarcodeRange)
@@ -156,3 +164,91 @@ class UserActivityAdmin(admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         """Disable editing of activity logs"""
         return False
+
+
+@admin.register(RequestMetric)
+class RequestMetricAdmin(admin.ModelAdmin):
+    """Admin configuration for RequestMetric model"""
+    list_display = (
+        'view_name', 'period_end', 'requests', 'total_time_ms', 'queries', 'p95_ms'
+    )
+    list_filter = ('period_end',)
+    search_fields = ('view_name',)
+    ordering = ('-period_end',)
+
+    def has_add_permission(self, request):
+        """Metrics are written by the middleware only"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Admin configuration for SlowQuery model"""
+    list_display = ('timestamp', 'duration_ms', 'view_name', 'origin', 'sql')
+    list_filter = ('view_name',)
+    search_fields = ('sql', 'view_name', 'origin', 'path')
+    ordering = ('-timestamp',)
+    date_hierarchy = 'timestamp'
+
+    def has_add_permission(self, request):
+        """Entries are written by the middleware only"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchiveJob)
+class ArchiveJobAdmin(admin.ModelAdmin):
+    """Admin configuration for ArchiveJob model"""
+    list_display = (
+        'id', 'status', 'created_by', 'created_at', 'finished_at', 'total_files', 'archive_size'
+    )
+    list_filter = ('status', 'created_at')
+    readonly_fields = (
+        'key', 'status', 'document_ids', 'created_by', 'created_at', 'finished_at',
+        'total_files', 'processed_files', 'archive_file', 'archive_size', 'error'
+    )
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        """Jobs are created by batch downloads only"""
+        return False
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    """Admin configuration for UploadSession model"""
+    list_display = ('id', 'filename', 'size', 'status', 'created_by', 'created_at', 'completed_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = (
+        'created_by', 'filename', 'size', 'chunk_size', 'status', 'document',
+        'created_at', 'completed_at'
+    )
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        """Sessions are opened by the upload page only"""
+        return False
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    """Admin configuration for Blob model"""
+    list_display = ('sha256', 'size', 'ref_count', 'created_at')
+    search_fields = ('sha256',)
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        """Blobs are created by uploads only"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        """Blobs are deleted with their last document"""
+        return False
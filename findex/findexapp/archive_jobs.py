@@ -0,0 +1,229 @@
+"""
+Background archive jobs.
+
+batch_download hands selections of ``FINDEX_ARCHIVE_JOB_MIN_FILES`` files or
+``FINDEX_ARCHIVE_JOB_MIN_MB`` megabytes and more to ``create_job`` instead
+of streaming them. The job runs in a thread of the worker process: a pool
+of ``FINDEX_ARCHIVE_COMPRESS_WORKERS`` threads compresses the members, then
+the archive is assembled in MEDIA_ROOT/archives. The browser polls the job
+and downloads the archive once it is done.
+
+An identical selection of the same user reuses a pending or running job,
+or a finished one whose documents have not changed since. Jobs are only
+shown to the user who created them and to staff. ``expire_archives`` deletes
+archives older than ``FINDEX_ARCHIVE_MAX_AGE_HOURS`` and then the oldest
+ones until the rest fit into ``FINDEX_ARCHIVE_DISK_BUDGET_MB``; jobs cut
+off by a worker restart count as failed after
+``FINDEX_ARCHIVE_JOB_TIMEOUT_MINUTES`` and lose their partial files. It runs
+when a job is created, every few minutes from status requests and from the
+``expire_archives`` command, e.g. hourly from cron.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from . import prometheus
+from .archives import archive_name, compress_member, member_name, write_zip
+from .models import ArchiveJob, Document
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress updates in the database
+PROGRESS_INTERVAL = 1.0
+
+# Seconds between expiry runs triggered by status requests
+EXPIRY_INTERVAL = 300
+
+_expired_at = float('-inf')
+_expiry_lock = threading.Lock()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _job_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'FINDEX_ARCHIVE_JOB_WORKERS', 2),
+                thread_name_prefix='findex-archive',
+            )
+    return _executor
+
+
+def compress_workers():
+    return getattr(settings, 'FINDEX_ARCHIVE_COMPRESS_WORKERS', None) or min(os.cpu_count() or 1, 4)
+
+
+def needs_job(documents):
+    """Whether a selection is too large to be streamed within one request"""
+    total = sum(document.file_size or 0 for document in documents)
+    return (
+        len(documents) >= getattr(settings, 'FINDEX_ARCHIVE_JOB_MIN_FILES', 200)
+        or total >= getattr(settings, 'FINDEX_ARCHIVE_JOB_MIN_MB', 500) * 1024 * 1024
+    )
+
+
+def selection_key(document_ids, user):
+    ids = ','.join(str(pk) for pk in sorted(set(document_ids)))
+    return hashlib.sha256(f'{user.pk}:{ids}'.encode('ascii')).hexdigest()
+
+
+def find_reusable(key, document_ids):
+    """Unfinished job or still valid archive for the same selection"""
+    job = ArchiveJob.objects.filter(key=key, status__in=['pending', 'running']).first()
+    if job is not None:
+        return job
+    job = ArchiveJob.objects.filter(key=key, status='done').first()
+    if job is None:
+        return None
+    state = Document.objects.filter(id__in=document_ids).aggregate(
+        count=Count('id'), changed=Max('updated_at')
+    )
+    if state['count'] == len(document_ids) and (state['changed'] is None or state['changed'] <= job.created_at):
+        return job
+    return None
+
+
+def create_job(documents, user):
+    """Job building the archive of ``documents``; returns (job, created)"""
+    expire_archives()
+    document_ids = sorted({document.pk for document in documents})
+    key = selection_key(document_ids, user)
+    job = find_reusable(key, document_ids)
+    if job is not None:
+        return job, False
+
+    try:
+        with transaction.atomic():
+            job = ArchiveJob.objects.create(
+                key=key, document_ids=document_ids, created_by=user, total_files=len(document_ids)
+            )
+    except IntegrityError:
+        # A simultaneous request created the job first (archivejob_active_key_unique)
+        return ArchiveJob.objects.get(key=key, status__in=['pending', 'running']), False
+    transaction.on_commit(lambda: _job_executor().submit(_run_in_thread, job.pk))
+    return job, True
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        connection.close()
+
+
+def run_job(job_id):
+    """Build the archive of one job"""
+    start = time.perf_counter()
+    try:
+        job = ArchiveJob.objects.get(pk=job_id)
+        job.status = 'running'
+        job.save(update_fields=['status'])
+        _build(job)
+    except Exception as error:
+        logger.exception('Archive job %s failed', job_id)
+        ArchiveJob.objects.filter(pk=job_id).update(
+            status='failed', error=str(error)[:1000], finished_at=timezone.now()
+        )
+    finally:
+        prometheus.ARCHIVE_DURATION.observe(time.perf_counter() - start, 'archive_job')
+
+
+def _build(job):
+    used = set()
+    files = []
+    for document in Document.objects.filter(id__in=job.document_ids).select_related('project'):
+        if document.document_file and os.path.isfile(document.document_file.path):
+            files.append((document.document_file.path, archive_name(member_name(document), used)))
+
+    name = f'archives/{job.pk}/FINDEX_Documents_{timezone.localtime():%Y%m%d_%H%M%S}.zip'
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    workdir = tempfile.mkdtemp(dir=os.path.dirname(path))
+    try:
+        members = [None] * len(files)
+        pool = ThreadPoolExecutor(max_workers=compress_workers(), thread_name_prefix='findex-compress')
+        try:
+            futures = {
+                pool.submit(compress_member, file_path, member, workdir): index
+                for index, (file_path, member) in enumerate(files)
+            }
+            reported = time.monotonic()
+            for done, future in enumerate(as_completed(futures), 1):
+                members[futures[future]] = future.result()
+                if time.monotonic() - reported >= PROGRESS_INTERVAL:
+                    ArchiveJob.objects.filter(pk=job.pk).update(processed_files=done)
+                    reported = time.monotonic()
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+        with open(path, 'wb') as target:
+            write_zip(target, members)
+    except BaseException:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        raise
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ArchiveJob.objects.filter(pk=job.pk).update(
+        status='done', total_files=len(files), processed_files=len(files), archive_file=name,
+        archive_size=os.path.getsize(path), finished_at=timezone.now(),
+    )
+
+
+def expire_archives_periodically():
+    """expire_archives() at most once per EXPIRY_INTERVAL in this process"""
+    global _expired_at
+    with _expiry_lock:
+        if time.monotonic() - _expired_at < EXPIRY_INTERVAL:
+            return
+        _expired_at = time.monotonic()
+    expire_archives()
+
+
+def _job_dir(job):
+    return default_storage.path(f'archives/{job.pk}')
+
+
+def _expire(job):
+    shutil.rmtree(_job_dir(job), ignore_errors=True)
+    job.status = 'expired'
+    job.archive_file = ''
+    job.save(update_fields=['status', 'archive_file'])
+
+
+def expire_archives():
+    """Delete archives beyond their age or the disk budget; returns the number deleted"""
+    now = timezone.now()
+    timeout = timedelta(minutes=getattr(settings, 'FINDEX_ARCHIVE_JOB_TIMEOUT_MINUTES', 120))
+    # Cut off by a worker restart; their half-built member files go with them
+    for job in ArchiveJob.objects.filter(status__in=['pending', 'running'], created_at__lt=now - timeout):
+        shutil.rmtree(_job_dir(job), ignore_errors=True)
+        ArchiveJob.objects.filter(pk=job.pk).update(status='failed', error='Zeitüberschreitung', finished_at=now)
+
+    cutoff = now - timedelta(hours=getattr(settings, 'FINDEX_ARCHIVE_MAX_AGE_HOURS', 24))
+    budget = getattr(settings, 'FINDEX_ARCHIVE_DISK_BUDGET_MB', 5120) * 1024 * 1024
+    expired = 0
+    total = 0
+    # Newest first, so the oldest archives go once the budget is exceeded
+    for job in ArchiveJob.objects.filter(status='done').order_by('-finished_at'):
+        total += job.archive_size
+        if job.finished_at < cutoff or total > budget:
+            _expire(job)
+            expired += 1
+    return expired
@@ -0,0 +1,208 @@
+"""
+Streaming ZIP archives.
+
+``stream_zip`` yields an archive piece by piece while it reads the files,
+so memory use stays flat however many documents are selected and the
+first bytes go out at once. zipfile writes into a buffer it cannot seek
+in, which makes it emit a data descriptor after each entry instead of
+going back to patch the local header; entries above 4 GiB and archives
+with more than 65535 entries use ZIP64. Formats that are compressed
+already are stored, everything else is deflated.
+
+Archive jobs compress their members in parallel instead: ``compress_member``
+deflates one file into a temporary file (zlib releases the GIL, so threads
+suffice) and ``write_zip`` copies the results into the final archive,
+writing the headers itself since zipfile cannot take compressed data.
+"""
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+import zlib
+
+from django.conf import settings
+
+
+# Deflating these costs time and gains nothing
+STORED_EXTENSIONS = {
+    'pdf', 'docx', 'xlsx', 'pptx', 'jpg', 'jpeg', 'png', 'gif', 'zip', '7z', 'gz',
+}
+
+
+class _Buffer:
+    """Write-only file object; without tell() zipfile streams"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def archive_name(name, used):
+    """``name`` without path separators, made unique among ``used`` (ignoring case)"""
+    name = name.replace('/', '_').replace('\\', '_').strip() or 'dokument'
+    stem, extension = os.path.splitext(name)
+    candidate, number = name, 1
+    while candidate.lower() in used:
+        number += 1
+        candidate = f'{stem} ({number}){extension}'
+    used.add(candidate.lower())
+    return candidate
+
+
+def member_name(document):
+    """Name of a document in archives, before archive_name makes it unique"""
+    return f"{document.project.name}_{document.primary_title}_{document.version}.{document.file_type}"
+
+
+def compression_for(name):
+    extension = os.path.splitext(name)[1].lower().lstrip('.')
+    return zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(files):
+    """Yield a ZIP archive of ``files``, (path, name) pairs; missing files are skipped"""
+    chunk_size = getattr(settings, 'FINDEX_DOWNLOAD_CHUNK_SIZE', 256 * 1024)
+    buffer = _Buffer()
+    used = set()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for path, name in files:
+            if not os.path.isfile(path):
+                continue
+            info = zipfile.ZipInfo.from_file(path, archive_name(name, used), strict_timestamps=False)
+            info.compress_type = compression_for(info.filename)
+            # from_file set file_size, so zipfile knows whether ZIP64 is needed
+            with open(path, 'rb') as source, archive.open(info, 'w') as entry:
+                while chunk := source.read(chunk_size):
+                    entry.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+
+
+class Member:
+    """A file compressed ahead of time, ready to be copied into an archive"""
+
+    def __init__(self, name, data_path, method, crc, size, compressed_size, mtime, temporary):
+        self.name = name
+        self.data_path = data_path
+        self.method = method
+        self.crc = crc
+        self.size = size
+        self.compressed_size = compressed_size
+        self.mtime = mtime
+        # data_path is a temporary file to delete once copied
+        self.temporary = temporary
+
+
+def compress_member(path, name, directory):
+    """Deflate ``path`` into a temporary file in ``directory``; stored formats are only checksummed"""
+    chunk_size = getattr(settings, 'FINDEX_DOWNLOAD_CHUNK_SIZE', 256 * 1024)
+    method = compression_for(name)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if method == zipfile.ZIP_DEFLATED else None
+    crc = size = 0
+    target = tempfile.NamedTemporaryFile(dir=directory, delete=False) if compressor else None
+    try:
+        with open(path, 'rb') as source:
+            while chunk := source.read(chunk_size):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                if compressor:
+                    target.write(compressor.compress(chunk))
+        if compressor:
+            target.write(compressor.flush())
+            target.close()
+    except BaseException:
+        if target:
+            target.close()
+            os.unlink(target.name)
+        raise
+    if not compressor:
+        return Member(name, path, method, crc, size, size, os.path.getmtime(path), False)
+    return Member(
+        name, target.name, method, crc, size, os.path.getsize(target.name),
+        os.path.getmtime(path), True,
+    )
+
+
+def _dos_time(timestamp):
+    moment = time.localtime(timestamp)
+    if moment.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return (
+        (moment.tm_hour << 11) | (moment.tm_min << 5) | (moment.tm_sec // 2),
+        ((moment.tm_year - 1980) << 9) | (moment.tm_mon << 5) | moment.tm_mday,
+    )
+
+
+def _zip64_extra(*values):
+    return struct.pack(f'<HH{len(values)}Q', 0x0001, 8 * len(values), *values)
+
+
+def write_zip(target, members):
+    """Write ``members`` (compress_member results) as a ZIP archive to the open file ``target``"""
+    central = []
+    for member in members:
+        offset = target.tell()
+        name = member.name.encode('utf-8')
+        flags = 0 if member.name.isascii() else 0x800
+        dos_time, dos_date = _dos_time(member.mtime)
+
+        large = member.size >= ZIP64_LIMIT or member.compressed_size >= ZIP64_LIMIT
+        extra = _zip64_extra(member.size, member.compressed_size) if large else b''
+        version = 45 if large or offset >= ZIP64_LIMIT else 20
+        target.write(struct.pack(
+            '<IHHHHHIIIHH', 0x04034B50, version, flags, member.method, dos_time, dos_date,
+            member.crc, ZIP64_LIMIT if large else member.compressed_size,
+            ZIP64_LIMIT if large else member.size, len(name), len(extra),
+        ))
+        target.write(name + extra)
+        with open(member.data_path, 'rb') as data:
+            shutil.copyfileobj(data, target, 1024 * 1024)
+        if member.temporary:
+            os.unlink(member.data_path)
+
+        # The central directory lists only the values that overflow
+        overflow = [value for value in (member.size, member.compressed_size, offset) if value >= ZIP64_LIMIT]
+        extra = _zip64_extra(*overflow) if overflow else b''
+        central.append(struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014B50, (3 << 8) | version, version, flags, member.method,
+            dos_time, dos_date, member.crc, min(member.compressed_size, ZIP64_LIMIT),
+            min(member.size, ZIP64_LIMIT), len(name), len(extra), 0, 0, 0, 0o100644 << 16,
+            min(offset, ZIP64_LIMIT),
+        ) + name + extra)
+
+    start = target.tell()
+    for record in central:
+        target.write(record)
+    size = target.tell() - start
+    count = len(central)
+
+    if count >= ZIP_MAX_ENTRIES or start >= ZIP64_LIMIT or size >= ZIP64_LIMIT:
+        end64 = target.tell()
+        target.write(struct.pack(
+            '<IQHHIIQQQQ', 0x06064B50, 44, 45, 45, 0, 0, count, count, size, start
+        ))
+        target.write(struct.pack('<IIQI', 0x07064B50, 0, end64, 1))
+    target.write(struct.pack(
+        '<IHHHHIIH', 0x06054B50, 0, 0, min(count, ZIP_MAX_ENTRIES), min(count, ZIP_MAX_ENTRIES),
+        min(size, ZIP64_LIMIT), min(start, ZIP64_LIMIT), 0,
+    ))
@@ -0,0 +1,249 @@
+"""
+Endpoint benchmarks.
+
+``run_benchmark`` drives the real URL routes through the Django test client
+as a logged-in admin. Per endpoint it measures latency percentiles over
+repeated requests, the number and duration of database queries, the
+response size and the peak Python memory of one request (tracemalloc).
+Everything runs inside a transaction that is rolled back, so activity rows
+written by downloads do not accumulate from run to run, and with a
+temporary MEDIA_ROOT for the placeholder files downloads need.
+
+Results are plain dicts meant to be written as JSON; ``compare`` lists the
+endpoints that became slower or issue more queries than in an earlier run.
+"""
+import math
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import suggest
+from .counters import counts_by, global_counts
+from .metrics import QueryRecorder
+from .models import Document, Project, User, UserActivity
+
+
+BENCHMARK_USER = 'benchmark'
+BATCH_SIZE = 20
+
+
+class Endpoint:
+    def __init__(self, name, url, data=None, method='get'):
+        self.name = name
+        self.url = url
+        self.data = data or {}
+        self.method = method
+
+
+def _placeholder_file(document):
+    """Downloads need a file; synthetic documents may not have one"""
+    path = os.path.join(settings.MEDIA_ROOT, document.document_file.name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as handle:
+            handle.truncate(document.file_size or 1024)
+
+
+def endpoints():
+    """The benchmarked routes, with parameters picked from the current data"""
+    documents = list(Document.objects.filter(is_active=True).order_by('-uploaded_at')[:BATCH_SIZE])
+    if not documents:
+        raise ValueError('The database contains no active documents')
+    for document in documents:
+        _placeholder_file(document)
+    sample = documents[0]
+
+    project_totals = counts_by('project')
+    project_id = max(project_totals, key=lambda pk: project_totals[pk][0], default=sample.project_id)
+    if not Project.objects.filter(pk=project_id).exists():
+        project_id = sample.project_id
+
+    date_from = (timezone.now() - timedelta(days=30)).date().isoformat()
+    search_term = sample.primary_title.split()[-1]
+
+    return [
+        Endpoint('dashboard', reverse('dashboard')),
+        Endpoint('document_list', reverse('document_list')),
+        Endpoint('document_list_filtered', reverse('document_list'), {
+            'project': project_id, 'is_active': 'true', 'date_from': date_from,
+        }),
+        Endpoint('document_list_search', reverse('document_list'), {'search_query': search_term}),
+        Endpoint('search_suggest', reverse('api_search_suggest'), {'q': search_term[:4]}),
+        Endpoint('project_documents', reverse('project_documents', args=[project_id])),
+        Endpoint('document_detail', reverse('document_detail', args=[sample.pk])),
+        Endpoint('document_download', reverse('document_download', args=[sample.pk])),
+        Endpoint('api_document_stats', reverse('api_document_stats')),
+        Endpoint('batch_download', reverse('batch_download'), {
+            'document_ids': [document.pk for document in documents],
+        }, method='post'),
+        Endpoint('export_documents', reverse('export_documents')),
+        Endpoint('barcode_assign', reverse('barcode_assign')),
+    ]
+
+
+ENDPOINT_NAMES = [
+    'dashboard', 'document_list', 'document_list_filtered', 'document_list_search',
+    'search_suggest', 'project_documents', 'document_detail', 'document_download', 'api_document_stats',
+    'batch_download', 'export_documents', 'barcode_assign',
+]
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    index = max(0, math.ceil(fraction * len(samples)) - 1)
+    return round(samples[min(index, len(samples) - 1)], 2)
+
+
+def _request(client, endpoint):
+    response = getattr(client, endpoint.method)(endpoint.url, endpoint.data)
+    # Streaming responses do their work while being consumed
+    body = b''.join(response.streaming_content) if response.streaming else response.content
+    return response.status_code, len(body)
+
+
+def _clear_caches():
+    cache.clear()
+    suggest.clear_caches()
+
+
+def measure(client, endpoint, repeat, warmup, cold):
+    for _ in range(warmup):
+        _request(client, endpoint)
+
+    timings, queries, db_time = [], [], []
+    for _ in range(repeat):
+        if cold:
+            _clear_caches()
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            status, size = _request(client, endpoint)
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(recorder.count)
+        db_time.append(recorder.duration * 1000)
+
+    if cold:
+        _clear_caches()
+    tracemalloc.start()
+    try:
+        _request(client, endpoint)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'method': endpoint.method.upper(),
+        'path': endpoint.url,
+        'status': status,
+        'requests': repeat,
+        'mean_ms': round(sum(timings) / repeat, 2),
+        'min_ms': round(timings[0], 2),
+        'p50_ms': percentile(timings, 0.50),
+        'p95_ms': percentile(timings, 0.95),
+        'p99_ms': percentile(timings, 0.99),
+        'max_ms': round(timings[-1], 2),
+        'queries': max(queries),
+        'db_ms': round(sum(db_time) / repeat, 2),
+        'response_kb': round(size / 1024, 1),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(names=None, repeat=20, warmup=2, cold=False, progress=None):
+    """
+    Benchmark the endpoints in ``names`` (all by default).
+
+    ``progress`` is called with each endpoint name and its result.
+    """
+    repeat = max(1, repeat)
+    user, _ = User.objects.get_or_create(
+        username=BENCHMARK_USER,
+        defaults={'role': 'admin', 'must_change_password': False, 'is_staff': True},
+    )
+    total, active = global_counts()
+    run = {
+        'created': timezone.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'documents': total,
+        'active_documents': active,
+        'activities': UserActivity.objects.count(),
+        'repeat': repeat,
+        'warmup': warmup,
+        'cold': cold,
+        'endpoints': {},
+    }
+
+    media_root = tempfile.mkdtemp(prefix='findex-benchmark-')
+    try:
+        with override_settings(
+            DEBUG=False, ALLOWED_HOSTS=['testserver'], FINDEX_NPLUSONE='off', MEDIA_ROOT=media_root,
+        ), transaction.atomic():
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            for endpoint in endpoints():
+                if names and endpoint.name not in names:
+                    continue
+                result = measure(client, endpoint, repeat, warmup, cold)
+                run['endpoints'][endpoint.name] = result
+                if progress:
+                    progress(endpoint.name, result)
+            transaction.set_rollback(True)
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+    return run
+
+
+def compare(previous_runs, current_runs, tolerance=0.2, min_difference_ms=2.0):
+    """
+    Regressions of ``current_runs`` against ``previous_runs``.
+
+    Runs are matched by document count. An endpoint regressed when its p95
+    latency grew by more than ``tolerance`` (and ``min_difference_ms``, to
+    ignore noise on fast endpoints) or when it issues more queries.
+    Returns (documents, endpoint, metric, before, after) tuples.
+    """
+    previous_by_size = {run['documents']: run for run in previous_runs}
+    regressions = []
+    for run in current_runs:
+        previous = previous_by_size.get(run['documents'])
+        if previous is None:
+            continue
+        for name, result in run['endpoints'].items():
+            before = previous['endpoints'].get(name)
+            if before is None:
+                continue
+            if (result['p95_ms'] > before['p95_ms'] * (1 + tolerance)
+                    and result['p95_ms'] - before['p95_ms'] >= min_difference_ms):
+                regressions.append((run['documents'], name, 'p95_ms', before['p95_ms'], result['p95_ms']))
+            if result['queries'] > before['queries']:
+                regressions.append((run['documents'], name, 'queries', before['queries'], result['queries']))
+            if result['status'] != before['status']:
+                regressions.append((run['documents'], name, 'status', before['status'], result['status']))
+    return regressions
@@ -0,0 +1,23 @@
+"""System checks of the deployment configuration"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Search results, facets and suggestions are cached in the default cache"""
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        'The default cache is local to each process.',
+        hint='With several workers, every worker computes and stores its own copy '
+             'of cached search results and facets. Use Redis or Memcached for '
+             'CACHES["default"] to share them.',
+        id='findexapp.W001',
+    )]
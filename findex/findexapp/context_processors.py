@@ -1,35 +1,74 @@
-from django.db.models import Count
+import copy
+
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from datetime import timedelta
-from .models import Project, Document, SystemSettings
+from .counters import counts_by, global_counts
+from .models import Project, Document
+from .reference_data import all_objects
+from .system_settings import get_setting
+from .versioning import get_version
+
+
+def _cached(name, compute):
+    """Cache ``compute()`` until the next document or project write"""
+    key = f'findex:common:{get_version()}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, getattr(settings, 'FINDEX_COMMON_DATA_TIMEOUT', 300))
+    return value
+
+
+def document_totals():
+    """Total and active document counts as a dict"""
+    def compute():
+        total, active = global_counts()
+        return {'total': total, 'active': active}
+    return _cached('totals', compute)
+
+
+def sidebar_projects():
+    """Active projects with their document count, alphabetically sorted"""
+    def compute():
+        counts = counts_by('project')
+        # Copies, the cached reference data instances are shared
+        projects = [copy.copy(project) for project in all_objects(Project, active_only=True)]
+        for project in projects:
+            project.document_count = counts.get(project.pk, (0, 0))[0]
+        return projects
+    return _cached('projects', compute)
+
+
+def recent_uploads():
+    """The five newest uploads within the configured recent period"""
+    recent_days = get_setting('recent_upload_days')
+
+    def compute():
+        recent_date = timezone.now() - timedelta(days=recent_days)
+        return list(Document.objects.filter(
+            uploaded_at__gte=recent_date
+        ).select_related('project', 'doc_type', 'uploaded_by').order_by('-uploaded_at')[:5])
+    return _cached(f'recent_uploads:{recent_days}', compute)
 
 
 def common_data(request):
     """
     Context processor to provide common data to all templates
+
+    All values are lazy, so pages that do not show the sidebar or header
+    statistics do not query anything.
     """
     if not request.user.is_authenticated:
         return {}
-    
-    # Get all projects for sidebar navigation (alphabetically sorted)
-    all_projects = Project.objects.filter(is_active=True).annotate(
-        document_count=Count('document')
-    ).order_by('name')
-    
-    # Get statistics for header
-    total_documents = Document.objects.count()
-    active_documents = Document.objects.filter(is_active=True).count()
-    
-    # Get recent uploads for sidebar
-    recent_days = int(SystemSettings.get_setting('recent_upload_days', 7))
-    recent_date = timezone.now() - timedelta(days=recent_days)
-    recent_uploads = Document.objects.filter(
-        uploaded_at__gte=recent_date
-    ).select_related('project', 'doc_type', 'uploaded_by').order_by('-uploaded_at')[:5]
-    
+
+    totals = SimpleLazyObject(document_totals)
+
     return {
-        'all_projects': all_projects,
-        'total_documents': total_documents,
-        'active_documents': active_documents,
-        'recent_uploads': recent_uploads,
-    } 
\ No newline at end of file
+        'all_projects': SimpleLazyObject(sidebar_projects),
+        'total_documents': SimpleLazyObject(lambda: totals['total']),
+        'active_documents': SimpleLazyObject(lambda: totals['active']),
+        'recent_uploads': SimpleLazyObject(recent_uploads),
+    }
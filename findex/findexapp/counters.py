@@ -0,0 +1,138 @@
+"""
+Denormalized document counters.
+
+DocumentCounter keeps total and active document counts globally and per
+project, doc type and export control, so statistics are single row reads
+instead of COUNT queries. Document.save/delete and the QuerySet's update,
+delete and bulk_create adjust them in the same transaction as the write.
+``reconcile`` recomputes everything from the document
+table and repairs drift.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Q
+
+from .models import COUNTED_FIELDS, Document, DocumentCounter
+
+
+GLOBAL = 'global'
+
+# Counter scope -> document column
+SCOPES = {
+    'project': 'project_id',
+    'doc_type': 'doc_type_id',
+    'export_control': 'export_control_id',
+}
+
+
+def _counter_keys(state):
+    values = dict(zip(COUNTED_FIELDS, state))
+    return [(GLOBAL, 0)] + [(scope, values[column]) for scope, column in SCOPES.items()]
+
+
+def _apply(deltas):
+    """Add {(scope, object_id): [total, active]} to the stored counters"""
+    deltas = {key: value for key, value in deltas.items() if value[0] or value[1]}
+    # Missing counters are created in one statement instead of a lookup each
+    DocumentCounter.objects.bulk_create(
+        [DocumentCounter(scope=scope, object_id=object_id) for scope, object_id in deltas],
+        ignore_conflicts=True,
+    )
+    for (scope, object_id), (total, active) in deltas.items():
+        DocumentCounter.objects.filter(scope=scope, object_id=object_id).update(
+            total=F('total') + total, active=F('active') + active
+        )
+
+
+def _add(deltas, state, sign, count=1):
+    is_active = state[COUNTED_FIELDS.index('is_active')]
+    for key in _counter_keys(state):
+        deltas[key][0] += sign * count
+        deltas[key][1] += sign * count if is_active else 0
+
+
+def document_changed(previous, current):
+    """Move one document from the ``previous`` to the ``current`` counted state"""
+    if previous == current:
+        return
+    deltas = defaultdict(lambda: [0, 0])
+    if previous is not None:
+        _add(deltas, previous, -1)
+    if current is not None:
+        _add(deltas, current, 1)
+    _apply(deltas)
+
+
+def group_counts(queryset):
+    """{counted state: number of documents} of a queryset"""
+    rows = queryset.order_by().values_list(*COUNTED_FIELDS).annotate(n=Count('id'))
+    return {row[:-1]: row[-1] for row in rows}
+
+
+def documents_regrouped(before, after):
+    """Apply the difference of two group_counts() results"""
+    deltas = defaultdict(lambda: [0, 0])
+    for state, count in before.items():
+        _add(deltas, state, -1, count)
+    for state, count in after.items():
+        _add(deltas, state, 1, count)
+    _apply(deltas)
+
+
+def global_counts():
+    """(total, active) of all documents"""
+    counter = DocumentCounter.objects.filter(scope=GLOBAL, object_id=0).first()
+    return (counter.total, counter.active) if counter else (0, 0)
+
+
+def counts_by(scope):
+    """{object id: (total, active)} for one scope"""
+    return {
+        object_id: (total, active)
+        for object_id, total, active in DocumentCounter.objects.filter(
+            scope=scope
+        ).values_list('object_id', 'total', 'active')
+    }
+
+
+def _expected_counts():
+    expected = {(GLOBAL, 0): Document.objects.aggregate(
+        total=Count('id'), active=Count('id', filter=Q(is_active=True))
+    )}
+    for scope, column in SCOPES.items():
+        rows = Document.objects.order_by().values(column).annotate(
+            total=Count('id'), active=Count('id', filter=Q(is_active=True))
+        )
+        for row in rows:
+            expected[(scope, row[column])] = {'total': row['total'], 'active': row['active']}
+    return expected
+
+
+def reconcile(dry_run=False):
+    """
+    Recompute all counters from the document table.
+
+    Returns a list of (scope, object_id, stored, expected) tuples for every
+    counter that was wrong, with stored/expected as (total, active).
+    """
+    expected = _expected_counts()
+    stored = {
+        (counter.scope, counter.object_id): counter
+        for counter in DocumentCounter.objects.all()
+    }
+
+    drift = []
+    for key in set(expected) | set(stored):
+        values = expected.get(key, {'total': 0, 'active': 0})
+        target = (values['total'], values['active'])
+        counter = stored.get(key)
+        current = (counter.total, counter.active) if counter else (0, 0)
+        if current == target:
+            continue
+        drift.append((key[0], key[1], current, target))
+        if not dry_run:
+            DocumentCounter.objects.update_or_create(
+                scope=key[0], object_id=key[1],
+                defaults={'total': target[0], 'active': target[1]}
+            )
+    return drift
@@ -0,0 +1,156 @@
+"""
+Streaming file downloads.
+
+``serve_file`` sends a stored file in chunks of
+``FINDEX_DOWNLOAD_CHUNK_SIZE`` bytes instead of reading it into memory. It
+answers a single ``Range`` (resumed downloads, PDF previews) with 206,
+sends ``ETag`` and ``Last-Modified`` and answers conditional requests with
+304. The ETag is the content hash for files in content-addressed storage
+and is derived from size and modification time otherwise.
+
+With ``FINDEX_DOWNLOAD_OFFLOAD`` set to ``'x-accel-redirect'`` (nginx) or
+``'x-sendfile'`` (Apache mod_xsendfile, lighttpd) Django only checks
+permissions and logs; the web server sends the file and handles ranges
+itself. nginx needs an ``internal`` location at
+``FINDEX_DOWNLOAD_ACCEL_PREFIX`` that aliases ``MEDIA_ROOT``.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from . import prometheus
+from .storage import blob_digest
+
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def validators(stat, digest=None):
+    """(ETag, Last-Modified timestamp) of a file from its hash or its size and mtime"""
+    etag = f'"{digest}"' if digest else f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    return etag, int(stat.st_mtime)
+
+
+def parse_range(header, size):
+    """
+    Inclusive (start, end) of a ``bytes=`` range header.
+
+    Returns None for headers to ignore (malformed, several ranges), which
+    means sending the whole file; raises RangeNotSatisfiable for ranges
+    beyond the end of the file.
+    """
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(value, etag, last_modified):
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def _chunks(path, start, length):
+    """File content from ``start``; opened only once the response is consumed"""
+    chunk_size = getattr(settings, 'FINDEX_DOWNLOAD_CHUNK_SIZE', 256 * 1024)
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            prometheus.DOWNLOAD_BYTES.inc(amount=len(chunk))
+            yield chunk
+
+
+def _offload(field_file, stat):
+    mode = getattr(settings, 'FINDEX_DOWNLOAD_OFFLOAD', None)
+    response = HttpResponse()
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'FINDEX_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + field_file.name)
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = field_file.path
+    else:
+        raise ValueError(f'Unknown FINDEX_DOWNLOAD_OFFLOAD: {mode!r}')
+    # The web server sends the file; count it as sent completely
+    prometheus.DOWNLOAD_BYTES.inc(amount=stat.st_size)
+    return response
+
+
+def serve_file(request, field_file, content_type='application/octet-stream', filename=None):
+    """Response sending ``field_file`` as attachment named ``filename``, see module docstring"""
+    try:
+        path = field_file.path
+        stat = os.stat(path)
+    except (FileNotFoundError, ValueError):
+        raise Http404('File not found')
+
+    etag, last_modified = validators(stat, blob_digest(field_file.name))
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if getattr(settings, 'FINDEX_DOWNLOAD_OFFLOAD', None):
+            response = _offload(field_file, stat)
+        else:
+            response = _stream(request, path, stat.st_size, etag, last_modified)
+        if response.status_code != 416:
+            response['Content-Type'] = content_type
+            response['Content-Disposition'] = content_disposition_header(
+                True, filename or os.path.basename(field_file.name)
+            )
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _stream(request, path, size, etag, last_modified):
+    byte_range = None
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (not if_range or _if_range_matches(if_range, etag, last_modified)):
+        try:
+            byte_range = parse_range(header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    response = StreamingHttpResponse(_chunks(path, start, end - start + 1))
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def is_new_download(response):
+    """Whether the response sends a file from its first byte, i.e. not a 304 or resumed download"""
+    if response.status_code == 206:
+        return response['Content-Range'].startswith('bytes 0-')
+    return response.status_code == 200
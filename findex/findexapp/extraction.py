@@ -0,0 +1,266 @@
+"""
+Text extraction pipeline for document files.
+
+The parsers live in ``extractors`` so they can run in a process pool; this
+module decides which documents need (re-)extraction and stores the results
+in DocumentContent, from where the search index picks them up. Saved
+documents are handed to ``extract_in_background``: a thread of the web
+worker waits for the pool, so the saving request does not.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
+
+from .extractors import EXTRACTORS, extract_file, limit_memory
+from .models import Document, DocumentContent
+
+
+logger = logging.getLogger(__name__)
+
+
+def max_chars():
+    """Maximum number of characters stored per document"""
+    return getattr(settings, 'FINDEX_EXTRACTION_MAX_CHARS', 2000000)
+
+
+def max_file_size():
+    """Files above this size in bytes are not parsed at all"""
+    return getattr(settings, 'FINDEX_EXTRACTION_MAX_FILE_MB', 200) * 1024 * 1024
+
+
+def memory_limit():
+    """Address space limit in bytes for each extraction worker"""
+    return getattr(settings, 'FINDEX_EXTRACTION_MEMORY_LIMIT_MB', 1024) * 1024 * 1024
+
+
+# Stored for documents whose worker died, most likely at the memory limit
+WORKER_DIED = 'Extraction worker terminated, e.g. by the memory limit'
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _workers():
+    return getattr(settings, 'FINDEX_EXTRACTION_WORKERS', 1)
+
+
+def _new_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=limit_memory, initargs=(memory_limit(),)
+    )
+
+
+def shared_pool():
+    """Process pool extracting uploaded files, so parsers never run in the web worker"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = _new_pool(_workers())
+        return _shared_pool
+
+
+def _discard_shared_pool(pool):
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is pool:
+            _shared_pool = None
+    pool.shutdown(wait=False)
+
+
+def _source_state(document):
+    """(path, size, mtime) of the stored file or None if it is missing"""
+    if not document.document_file:
+        return None
+    try:
+        path = document.document_file.path
+        stat = os.stat(path)
+    except (NotImplementedError, OSError, ValueError):
+        return None
+    return path, stat.st_size, stat.st_mtime
+
+
+def build_job(document, force=False):
+    """
+    Describe the extraction work for a document.
+
+    Returns ``(path, size, mtime)`` or None when the file is unsupported,
+    missing or unchanged since the last extraction.
+    """
+    if document.file_type.upper() not in EXTRACTORS:
+        return None
+    state = _source_state(document)
+    if state is None:
+        return None
+    if not force:
+        try:
+            if document.content.matches_source(state[1], state[2]):
+                return None
+        except ObjectDoesNotExist:
+            pass
+    return state
+
+
+def store_result(document, size, mtime, result):
+    """Persist an extraction result for a document"""
+    DocumentContent.objects.update_or_create(
+        document=document,
+        defaults={
+            'text': result.get('text', ''),
+            'page_count': result.get('page_count'),
+            'sheet_names': result.get('sheet_names', []),
+            'properties': result.get('properties', {}),
+            'is_truncated': result.get('truncated', False),
+            'error': result.get('error', ''),
+            'source_size': size,
+            'source_mtime': mtime,
+        }
+    )
+
+
+def _oversized_result():
+    return {'error': f'File exceeds extraction limit of {max_file_size() // (1024 * 1024)} MB'}
+
+
+def extract_document(document, force=False, pool=None):
+    """
+    Extract a single document, returns True if work was done.
+
+    With ``pool=shared_pool()`` the parser runs in a worker process under
+    the memory limit, otherwise in this process.
+    """
+    job = build_job(document, force)
+    if job is None:
+        return False
+    path, size, mtime = job
+    if size > max_file_size():
+        result = _oversized_result()
+    elif pool is None:
+        result = extract_file(path, document.file_type, max_chars())
+    else:
+        result = _extract_in_shared_pool(pool, path, document.file_type)
+    store_result(document, size, mtime, result)
+    return True
+
+
+def _background_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # One waiting thread per extraction process is enough
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='findex-extract')
+    return _executor
+
+
+def extract_in_background(document_id):
+    """Queue the extraction of a saved document; returns the Future"""
+    return _background_executor().submit(_extract_in_thread, document_id)
+
+
+def _extract_in_thread(document_id):
+    try:
+        extract_saved_document(document_id)
+    except Exception:
+        # Extraction is best effort, the document stays searchable by its metadata
+        logger.exception('Text extraction failed for document %s', document_id)
+    finally:
+        connection.close()
+
+
+def extract_saved_document(document_id):
+    """Extract the stored file of a document in the shared pool"""
+    document = Document.objects.select_related('content').filter(pk=document_id).first()
+    if document is None:
+        return False
+    return extract_document(document, pool=shared_pool())
+
+
+def _extract_in_shared_pool(pool, path, file_type):
+    # A dying worker breaks the pool for every job in flight; retrying once in
+    # a new pool only fails the file that killed it again
+    for _ in range(2):
+        try:
+            return pool.submit(extract_file, path, file_type, max_chars()).result()
+        except BrokenProcessPool:
+            _discard_shared_pool(pool)
+            pool = shared_pool()
+    return {'error': WORKER_DIED}
+
+
+def backfill(queryset, workers=None, force=False, batch_size=500):
+    """
+    Extract all documents of ``queryset`` using a process pool.
+
+    Unchanged files are skipped with a single ``stat`` call, and at most a
+    few jobs per worker are in flight so memory stays flat regardless of the
+    corpus size. Returns a dict with extracted/skipped/failed counters.
+    """
+    stats = {'extracted': 0, 'skipped': 0, 'failed': 0}
+    documents = queryset.select_related('content').iterator(chunk_size=batch_size)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+    pool = _new_pool(workers)
+    pending = {}
+
+    def store(document, size, mtime, result):
+        store_result(document, size, mtime, result)
+        stats['failed' if result.get('error') else 'extracted'] += 1
+
+    def collect(futures):
+        nonlocal pool
+        broken = []
+        for future in futures:
+            document, path, size, mtime = pending.pop(future)
+            try:
+                store(document, size, mtime, future.result())
+            except BrokenProcessPool:
+                broken.append((document, path, size, mtime))
+        if not broken:
+            return
+
+        # A worker died and took every job in flight with it. Run those again
+        # one at a time in a new pool, so only the file that killed it fails.
+        broken += [pending.pop(future) for future in list(pending)]
+        pool.shutdown(wait=False)
+        pool = _new_pool(workers)
+        for document, path, size, mtime in broken:
+            try:
+                result = pool.submit(extract_file, path, document.file_type, max_chars()).result()
+            except BrokenProcessPool:
+                result = {'error': WORKER_DIED}
+                pool.shutdown(wait=False)
+                pool = _new_pool(workers)
+            store(document, size, mtime, result)
+
+    try:
+        for document in documents:
+            job = build_job(document, force)
+            if job is None:
+                stats['skipped'] += 1
+                continue
+
+            path, size, mtime = job
+            if size > max_file_size():
+                store(document, size, mtime, _oversized_result())
+                continue
+
+            future = pool.submit(extract_file, path, document.file_type, max_chars())
+            pending[future] = (document, path, size, mtime)
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        collect(list(pending))
+    finally:
+        pool.shutdown()
+
+    return stats
@@ -0,0 +1,272 @@
+"""
+Pure-Python text extractors for uploaded document files.
+
+This module deliberately has no Django imports: it runs inside worker
+processes of the extraction pool (see ``extraction.py``), which must be able
+to import it without configuring Django first. Office formats are read
+straight from their ZIP/XML parts with the standard library; PDF support uses
+the optional ``pypdf`` package.
+"""
+import codecs
+import os
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+
+NS_WORD = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+NS_SHEET = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_DRAWING = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+NS_DC = '{http://purl.org/dc/elements/1.1/}'
+NS_DCTERMS = '{http://purl.org/dc/terms/}'
+NS_CORE = '{http://schemas.openxmlformats.org/package/2006/metadata/core-properties}'
+NS_APP = '{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}'
+
+
+class ExtractionError(Exception):
+    """Raised when a file cannot be parsed"""
+
+
+class TextBuffer:
+    """Collects text fragments up to a character limit"""
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+        self.truncated = False
+
+    @property
+    def full(self):
+        return self.length >= self.max_chars
+
+    def add(self, text):
+        if not text or self.full:
+            if text:
+                self.truncated = True
+            return
+        remaining = self.max_chars - self.length
+        if len(text) > remaining:
+            text = text[:remaining]
+            self.truncated = True
+        self.parts.append(text)
+        self.length += len(text)
+
+    def text(self):
+        return re.sub(r'[ \t]+', ' ', ''.join(self.parts)).strip()
+
+
+def _iter_elements(zip_file, member):
+    """Stream the elements of an XML part, clearing them once handled"""
+    with zip_file.open(member) as handle:
+        for _, element in iterparse(handle):
+            yield element
+            element.clear()
+
+
+def _read_core_properties(zip_file):
+    """Title, author and dates from docProps/core.xml"""
+    properties = {}
+    if 'docProps/core.xml' not in zip_file.namelist():
+        return properties
+    fields = {
+        NS_DC + 'title': 'title',
+        NS_DC + 'creator': 'author',
+        NS_DC + 'subject': 'subject',
+        NS_CORE + 'keywords': 'keywords',
+        NS_DCTERMS + 'created': 'created',
+        NS_DCTERMS + 'modified': 'modified',
+    }
+    for element in _iter_elements(zip_file, 'docProps/core.xml'):
+        if element.tag in fields and element.text:
+            properties[fields[element.tag]] = element.text.strip()
+    return properties
+
+
+def _read_app_property(zip_file, name):
+    """Single numeric value from docProps/app.xml, e.g. Pages or Slides"""
+    if 'docProps/app.xml' not in zip_file.namelist():
+        return None
+    for element in _iter_elements(zip_file, 'docProps/app.xml'):
+        if element.tag == NS_APP + name and element.text:
+            try:
+                return int(element.text)
+            except ValueError:
+                return None
+    return None
+
+
+def extract_docx(path, max_chars):
+    buffer = TextBuffer(max_chars)
+    with zipfile.ZipFile(path) as zip_file:
+        for element in _iter_elements(zip_file, 'word/document.xml'):
+            if element.tag == NS_WORD + 't':
+                buffer.add(element.text)
+            elif element.tag == NS_WORD + 'tab':
+                buffer.add(' ')
+            elif element.tag == NS_WORD + 'p':
+                buffer.add('\n')
+            if buffer.full:
+                break
+        properties = _read_core_properties(zip_file)
+        page_count = _read_app_property(zip_file, 'Pages')
+    return {
+        'text': buffer.text(),
+        'page_count': page_count,
+        'sheet_names': [],
+        'properties': properties,
+        'truncated': buffer.truncated,
+    }
+
+
+def extract_xlsx(path, max_chars):
+    buffer = TextBuffer(max_chars)
+    sheet_names = []
+    with zipfile.ZipFile(path) as zip_file:
+        for element in _iter_elements(zip_file, 'xl/workbook.xml'):
+            if element.tag == NS_SHEET + 'sheet':
+                sheet_names.append(element.get('name', ''))
+        buffer.add(' '.join(sheet_names) + '\n')
+
+        # Nearly all cell text lives in the shared string table
+        if 'xl/sharedStrings.xml' in zip_file.namelist():
+            for element in _iter_elements(zip_file, 'xl/sharedStrings.xml'):
+                if element.tag == NS_SHEET + 't':
+                    buffer.add(element.text)
+                elif element.tag == NS_SHEET + 'si':
+                    buffer.add('\n')
+                if buffer.full:
+                    break
+        properties = _read_core_properties(zip_file)
+    return {
+        'text': buffer.text(),
+        'page_count': len(sheet_names),
+        'sheet_names': sheet_names,
+        'properties': properties,
+        'truncated': buffer.truncated,
+    }
+
+
+def _slide_number(name):
+    match = re.search(r'(\d+)\.xml$', name)
+    return int(match.group(1)) if match else 0
+
+
+def extract_pptx(path, max_chars):
+    buffer = TextBuffer(max_chars)
+    with zipfile.ZipFile(path) as zip_file:
+        slides = sorted(
+            (name for name in zip_file.namelist()
+             if re.match(r'ppt/slides/slide\d+\.xml$', name)),
+            key=_slide_number
+        )
+        for slide in slides:
+            for element in _iter_elements(zip_file, slide):
+                if element.tag == NS_DRAWING + 't':
+                    buffer.add(element.text)
+                elif element.tag == NS_DRAWING + 'p':
+                    buffer.add('\n')
+            if buffer.full:
+                break
+        properties = _read_core_properties(zip_file)
+    return {
+        'text': buffer.text(),
+        'page_count': len(slides),
+        'sheet_names': [],
+        'properties': properties,
+        'truncated': buffer.truncated,
+    }
+
+
+def extract_pdf(path, max_chars):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractionError('PDF extraction requires the pypdf package')
+
+    buffer = TextBuffer(max_chars)
+    reader = PdfReader(path)
+    for page in reader.pages:
+        buffer.add(page.extract_text() or '')
+        buffer.add('\n')
+        if buffer.full:
+            break
+
+    properties = {}
+    metadata = reader.metadata or {}
+    for key, name in (('/Title', 'title'), ('/Author', 'author'), ('/Subject', 'subject')):
+        if metadata.get(key):
+            properties[name] = str(metadata[key])
+    return {
+        'text': buffer.text(),
+        'page_count': len(reader.pages),
+        'sheet_names': [],
+        'properties': properties,
+        'truncated': buffer.truncated,
+    }
+
+
+def extract_txt(path, max_chars):
+    # Worst case UTF-8 needs 4 bytes per character
+    with open(path, 'rb') as handle:
+        raw = handle.read(max_chars * 4)
+    complete = os.path.getsize(path) <= len(raw)
+    try:
+        # The read may end inside a character; the decoder keeps such a tail back
+        text = codecs.getincrementaldecoder('utf-8')().decode(raw, final=complete)
+    except UnicodeDecodeError:
+        text = raw.decode('cp1252', errors='replace')
+    buffer = TextBuffer(max_chars)
+    buffer.add(text)
+    return {
+        'text': buffer.text(),
+        'page_count': None,
+        'sheet_names': [],
+        'properties': {},
+        'truncated': buffer.truncated or not complete,
+    }
+
+
+EXTRACTORS = {
+    'PDF': extract_pdf,
+    'DOCX': extract_docx,
+    'XLSX': extract_xlsx,
+    'PPTX': extract_pptx,
+    'TXT': extract_txt,
+}
+
+
+def limit_memory(max_bytes):
+    """Pool initializer capping the address space of a worker process"""
+    if not max_bytes:
+        return
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows; the per-file size limit still applies
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        max_bytes = min(max_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+
+
+def extract_file(path, file_type, max_chars):
+    """
+    Extract text and properties from a single file.
+
+    Returns a result dict; parsing problems are reported in ``error`` instead
+    of being raised so that one broken file never stops a backfill.
+    """
+    extractor = EXTRACTORS.get(file_type.upper())
+    if extractor is None:
+        return {'error': f'Unsupported file type: {file_type}'}
+    try:
+        return extractor(path, max_chars)
+    except MemoryError:
+        return {'error': 'Memory limit exceeded'}
+    except (ExtractionError, zipfile.BadZipFile, KeyError, OSError, ValueError) as exc:
+        return {'error': str(exc)[:500]}
+    except Exception as exc:
+        # Third-party parsers raise a wide range of exceptions on damaged files
+        return {'error': f'{exc.__class__.__name__}: {exc}'[:500]}
@@ -0,0 +1,122 @@
+"""
+Faceted result counts for the document search.
+
+All facet counts come from one grouped aggregate over the search results
+restricted by the non-facet filters (query text, date range). Each facet is
+then counted over the groups matching the *other* selected facets, which
+gives the usual "how many hits if I pick this value" semantics without one
+COUNT query per value.
+"""
+import calendar
+import hashlib
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+from .versioning import get_version
+
+
+# Facet name -> (grouping column, label column)
+FACETS = {
+    'doc_type': ('doc_type_id', 'doc_type__name'),
+    'project': ('project_id', 'project__name'),
+    'export_control': ('export_control_id', 'export_control__code'),
+    'is_active': ('is_active', None),
+}
+
+ACTIVE_LABELS = {True: 'Aktiv', False: 'Inaktiv'}
+
+
+def _cache_key(filters):
+    raw = json.dumps(filters, sort_keys=True, default=str)
+    return f'findex:facets:{get_version()}:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _aggregate(queryset):
+    """The single grouped query all facets are derived from"""
+    columns = []
+    for column, label in FACETS.values():
+        columns.append(column)
+        if label:
+            columns.append(label)
+    return list(
+        queryset.order_by()
+        .values(*columns, month=TruncMonth('uploaded_at'))
+        .annotate(hits=Count('id'))
+    )
+
+
+def _param(name, value):
+    """Query string value selecting a facet value in DocumentSearchForm"""
+    if name == 'is_active':
+        return 'true' if value else 'false'
+    return value
+
+
+def _count(groups, selected):
+    counts = {name: defaultdict(int) for name in FACETS}
+    labels = {name: {} for name in FACETS}
+    months = defaultdict(int)
+
+    for group in groups:
+        mismatches = [
+            name for name, (column, _) in FACETS.items()
+            if selected.get(name) is not None and group[column] != selected[name]
+        ]
+        if len(mismatches) > 1:
+            continue
+        for name, (column, label) in FACETS.items():
+            # A facet ignores its own selection but respects all others
+            if mismatches and mismatches != [name]:
+                continue
+            value = group[column]
+            counts[name][value] += group['hits']
+            labels[name][value] = group[label] if label else ACTIVE_LABELS[value]
+        if not mismatches and group['month']:
+            months[group['month'].date()] += group['hits']
+
+    facets = {}
+    for name in FACETS:
+        facets[name] = sorted(
+            (
+                {
+                    'value': value,
+                    'param': _param(name, value),
+                    'label': labels[name][value],
+                    'count': count,
+                    'selected': selected.get(name) == value,
+                }
+                for value, count in counts[name].items()
+            ),
+            key=lambda item: str(item['label']).lower()
+        )
+    facets['upload_month'] = [
+        {
+            'value': month,
+            'date_from': month,
+            'date_to': month.replace(day=calendar.monthrange(month.year, month.month)[1]),
+            'count': count,
+        }
+        for month, count in sorted(months.items(), reverse=True)
+    ]
+    return facets
+
+
+def get_facets(base_queryset, selected, cache_filters):
+    """
+    Facet counts for ``base_queryset`` with the ``selected`` facet values.
+
+    ``selected`` maps facet names to the chosen primary key (or bool for
+    ``is_active``); ``cache_filters`` describes the non-facet filters and,
+    together with ``selected``, forms the cache key.
+    """
+    key = _cache_key({'filters': cache_filters, 'selected': selected})
+    facets = cache.get(key)
+    if facets is None:
+        facets = _count(_aggregate(base_queryset), selected)
+        cache.set(key, facets, getattr(settings, 'FINDEX_FACET_CACHE_TIMEOUT', 60))
+    return facets
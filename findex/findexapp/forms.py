@@ -2,6 +2,8 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.core.exceptions import ValidationError
 from .models import Document, Project, DocType, ExportControl, User, BarcodeRange, SystemSettings
+from .reference_data import ReferenceChoiceField
+from .system_settings import get_setting
 
 
 class LoginForm(AuthenticationForm):
@@ -24,6 +26,21 @@ class LoginForm(AuthenticationForm):
 class DocumentUploadForm(forms.ModelForm):
     """Form for uploading new documents"""
     
+    doc_type = ReferenceChoiceField(
+        DocType, active_only=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
+    project = ReferenceChoiceField(
+        Project, active_only=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
+    export_control = ReferenceChoiceField(
+        ExportControl, active_only=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
     class Meta:
         model = Document
         fields = [
@@ -32,7 +49,6 @@ class DocumentUploadForm(forms.ModelForm):
             'project', 'export_control', 'is_active', 'description'
         ]
         widgets = {
-            'doc_type': forms.Select(attrs={'class': 'form-select'}),
             'barcode_number': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Barcode-Nummer (optional)'
@@ -61,8 +77,6 @@ class DocumentUploadForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Titre (Français)'
             }),
-            'project': forms.Select(attrs={'class': 'form-select'}),
-            'export_control': forms.Select(attrs={'class': 'form-select'}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'description': forms.Textarea(attrs={
                 'class': 'form-control',
@@ -71,6 +85,13 @@ class DocumentUploadForm(forms.ModelForm):
             }),
         }
 
+    def clean_document_file(self):
+        document_file = self.cleaned_data.get('document_file')
+        max_size_mb = get_setting('max_file_size_mb')
+        if document_file and max_size_mb and document_file.size > max_size_mb * 1024 * 1024:
+            raise ValidationError(f"Die Datei ist größer als {max_size_mb} MB.")
+        return document_file
+
     def clean(self):
         cleaned_data = super().clean()
         title_de = cleaned_data.get('title_de')
@@ -102,22 +123,22 @@ class DocumentSearchForm(forms.Form):
         })
     )
     
-    doc_type = forms.ModelChoiceField(
-        queryset=DocType.objects.filter(is_active=True),
+    doc_type = ReferenceChoiceField(
+        DocType,
         required=False,
         empty_label="Alle Dokumenttypen",
         widget=forms.Select(attrs={'class': 'form-select'})
     )
     
-    project = forms.ModelChoiceField(
-        queryset=Project.objects.filter(is_active=True),
+    project = ReferenceChoiceField(
+        Project,
         required=False,
         empty_label="Alle Projekte",
         widget=forms.Select(attrs={'class': 'form-select'})
     )
     
-    export_control = forms.ModelChoiceField(
-        queryset=ExportControl.objects.filter(is_active=True),
+    export_control = ReferenceChoiceField(
+        ExportControl,
         required=False,
         empty_label="Alle Export Controls",
         widget=forms.Select(attrs={'class': 'form-select'})
@@ -311,20 +332,20 @@ class BatchEditForm(forms.Form):
         widget=forms.Select(attrs={'class': 'form-select'})
     )
     
-    project = forms.ModelChoiceField(
-        queryset=Project.objects.filter(is_active=True),
+    project = ReferenceChoiceField(
+        Project,
         required=False,
         widget=forms.Select(attrs={'class': 'form-select'})
     )
     
-    doc_type = forms.ModelChoiceField(
-        queryset=DocType.objects.filter(is_active=True),
+    doc_type = ReferenceChoiceField(
+        DocType,
         required=False,
         widget=forms.Select(attrs={'class': 'form-select'})
     )
     
-    export_control = forms.ModelChoiceField(
-        queryset=ExportControl.objects.filter(is_active=True),
+    export_control = ReferenceChoiceField(
+        ExportControl,
         required=False,
         widget=forms.Select(attrs={'class': 'form-select'})
     )
@@ -0,0 +1,172 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+
+from findexapp.models import Blob, Document
+from findexapp.storage import BLOB_PREFIX, blob_digest, blob_name, document_storage, file_digest
+
+
+# Files younger than this may belong to an upload whose row is not committed yet
+ORPHAN_GRACE_SECONDS = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Move existing document files into content-addressed storage and merge duplicates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=min(os.cpu_count() or 1, 8),
+            help='Files hashed in parallel',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Only report what would be merged',
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Re-hash all blobs, report damaged or missing files, repair reference counts '
+                 'and remove unused blobs',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify(options['workers'])
+        else:
+            self.backfill(options['workers'], options['dry_run'])
+
+    def backfill(self, workers, dry_run):
+        documents_by_path = defaultdict(list)
+        missing = 0
+        legacy = Document.objects.filter(blob=None).exclude(document_file='').only('document_file')
+        for document in legacy.iterator(chunk_size=2000):
+            path = document_storage.path(document.document_file.name)
+            if os.path.isfile(path):
+                documents_by_path[path].append(document.pk)
+            else:
+                missing += 1
+        if missing:
+            self.stdout.write(self.style.WARNING(f'⚠ {missing} documents without a file are skipped'))
+        if not documents_by_path:
+            self.stdout.write(self.style.SUCCESS('✅ All document files are in content-addressed storage'))
+            return
+
+        self.stdout.write(f'Hashing {len(documents_by_path)} files with {workers} workers...')
+        paths = list(documents_by_path)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            digests = dict(zip(paths, pool.map(file_digest, paths)))
+
+        paths_by_digest = defaultdict(list)
+        for path, digest in digests.items():
+            paths_by_digest[digest].append(path)
+        sizes = {path: os.path.getsize(path) for path in paths}
+        saved = sum(sizes[path] for group in paths_by_digest.values() for path in group[1:])
+        self.stdout.write(
+            f'✓ {len(paths)} files, {len(paths_by_digest)} distinct contents, '
+            f'{saved / 1024 / 1024:.1f} MB in duplicates'
+        )
+        if dry_run:
+            return
+
+        for number, (digest, group) in enumerate(paths_by_digest.items(), 1):
+            self.move(digest, group, [pk for path in group for pk in documents_by_path[path]], sizes[group[0]])
+            if number % 1000 == 0:
+                self.stdout.write(f'  {number}/{len(paths_by_digest)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Moved {len(paths)} files into {len(paths_by_digest)} blobs, '
+            f'{saved / 1024 / 1024:.1f} MB freed'
+        ))
+
+    def move(self, digest, paths, document_ids, size):
+        """Link the content into its blob, repoint the documents, then remove the old files"""
+        name = blob_name(digest)
+        target = document_storage.path(name)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(paths[0], target)
+            except OSError:
+                # Hard links need one file system; fall back to a copy
+                with open(paths[0], 'rb') as source, open(target + '.tmp', 'wb') as copy:
+                    while chunk := source.read(1024 * 1024):
+                        copy.write(chunk)
+                os.replace(target + '.tmp', target)
+
+        with transaction.atomic():
+            blob = Blob.acquire(digest, size, count=len(document_ids))
+            Document.objects.filter(pk__in=document_ids).update(document_file=name, blob=blob)
+        for path in paths:
+            if os.path.abspath(path) != os.path.abspath(target):
+                os.unlink(path)
+
+    def verify(self, workers):
+        blobs = list(Blob.objects.annotate(documents_count=Count('documents')))
+        self.stdout.write(f'Verifying {len(blobs)} blobs with {workers} workers...')
+
+        def check(blob):
+            path = document_storage.path(blob.name)
+            if not os.path.isfile(path):
+                return 'missing'
+            return None if file_digest(path) == blob.sha256 else 'damaged'
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            problems = [(blob, problem) for blob, problem in zip(blobs, pool.map(check, blobs)) if problem]
+        for blob, problem in problems:
+            self.stdout.write(self.style.WARNING(
+                f'⚠ Blob {blob.sha256} {problem} ({blob.documents_count} documents)'
+            ))
+
+        repaired = removed = 0
+        for blob in blobs:
+            if blob.ref_count != blob.documents_count:
+                Blob.objects.filter(pk=blob.pk).update(ref_count=blob.documents_count)
+                repaired += 1
+            if not blob.documents_count and Blob.purge(blob.pk):
+                removed += 1
+        if repaired:
+            self.stdout.write(f'✓ Repaired {repaired} reference counts')
+        if removed:
+            self.stdout.write(f'✓ Removed {removed} unused blobs')
+
+        orphans = self.remove_orphans()
+        if orphans:
+            self.stdout.write(f'✓ Removed {orphans} files without a blob')
+
+        if problems:
+            self.stdout.write(self.style.WARNING(f'⚠ {len(problems)} blobs are missing or damaged'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ All blobs match their hashes'))
+
+    def remove_orphans(self):
+        """
+        Delete files below blobs/ that no Blob row refers to.
+
+        A document row that failed to save leaves its already stored file
+        behind, an interrupted upload its temporary file. Recent files are
+        left alone, their upload may still be running.
+        """
+        known = set(Blob.objects.values_list('sha256', flat=True))
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        removed = 0
+        for directory, _, filenames in os.walk(document_storage.path(BLOB_PREFIX)):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                digest = blob_digest(os.path.relpath(path, document_storage.location).replace(os.sep, '/'))
+                if digest in known or os.path.getmtime(path) > cutoff:
+                    continue
+                if digest is None:
+                    os.unlink(path)
+                    removed += 1
+                    continue
+                try:
+                    with transaction.atomic():
+                        # A row of our own keeps acquire() from reusing the file meanwhile
+                        blob = Blob.objects.create(sha256=digest, size=os.path.getsize(path))
+                        removed += Blob.purge(blob.pk)
+                except IntegrityError:
+                    # Uploaded again since the listing above
+                    continue
+        return removed
@@ -0,0 +1,133 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from findexapp.benchmark import ENDPOINT_NAMES, compare, run_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main endpoints and write latency, query and memory figures as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoint', action='append', choices=ENDPOINT_NAMES, dest='endpoints',
+            help='Benchmark only this endpoint (repeatable)',
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per endpoint')
+        parser.add_argument(
+            '--cold', action='store_true', help='Clear the cache before every measured request'
+        )
+        parser.add_argument(
+            '--sizes',
+            help='Comma separated document counts, e.g. 10000,100000,1000000; every size gets '
+                 'its own SQLite database in --database-dir, generated on first use',
+        )
+        parser.add_argument(
+            '--database-dir', default=os.path.join(settings.BASE_DIR, 'benchmarks'),
+            help='Directory of the generated benchmark databases',
+        )
+        parser.add_argument('--seed', type=int, default=1, help='Seed of generated databases')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Flag regressions against this earlier JSON file')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed relative p95 latency increase before flagging (default 0.2)',
+        )
+
+    def handle(self, *args, **options):
+        if options['sizes']:
+            try:
+                sizes = [int(size) for size in options['sizes'].split(',')]
+            except ValueError:
+                raise CommandError('--sizes expects comma separated numbers')
+            runs = [self.run_size(size, options) for size in sizes]
+        else:
+            try:
+                runs = [run_benchmark(
+                    options['endpoints'], options['repeat'], options['warmup'], options['cold'],
+                    progress=self.report,
+                )]
+            except ValueError as error:
+                raise CommandError(str(error))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump({'runs': runs}, handle, indent=2, sort_keys=True)
+            self.stdout.write(f'✓ Results written to {options["output"]}')
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as handle:
+                previous = json.load(handle)['runs']
+            regressions = compare(previous, runs, options['tolerance'])
+            for documents, endpoint, metric, before, after in regressions:
+                self.stdout.write(self.style.WARNING(
+                    f'⚠ {endpoint} ({documents} documents): {metric} {before} → {after}'
+                ))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS('✅ No regressions'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Benchmark completed'))
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'✓ {name:<24} {result["status"]}  p50 {result["p50_ms"]:>8.1f} ms  '
+            f'p95 {result["p95_ms"]:>8.1f} ms  {result["queries"]:>4} queries  '
+            f'{result["peak_memory_kb"]:>9.0f} KB peak'
+        )
+
+    def run_size(self, size, options):
+        """Benchmark one dataset size in a subprocess using its own database"""
+        os.makedirs(options['database_dir'], exist_ok=True)
+        database = os.path.join(options['database_dir'], f'findex_{size}_seed{options["seed"]}.sqlite3')
+        env = dict(os.environ, FINDEX_DATABASE=database)
+        manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+
+        if not os.path.exists(database):
+            # Generated under another name and renamed when done, so an
+            # interrupted run is started over instead of being measured
+            partial = database + '.partial'
+            if os.path.exists(partial):
+                self.stdout.write(self.style.WARNING(f'⚠ Discarding incomplete {partial}'))
+                for path in (partial, partial + '-journal'):
+                    if os.path.exists(path):
+                        os.unlink(path)
+            self.stdout.write(f'Generating {size} documents in {database}...')
+            partial_env = dict(env, FINDEX_DATABASE=partial)
+            subprocess.run(manage + ['migrate', '--verbosity', '0'], env=partial_env, check=True)
+            subprocess.run(manage + [
+                'generate_synthetic_data', '--documents', str(size), '--activities', str(size * 10),
+                '--seed', str(options['seed']),
+            ], env=partial_env, check=True)
+            subprocess.run(manage + ['rebuild_search_index', '--optimize'], env=partial_env, check=True)
+            os.replace(partial, database)
+
+        self.stdout.write(f'\nBenchmarking {size} documents...')
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as handle:
+            output = handle.name
+        try:
+            command = manage + [
+                'benchmark_endpoints', '--output', output,
+                '--repeat', str(options['repeat']), '--warmup', str(options['warmup']),
+            ]
+            for endpoint in options['endpoints'] or []:
+                command += ['--endpoint', endpoint]
+            if options['cold']:
+                command.append('--cold')
+            subprocess.run(command, env=env, check=True)
+            with open(output, encoding='utf-8') as handle:
+                run = json.load(handle)['runs'][0]
+        finally:
+            os.unlink(output)
+        if run['documents'] != size:
+            self.stdout.write(self.style.WARNING(
+                f'⚠ {database} holds {run["documents"]} documents instead of {size}; '
+                f'delete it to generate it again'
+            ))
+        return run
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from findexapp.archive_jobs import expire_archives
+
+
+class Command(BaseCommand):
+    help = 'Delete background archives beyond their age or the disk budget'
+
+    def handle(self, *args, **options):
+        expired = expire_archives()
+        self.stdout.write(self.style.SUCCESS(f'✅ Deleted {expired} archives'))
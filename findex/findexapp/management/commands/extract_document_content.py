@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from findexapp.extraction import backfill
+from findexapp.models import Document
+
+
+class Command(BaseCommand):
+    help = 'Extract searchable text from stored document files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Number of extraction processes (default: CPU count)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-extract files even if they are unchanged',
+        )
+        parser.add_argument(
+            '--project',
+            help='Only process documents of the project with this name',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of documents loaded from the database at once',
+        )
+
+    def handle(self, *args, **options):
+        documents = Document.objects.order_by('id')
+        if options['project']:
+            documents = documents.filter(project__name=options['project'])
+
+        self.stdout.write(f'Extracting content of {documents.count()} documents...')
+        stats = backfill(
+            documents,
+            workers=options['workers'],
+            force=options['force'],
+            batch_size=options['batch_size'],
+        )
+
+        self.stdout.write(f'✓ Extracted: {stats["extracted"]}')
+        self.stdout.write(f'✓ Skipped (unchanged or unsupported): {stats["skipped"]}')
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING(f'⚠ Failed: {stats["failed"]}'))
+        self.stdout.write(self.style.SUCCESS('✅ Content extraction completed'))
@@ -0,0 +1,420 @@
+import os
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, time as day_time, timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from findexapp import reference_data
+from findexapp.models import (
+    BarcodeAssignment, BarcodeRange, Document, DocType, ExportControl, Project,
+    User, UserActivity
+)
+from findexapp.normalization import normalize_search_text
+from findexapp.versioning import REFERENCE_DATA, bump_version
+
+
+# Generated rows are recognizable by these name prefixes
+USER_PREFIX = 'synth.'
+PROJECT_PREFIX = 'SY.'
+RANGE_PREFIX = 'S'
+
+WORDS = {
+    'de': [
+        'Prüfanweisung', 'Fertigung', 'Montage', 'Turbinenschaufel', 'Verdichter', 'Gehäuse',
+        'Wärmebehandlung', 'Schweißen', 'Oberfläche', 'Beschichtung', 'Messung', 'Toleranz',
+        'Serienfertigung', 'Spezialverfahren', 'Rissprüfung', 'Bohrung', 'Freigabe', 'Änderung',
+        'Lieferant', 'Qualität', 'Wartung', 'Kalibrierung', 'Werkzeug', 'Dichtung', 'Lager',
+        'Welle', 'Rotor', 'Brennkammer', 'Schaufelfuß', 'Prüfplan', 'Arbeitsplan', 'Zeichnung',
+    ],
+    'en': [
+        'inspection', 'manufacturing', 'assembly', 'turbine', 'blade', 'compressor', 'casing',
+        'heat', 'treatment', 'welding', 'surface', 'coating', 'measurement', 'tolerance',
+        'process', 'crack', 'drilling', 'release', 'change', 'supplier', 'quality',
+        'maintenance', 'calibration', 'tooling', 'seal', 'bearing', 'shaft', 'rotor',
+        'combustor', 'procedure', 'specification', 'report',
+    ],
+    'fr': [
+        'contrôle', 'fabrication', 'assemblage', 'turbine', 'aube', 'compresseur', 'carter',
+        'traitement', 'thermique', 'soudage', 'surface', 'revêtement', 'mesure', 'tolérance',
+        'procédé', 'fissure', 'perçage', 'libération', 'modification', 'fournisseur',
+        'qualité', 'maintenance', 'étalonnage', 'outillage', 'joint', 'roulement', 'arbre',
+        'rotor', 'chambre', 'combustion', 'spécification', 'rapport',
+    ],
+}
+
+# (title languages, weight)
+LANGUAGES = [
+    (('de',), 45), (('de', 'en'), 28), (('en',), 15), (('de', 'en', 'fr'), 7), (('fr',), 5),
+]
+
+# (file type, weight, median size in bytes)
+FILE_TYPES = [
+    ('PDF', 55, 600_000), ('DOCX', 15, 120_000), ('XLSX', 10, 80_000), ('PPTX', 5, 2_500_000),
+    ('TXT', 4, 8_000), ('TIF', 6, 4_000_000), ('JPG', 5, 900_000),
+]
+
+ACTIONS = [
+    ('download', 45), ('login', 20), ('logout', 12), ('upload', 8), ('edit', 8),
+    ('barcode_assign', 4), ('admin_action', 2), ('delete', 1),
+]
+DOCUMENT_ACTIONS = {'download', 'upload', 'edit', 'delete'}
+
+ROLES = [('viewer', 60), ('editor', 25), ('full_control', 10), ('admin', 5)]
+
+VERSIONS = [('1.0', 40), ('1.1', 15), ('1.2', 8), ('2.0', 12), ('3.0', 5), ('A', 8), ('B', 7), ('C', 5)]
+
+# Office hours dominate, nights and weekends are quiet
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 6, 12, 16, 16, 15, 12, 9, 13, 15, 14, 11, 7, 4, 3, 2, 2, 1, 1]
+
+
+def cumulative(weights):
+    total, result = 0, []
+    for weight in weights:
+        total += weight
+        result.append(total)
+    return result
+
+
+def zipf_weights(count, exponent=1.1):
+    """A few items get most of the rows, like projects and users in practice"""
+    return cumulative(1 / (rank ** exponent) for rank in range(1, count + 1))
+
+
+def chunks(total, size):
+    start = 0
+    while start < total:
+        yield start, min(size, total - start)
+        start += size
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create store the given values of auto_now/auto_now_add fields"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+@contextmanager
+def fast_sqlite_writes():
+    """Skip fsync for the seeding connection; a crash means re-running the seed"""
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous')
+        previous = cursor.fetchone()[0]
+        cursor.execute('PRAGMA synchronous = OFF')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA synchronous = {int(previous)}')
+
+
+class Command(BaseCommand):
+    help = 'Generate large volumes of realistic synthetic data for capacity tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=10000, help='Number of documents')
+        parser.add_argument('--activities', type=int, default=100000, help='Number of activity log rows')
+        parser.add_argument('--ranges', type=int, default=100, help='Number of barcode ranges')
+        parser.add_argument(
+            '--assignments', type=int,
+            help='Number of barcode assignments (default: a quarter of the documents)',
+        )
+        parser.add_argument('--users', type=int, default=200, help='Number of users')
+        parser.add_argument('--projects', type=int, default=300, help='Number of projects')
+        parser.add_argument('--doc-types', type=int, default=12, help='Number of document types')
+        parser.add_argument(
+            '--export-controls', type=int, default=9, help='Number of export control classes'
+        )
+        parser.add_argument('--years', type=int, default=6, help='Time span of upload dates')
+        parser.add_argument(
+            '--until', type=datetime.fromisoformat,
+            help='Newest upload date, YYYY-MM-DD (default: today)',
+        )
+        parser.add_argument('--seed', type=int, default=1, help='Random seed')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000, help='Rows built in memory per bulk_create'
+        )
+        parser.add_argument(
+            '--transaction-size', type=int, default=200000, help='Rows written per transaction'
+        )
+        parser.add_argument(
+            '--files', action='store_true',
+            help='Create sparse placeholder files of the recorded size under MEDIA_ROOT',
+        )
+
+    def handle(self, *args, **options):
+        for name in ('documents', 'activities', 'ranges', 'users', 'projects', 'doc_types',
+                     'export_controls', 'years'):
+            if options[name] < 0:
+                raise CommandError(f'--{name.replace("_", "-")} must not be negative')
+        if options['users'] < 1 or options['projects'] < 1:
+            raise CommandError('At least one user and one project are required')
+
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.hour_weights = cumulative(HOUR_WEIGHTS)
+        until = options['until'] or timezone.localtime().replace(tzinfo=None)
+        self.until = timezone.make_aware(datetime.combine(until.date(), day_time.max))
+        self.since = self.until - timedelta(days=365 * options['years'])
+        assignments = options['assignments']
+        if assignments is None:
+            assignments = options['documents'] // 4
+
+        started = time.monotonic()
+        with fast_sqlite_writes():
+            users = self.create_users(options['users'])
+            projects = self.create_projects(options['projects'], users)
+            doc_types = self.create_reference(
+                DocType, 'name', [f'SY-{number:02d}' for number in range(options['doc_types'])]
+            )
+            export_controls = self.create_reference(
+                ExportControl, 'code', [f'SY {number}.{number % 4}' for number in range(options['export_controls'])]
+            )
+            if not doc_types or not export_controls:
+                raise CommandError('At least one document type and export control are required')
+            used_barcodes = self.create_barcodes(options['ranges'], assignments, users)
+            self.create_documents(options['documents'], users, projects, doc_types, export_controls, used_barcodes)
+            self.create_activities(options['activities'], users)
+
+        reference_data.invalidate()
+        bump_version(REFERENCE_DATA)
+        bump_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ Synthetic data generated in {time.monotonic() - started:.0f}s'
+        ))
+        self.stdout.write('Run "python manage.py rebuild_search_index --optimize" before measuring search.')
+
+    # Random values
+
+    def timestamp(self):
+        """Upload time, increasingly frequent towards the present, mostly in office hours"""
+        span = (self.until - self.since).days
+        day = self.since + timedelta(days=int(span * self.rng.random() ** 0.6))
+        if day.weekday() >= 5 and self.rng.random() < 0.85:
+            day -= timedelta(days=day.weekday() - 4)
+        hour = self.rng.choices(range(24), cum_weights=self.hour_weights)[0]
+        moment = day.replace(hour=hour, minute=self.rng.randrange(60), second=self.rng.randrange(60))
+        return min(moment, self.until)
+
+    def words(self, language, low, high):
+        return ' '.join(self.rng.sample(WORDS[language], self.rng.randint(low, high)))
+
+    def title(self, language, doc_type):
+        words = self.words(language, 2, 5)
+        return f'{doc_type.name} {words[0].upper()}{words[1:]}'[:200]
+
+    # Phases
+
+    def create_users(self, count):
+        roles = [role for role, _ in ROLES]
+        role_weights = cumulative(weight for _, weight in ROLES)
+        password = make_password(None)
+        now = timezone.now()
+        existing = set(User.objects.filter(
+            username__startswith=USER_PREFIX
+        ).values_list('username', flat=True))
+        new_users = [
+            User(
+                username=f'{USER_PREFIX}{number:05d}', first_name='Synthetic', last_name=f'User {number}',
+                email=f'user{number}@synthetic.findex.local', password=password,
+                role=self.rng.choices(roles, cum_weights=role_weights)[0],
+                must_change_password=False, date_joined=now,
+            )
+            for number in range(count)
+        ]
+        created = User.objects.bulk_create(
+            [user for user in new_users if user.username not in existing],
+            batch_size=self.options['batch_size'],
+        )
+        users = list(User.objects.filter(
+            username__in=[user.username for user in new_users]
+        ).order_by('username').values_list('pk', flat=True))
+        self.stdout.write(f'✓ {len(users)} users ({len(created)} new)')
+        return users
+
+    def create_projects(self, count, users):
+        names = [f'{PROJECT_PREFIX}{("EP", "CR", "QS", "MT")[number % 4]}.{number:04d}' for number in range(count)]
+        existing = set(Project.objects.filter(name__in=names).values_list('name', flat=True))
+        Project.objects.bulk_create([
+            Project(
+                name=name, name_norm=normalize_search_text(name),
+                name_plain=normalize_search_text(name, expand_umlauts=False), description=self.words('de', 3, 8),
+                is_active=self.rng.random() < 0.9, created_by_id=self.rng.choice(users),
+            )
+            for name in names if name not in existing
+        ])
+        projects = dict(Project.objects.filter(name__in=names).values_list('name', 'pk'))
+        self.stdout.write(f'✓ {len(projects)} projects ({len(projects) - len(existing)} new)')
+        # Keep the generated order, the Zipf weights favour the first projects
+        return [(projects[name], name) for name in names]
+
+    def create_reference(self, model, field, values):
+        existing = set(model.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True))
+        model.objects.bulk_create([
+            model(**{field: value, 'name': value}) for value in values if value not in existing
+        ])
+        objects = {getattr(obj, field): obj for obj in model.objects.filter(**{f'{field}__in': values})}
+        self.stdout.write(f'✓ {len(objects)} {model._meta.verbose_name_plural} ({len(objects) - len(existing)} new)')
+        return [objects[value] for value in values]
+
+    def create_barcodes(self, range_count, assignment_count, users):
+        """Ranges and assignments; returns the used barcode numbers for documents"""
+        if not range_count:
+            return []
+        offset = BarcodeRange.objects.filter(prefix__startswith=RANGE_PREFIX).count()
+        size = max(1000, 2 * assignment_count // range_count)
+        ranges = [
+            BarcodeRange(
+                prefix=f'{RANGE_PREFIX}{offset + number:04d}', start_number=1, end_number=size,
+                current_number=1, is_active=self.rng.random() < 0.7,
+                created_by_id=self.rng.choice(users), created_at=self.timestamp(),
+            )
+            for number in range(range_count)
+        ]
+        with explicit_timestamps(BarcodeRange._meta.get_field('created_at')):
+            ranges = BarcodeRange.objects.bulk_create(ranges)
+        if ranges[0].pk is None:
+            ranges = list(BarcodeRange.objects.filter(prefix__in=[r.prefix for r in ranges]))
+
+        range_weights = zipf_weights(len(ranges), 0.8)
+        user_weights = zipf_weights(len(users))
+        used = []
+        batch_size, transaction_size = self.options['batch_size'], self.options['transaction_size']
+        with explicit_timestamps(BarcodeAssignment._meta.get_field('assigned_at')):
+            for start, count in chunks(assignment_count, transaction_size):
+                with transaction.atomic():
+                    for _, batch in chunks(count, batch_size):
+                        rows = []
+                        for barcode_range in self.rng.choices(ranges, cum_weights=range_weights, k=batch):
+                            if barcode_range.current_number > barcode_range.end_number:
+                                barcode_range.end_number += size
+                            number = f'{barcode_range.prefix}{barcode_range.current_number:07d}'
+                            barcode_range.current_number += 1
+                            is_used = self.rng.random() < 0.7
+                            if is_used:
+                                used.append(number)
+                            rows.append(BarcodeAssignment(
+                                barcode_number=number, barcode_range=barcode_range,
+                                assigned_to_id=self.rng.choices(users, cum_weights=user_weights)[0],
+                                assigned_at=self.timestamp(), purpose=self.words('de', 1, 3),
+                                is_used=is_used,
+                            ))
+                        BarcodeAssignment.objects.bulk_create(rows)
+                self.stdout.write(f'  {start + count}/{assignment_count} barcode assignments')
+        BarcodeRange.objects.bulk_update(ranges, ['current_number', 'end_number'], batch_size=500)
+        self.stdout.write(f'✓ {len(ranges)} barcode ranges, {assignment_count} assignments')
+        return used
+
+    def create_documents(self, total, users, projects, doc_types, export_controls, used_barcodes):
+        project_weights = zipf_weights(len(projects))
+        user_weights = zipf_weights(len(users))
+        doc_type_weights = zipf_weights(len(doc_types), 0.7)
+        control_weights = zipf_weights(len(export_controls), 0.9)
+        language_weights = cumulative(weight for _, weight in LANGUAGES)
+        type_weights = cumulative(weight for _, weight, _ in FILE_TYPES)
+        version_weights = cumulative(weight for _, weight in VERSIONS)
+
+        # Used barcodes are printed on random documents
+        barcodes = dict(zip(
+            self.rng.sample(range(total), min(total, len(used_barcodes))), used_barcodes
+        ))
+        fields = [Document._meta.get_field(name) for name in ('publish_date', 'uploaded_at', 'updated_at')]
+        batch_size, transaction_size = self.options['batch_size'], self.options['transaction_size']
+
+        with explicit_timestamps(*fields):
+            for start, count in chunks(total, transaction_size):
+                with transaction.atomic():
+                    for offset, batch in chunks(count, batch_size):
+                        rows = []
+                        for index in range(start + offset, start + offset + batch):
+                            project_id, project_name = self.rng.choices(projects, cum_weights=project_weights)[0]
+                            doc_type = self.rng.choices(doc_types, cum_weights=doc_type_weights)[0]
+                            languages = self.rng.choices(LANGUAGES, cum_weights=language_weights)[0][0]
+                            file_type, _, median = self.rng.choices(FILE_TYPES, cum_weights=type_weights)[0]
+                            uploaded_at = self.timestamp()
+                            updated_at = uploaded_at
+                            if self.rng.random() < 0.2:
+                                updated_at = min(self.until, uploaded_at + timedelta(days=self.rng.expovariate(1 / 60)))
+                            titles = {language: self.title(language, doc_type) for language in languages}
+                            description = self.words(languages[0], 6, 20) if self.rng.random() < 0.4 else ''
+                            document = Document(
+                                doc_type=doc_type, project_id=project_id,
+                                export_control=self.rng.choices(export_controls, cum_weights=control_weights)[0],
+                                document_file=f'documents/{project_name}/synth_{index:08d}.{file_type.lower()}',
+                                original_filename=f'synth_{index:08d}.{file_type.lower()}',
+                                version=self.rng.choices(VERSIONS, cum_weights=version_weights)[0][0],
+                                publish_date=uploaded_at.date(), barcode_number=barcodes.get(index),
+                                title_de=titles.get('de', ''), title_en=titles.get('en', ''),
+                                title_fr=titles.get('fr', ''), description=description,
+                                is_active=self.rng.random() < 0.88,
+                                uploaded_by_id=self.rng.choices(users, cum_weights=user_weights)[0],
+                                uploaded_at=uploaded_at, updated_at=updated_at,
+                                file_size=max(200, int(self.rng.lognormvariate(0, 1.2) * median)),
+                                file_type=file_type,
+                            )
+                            document.update_normalized_fields()
+                            rows.append(document)
+                        Document.objects.bulk_create(rows)
+                        if self.options['files']:
+                            self.create_files(rows)
+                self.stdout.write(f'  {start + count}/{total} documents')
+        self.stdout.write(f'✓ {total} documents')
+
+    def create_files(self, documents):
+        """Sparse files take no disk space beyond their metadata"""
+        for document in documents:
+            path = os.path.join(settings.MEDIA_ROOT, document.document_file.name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as handle:
+                handle.truncate(document.file_size)
+
+    def create_activities(self, total, users):
+        if not total:
+            return
+        document_ids = array('q', Document.objects.order_by().values_list('pk', flat=True).iterator())
+        if not document_ids:
+            raise CommandError('Activities need documents; generate some first')
+        user_weights = zipf_weights(len(users))
+        action_weights = cumulative(weight for _, weight in ACTIONS)
+        labels = dict(UserActivity.ACTION_CHOICES)
+        batch_size, transaction_size = self.options['batch_size'], self.options['transaction_size']
+
+        with explicit_timestamps(UserActivity._meta.get_field('timestamp')):
+            for start, count in chunks(total, transaction_size):
+                with transaction.atomic():
+                    for _, batch in chunks(count, batch_size):
+                        rows = []
+                        actions = self.rng.choices(ACTIONS, cum_weights=action_weights, k=batch)
+                        for action, _ in actions:
+                            document_id = None
+                            description = labels[action]
+                            if action in DOCUMENT_ACTIONS:
+                                # Newer documents are accessed far more often
+                                position = int(len(document_ids) * (1 - self.rng.random() ** 3))
+                                document_id = document_ids[min(position, len(document_ids) - 1)]
+                                description = f'{labels[action]}: #{document_id}'
+                            rows.append(UserActivity(
+                                user_id=self.rng.choices(users, cum_weights=user_weights)[0],
+                                action=action, description=description, document_id=document_id,
+                                ip_address=f'10.{self.rng.randrange(4)}.{self.rng.randrange(256)}.{self.rng.randrange(1, 255)}',
+                                timestamp=self.timestamp(),
+                            ))
+                        UserActivity.objects.bulk_create(rows)
+                self.stdout.write(f'  {start + count}/{total} activities')
+        self.stdout.write(f'✓ {total} activities')
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from findexapp import search
+from findexapp.models import Document
+
+
+class Command(BaseCommand):
+    help = 'Rebuild, repair or optimize the FINDEX full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Drop and rebuild the complete index',
+        )
+        parser.add_argument(
+            '--since-days',
+            type=int,
+            help='Re-index only documents updated within the last N days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of documents re-indexed per transaction',
+        )
+        parser.add_argument(
+            '--merge',
+            type=int,
+            metavar='PAGES',
+            help='Run an incremental segment merge limited to PAGES pages',
+        )
+        parser.add_argument(
+            '--optimize',
+            action='store_true',
+            help='Merge all index segments into one (slow on large indexes)',
+        )
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            raise CommandError('The full-text index requires an SQLite database with FTS5.')
+
+        if options['full']:
+            self.stdout.write('Rebuilding complete search index...')
+            total = search.rebuild_index()
+            self.stdout.write(f'✓ Indexed {total} documents')
+        else:
+            # Incremental repair: drop orphans, add missing rows, refresh recent changes
+            removed = search.purge_orphans()
+            self.stdout.write(f'✓ Removed {removed} orphaned index rows')
+
+            document_ids = set(search.missing_document_ids())
+            if options['since_days'] is not None:
+                since = timezone.now() - timedelta(days=options['since_days'])
+                document_ids.update(
+                    Document.objects.filter(updated_at__gte=since).values_list('id', flat=True)
+                )
+
+            indexed = search.reindex_documents(sorted(document_ids), options['batch_size'])
+            self.stdout.write(f'✓ Re-indexed {indexed} documents')
+
+        if options['merge']:
+            search.merge_index(options['merge'])
+            self.stdout.write(f'✓ Merged up to {options["merge"]} index pages')
+
+        if options['optimize']:
+            self.stdout.write('Optimizing search index...')
+            search.optimize_index()
+            self.stdout.write('✓ Index optimized')
+
+        self.stdout.write(self.style.SUCCESS('✅ Search index maintenance completed'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from findexapp.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized document counters and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report counters that are wrong',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = reconcile(dry_run=options['dry_run'])
+
+        for scope, object_id, stored, expected in sorted(drift):
+            self.stdout.write(
+                f'⚠ {scope} {object_id}: stored {stored[0]}/{stored[1]}, '
+                f'expected {expected[0]}/{expected[1]} (total/active)'
+            )
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('✅ All document counters are correct'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'⚠ {len(drift)} counters are wrong'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ Repaired {len(drift)} counters'))
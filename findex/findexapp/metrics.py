@@ -0,0 +1,232 @@
+"""
+Per-request query and latency metrics.
+
+RequestMetricsMiddleware measures every request: wall time, number and
+duration of database queries, response size and the SQL shapes executed
+more than once. Measurements are aggregated per view in process memory,
+with latencies kept in a logarithmic histogram so percentiles can be read
+at any time and histograms of several windows or workers can be merged.
+Every ``FINDEX_METRICS_FLUSH_INTERVAL`` seconds a worker writes its window
+to RequestMetric and starts a new one.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+# Latency histogram buckets grow by 10%, i.e. percentiles are within 10%
+BUCKET_GROWTH = 1.1
+TOP_QUERIES = 10
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+def normalize_sql(sql):
+    """SQL with literals and parameters replaced, so equal queries compare equal"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+def bucket_for(duration_ms):
+    return max(0, int(math.log(max(duration_ms, 1.0), BUCKET_GROWTH)))
+
+
+def bucket_upper_bound(bucket):
+    return BUCKET_GROWTH ** (bucket + 1)
+
+
+def percentile(histogram, fraction):
+    """Approximate percentile in ms of a {bucket: count} histogram"""
+    total = sum(histogram.values())
+    if not total:
+        return 0
+    threshold = fraction * total
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= threshold:
+            return round(bucket_upper_bound(bucket), 1)
+    return round(bucket_upper_bound(max(histogram)), 1)
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that times queries and counts their shapes"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[normalize_sql(sql)] += 1
+
+    def repeated_shapes(self):
+        return [(shape, count) for shape, count in self.shapes.most_common(TOP_QUERIES) if count > 1]
+
+
+class ViewStats:
+    """Aggregated measurements of one view in the current window"""
+
+    def __init__(self):
+        self.requests = 0
+        self.total_time_ms = 0.0
+        self.db_time_ms = 0.0
+        self.queries = 0
+        self.response_bytes = 0
+        self.histogram = Counter()
+        self.repeated_queries = Counter()
+
+    def add(self, duration_ms, recorder, response_bytes):
+        self.requests += 1
+        self.total_time_ms += duration_ms
+        self.db_time_ms += recorder.duration * 1000
+        self.queries += recorder.count
+        self.response_bytes += response_bytes
+        self.histogram[bucket_for(duration_ms)] += 1
+        for shape, count in recorder.repeated_shapes():
+            self.repeated_queries[shape] += count
+
+    def as_metric_fields(self):
+        return {
+            'requests': self.requests,
+            'total_time_ms': round(self.total_time_ms, 1),
+            'db_time_ms': round(self.db_time_ms, 1),
+            'queries': self.queries,
+            'response_bytes': self.response_bytes,
+            'p50_ms': percentile(self.histogram, 0.50),
+            'p95_ms': percentile(self.histogram, 0.95),
+            'p99_ms': percentile(self.histogram, 0.99),
+            'histogram': {str(bucket): count for bucket, count in self.histogram.items()},
+            'top_queries': [
+                {'sql': shape, 'count': count}
+                for shape, count in self.repeated_queries.most_common(TOP_QUERIES)
+            ],
+        }
+
+
+class MetricsRegistry:
+    """Current window of per-view statistics of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.views = {}
+        self.period_start = timezone.now()
+        self._started = time.monotonic()
+
+    def record(self, view_name, duration_ms, recorder, response_bytes):
+        with self._lock:
+            stats = self.views.setdefault(view_name, ViewStats())
+            stats.add(duration_ms, recorder, response_bytes)
+
+    def snapshot(self):
+        """{view name: metric fields} of the current window"""
+        with self._lock:
+            return {name: stats.as_metric_fields() for name, stats in self.views.items()}
+
+    def flush_due(self):
+        return time.monotonic() - self._started >= getattr(settings, 'FINDEX_METRICS_FLUSH_INTERVAL', 60)
+
+    def flush(self):
+        """Write the current window to RequestMetric and start a new one"""
+        from .models import RequestMetric
+
+        with self._lock:
+            views, period_start = self.views, self.period_start
+            self._reset()
+        if not views:
+            return 0
+        period_end = timezone.now()
+        RequestMetric.objects.bulk_create([
+            RequestMetric(
+                view_name=name, period_start=period_start, period_end=period_end,
+                **stats.as_metric_fields()
+            )
+            for name, stats in views.items()
+        ])
+        retention_days = getattr(settings, 'FINDEX_METRICS_RETENTION_DAYS', 14)
+        RequestMetric.objects.filter(
+            period_end__lt=period_end - timedelta(days=retention_days)
+        ).delete()
+        return len(views)
+
+
+registry = MetricsRegistry()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    func = getattr(match.func, 'view_class', match.func)
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def server_timing(duration_ms, recorder):
+    """Value of the Server-Timing header for one request"""
+    return (
+        f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+        f'app;dur={duration_ms - recorder.duration * 1000:.1f}, '
+        f'total;dur={duration_ms:.1f}'
+    )
+
+
+def merge_metrics(rows):
+    """
+    Combine RequestMetric rows (or snapshot dicts) per view.
+
+    Returns a list of dicts sorted by total time, with percentiles computed
+    from the merged histograms.
+    """
+    merged = {}
+    for row in rows:
+        name = row['view_name']
+        entry = merged.setdefault(name, {
+            'view_name': name, 'requests': 0, 'total_time_ms': 0.0, 'db_time_ms': 0.0,
+            'queries': 0, 'response_bytes': 0, 'histogram': Counter(), 'top_queries': Counter(),
+        })
+        for field in ('requests', 'total_time_ms', 'db_time_ms', 'queries', 'response_bytes'):
+            entry[field] += row[field]
+        for bucket, count in row['histogram'].items():
+            entry['histogram'][int(bucket)] += count
+        for query in row['top_queries']:
+            entry['top_queries'][query['sql']] += query['count']
+
+    report = []
+    for entry in merged.values():
+        requests = entry['requests'] or 1
+        report.append({
+            'view_name': entry['view_name'],
+            'requests': entry['requests'],
+            'total_time_s': round(entry['total_time_ms'] / 1000, 2),
+            'avg_ms': round(entry['total_time_ms'] / requests, 1),
+            'p50_ms': percentile(entry['histogram'], 0.50),
+            'p95_ms': percentile(entry['histogram'], 0.95),
+            'p99_ms': percentile(entry['histogram'], 0.99),
+            'avg_queries': round(entry['queries'] / requests, 1),
+            'avg_db_ms': round(entry['db_time_ms'] / requests, 1),
+            'avg_kb': round(entry['response_bytes'] / requests / 1024, 1),
+            'top_queries': entry['top_queries'].most_common(3),
+        })
+    report.sort(key=lambda item: item['total_time_s'], reverse=True)
+    return report
@@ -0,0 +1,131 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from . import profiling, prometheus, slow_queries
+from .metrics import QueryRecorder, registry, server_timing, view_name
+from .nplusone import NPlusOneDetector
+
+logger = logging.getLogger(__name__)
+
+
+def _shows_server_timing(request):
+    mode = getattr(settings, 'FINDEX_SERVER_TIMING', 'admin')
+    if mode == 'admin':
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_authenticated and user.role == 'admin'
+    return mode == 'all'
+
+
+def _record_when_sent(content, name, duration_ms, recorder):
+    size = 0
+    try:
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+    finally:
+        registry.record(name, duration_ms, recorder, size)
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure time, queries and response size of every request.
+
+    Results are aggregated per view by ``metrics.registry``; the window is
+    written to the database once the response has been sent (see
+    ``signals.flush_request_metrics``). ``FINDEX_SERVER_TIMING`` selects who
+    gets the measurements in a Server-Timing header: ``'admin'``, ``'all'``
+    or ``'off'``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'FINDEX_METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        if _shows_server_timing(request):
+            response['Server-Timing'] = server_timing(duration_ms, recorder)
+
+        name = view_name(request)
+        if name:
+            prometheus.observe_request(name, response.status_code, duration_ms, recorder)
+            if not response.streaming:
+                registry.record(name, duration_ms, recorder, len(response.content))
+            elif response.has_header('Content-Length'):
+                # Files keep being handed to the server's sendfile
+                registry.record(name, duration_ms, recorder, int(response['Content-Length']))
+            else:
+                # Generated while being sent, the size is known at the end
+                response.streaming_content = _record_when_sent(
+                    response.streaming_content, name, duration_ms, recorder
+                )
+        return response
+
+
+class NPlusOneMiddleware:
+    """
+    Report query shapes repeated within a request.
+
+    ``FINDEX_NPLUSONE`` selects the behaviour: ``'log'`` writes a warning per
+    repeated shape, ``'raise'`` fails the request with NPlusOneError,
+    ``'off'`` disables the detector.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = getattr(settings, 'FINDEX_NPLUSONE', 'off')
+        if mode not in ('log', 'raise'):
+            return self.get_response(request)
+
+        detector = NPlusOneDetector(raise_errors=mode == 'raise')
+        with connection.execute_wrapper(detector):
+            response = self.get_response(request)
+        for description in detector.report():
+            logger.warning('N+1 queries in %s %s\n%s', request.method, request.path, description)
+        return response
+
+
+class ProfilerMiddleware:
+    """Run requests of admins asking for it under the profiler, see ``profiling``"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if getattr(settings, 'FINDEX_PROFILER_ENABLED', True) and profiling.is_requested(request):
+            return profiling.profile_request(request, self.get_response, view_name)
+        return self.get_response(request)
+
+
+class SlowQueryMiddleware:
+    """Log statements slower than ``FINDEX_SLOW_QUERY_MS``, see ``slow_queries``"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = getattr(settings, 'FINDEX_SLOW_QUERY_MS', 200)
+        if not threshold:
+            return self.get_response(request)
+
+        recorder = slow_queries.SlowQueryRecorder(threshold)
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        if recorder.entries:
+            try:
+                slow_queries.flush(recorder.entries, view_name(request), request.path)
+            except Exception:
+                logger.exception('Writing the slow query log failed')
+        return response
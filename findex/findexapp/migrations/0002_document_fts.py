@@ -0,0 +1,74 @@
+from django.db import migrations
+
+
+FTS_COLUMNS = [
+    'title_de', 'title_en', 'title_fr', 'description',
+    'barcode_number', 'version', 'document_file',
+]
+
+
+def _new_values():
+    return ', '.join(f"coalesce(new.{column}, '')" for column in FTS_COLUMNS)
+
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE findexapp_document_fts USING fts5(
+        %s,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """ % ', '.join(FTS_COLUMNS),
+    """
+    CREATE TRIGGER findexapp_document_fts_ai AFTER INSERT ON findexapp_document BEGIN
+        INSERT INTO findexapp_document_fts(rowid, %s) VALUES (new.id, %s);
+    END
+    """ % (', '.join(FTS_COLUMNS), _new_values()),
+    """
+    CREATE TRIGGER findexapp_document_fts_ad AFTER DELETE ON findexapp_document BEGIN
+        DELETE FROM findexapp_document_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER findexapp_document_fts_au AFTER UPDATE OF %s ON findexapp_document BEGIN
+        DELETE FROM findexapp_document_fts WHERE rowid = old.id;
+        INSERT INTO findexapp_document_fts(rowid, %s) VALUES (new.id, %s);
+    END
+    """ % (', '.join(FTS_COLUMNS), ', '.join(FTS_COLUMNS), _new_values()),
+    """
+    INSERT INTO findexapp_document_fts(rowid, %s)
+    SELECT id, %s FROM findexapp_document
+    """ % (', '.join(FTS_COLUMNS), ', '.join(f"coalesce({column}, '')" for column in FTS_COLUMNS)),
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS findexapp_document_fts_au',
+    'DROP TRIGGER IF EXISTS findexapp_document_fts_ad',
+    'DROP TRIGGER IF EXISTS findexapp_document_fts_ai',
+    'DROP TABLE IF EXISTS findexapp_document_fts',
+]
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findexapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
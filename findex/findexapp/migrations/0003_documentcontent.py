@@ -0,0 +1,132 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:39
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+DOCUMENT_COLUMNS = [
+    'title_de', 'title_en', 'title_fr', 'description',
+    'barcode_number', 'version', 'document_file',
+]
+FTS_COLUMNS = DOCUMENT_COLUMNS + ['content']
+
+
+def _reindex_sql(document_id):
+    """Statements replacing the FTS row of one document"""
+    sources = ', '.join(
+        [f"coalesce(d.{column}, '')" for column in DOCUMENT_COLUMNS] + ["coalesce(c.text, '')"]
+    )
+    return f"""
+        DELETE FROM findexapp_document_fts WHERE rowid = {document_id};
+        INSERT INTO findexapp_document_fts(rowid, {', '.join(FTS_COLUMNS)})
+        SELECT d.id, {sources}
+        FROM findexapp_document d
+        LEFT JOIN findexapp_documentcontent c ON c.document_id = d.id
+        WHERE d.id = {document_id};
+    """
+
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS findexapp_documentcontent_fts_ad',
+    'DROP TRIGGER IF EXISTS findexapp_documentcontent_fts_au',
+    'DROP TRIGGER IF EXISTS findexapp_documentcontent_fts_ai',
+    'DROP TRIGGER IF EXISTS findexapp_document_fts_au',
+    'DROP TRIGGER IF EXISTS findexapp_document_fts_ad',
+    'DROP TRIGGER IF EXISTS findexapp_document_fts_ai',
+    'DROP TABLE IF EXISTS findexapp_document_fts',
+]
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE findexapp_document_fts USING fts5(
+        %s,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """ % ', '.join(FTS_COLUMNS),
+    """
+    CREATE TRIGGER findexapp_document_fts_ai AFTER INSERT ON findexapp_document BEGIN
+        %s
+    END
+    """ % _reindex_sql('new.id'),
+    """
+    CREATE TRIGGER findexapp_document_fts_ad AFTER DELETE ON findexapp_document BEGIN
+        DELETE FROM findexapp_document_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER findexapp_document_fts_au AFTER UPDATE OF %s ON findexapp_document BEGIN
+        %s
+    END
+    """ % (', '.join(DOCUMENT_COLUMNS), _reindex_sql('new.id')),
+    """
+    CREATE TRIGGER findexapp_documentcontent_fts_ai AFTER INSERT ON findexapp_documentcontent BEGIN
+        %s
+    END
+    """ % _reindex_sql('new.document_id'),
+    """
+    CREATE TRIGGER findexapp_documentcontent_fts_au AFTER UPDATE OF text ON findexapp_documentcontent BEGIN
+        %s
+    END
+    """ % _reindex_sql('new.document_id'),
+    """
+    CREATE TRIGGER findexapp_documentcontent_fts_ad AFTER DELETE ON findexapp_documentcontent BEGIN
+        %s
+    END
+    """ % _reindex_sql('old.document_id'),
+    """
+    INSERT INTO findexapp_document_fts(rowid, %s)
+    SELECT d.id, %s
+    FROM findexapp_document d
+    LEFT JOIN findexapp_documentcontent c ON c.document_id = d.id
+    """ % (
+        ', '.join(FTS_COLUMNS),
+        ', '.join([f"coalesce(d.{column}, '')" for column in DOCUMENT_COLUMNS] + ["coalesce(c.text, '')"]),
+    ),
+]
+
+
+def recreate_fts(apps, schema_editor):
+    """Add the extracted file content as an FTS column"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL + CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def restore_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+    create_fts = import_module('findexapp.migrations.0002_document_fts').create_fts
+    create_fts(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findexapp', '0002_document_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField(blank=True)),
+                ('page_count', models.IntegerField(blank=True, null=True)),
+                ('sheet_names', models.JSONField(blank=True, default=list)),
+                ('properties', models.JSONField(blank=True, default=dict)),
+                ('is_truncated', models.BooleanField(default=False)),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('source_size', models.BigIntegerField(blank=True, null=True)),
+                ('source_mtime', models.FloatField(blank=True, null=True)),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='content', to='findexapp.document')),
+            ],
+        ),
+        migrations.RunPython(recreate_fts, restore_fts),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+from findexapp.migrations import _fts
+from findexapp.normalization import normalize_search_text
+
+
+PREVIOUS_COLUMNS = [
+    'title_de', 'title_en', 'title_fr', 'description',
+    'barcode_number', 'version', 'document_file',
+]
+DOCUMENT_COLUMNS = PREVIOUS_COLUMNS + [
+    'title_de_norm', 'title_en_norm', 'title_fr_norm', 'description_norm',
+]
+NORMALIZED_FIELDS = {
+    'title_de_norm': 'title_de',
+    'title_en_norm': 'title_en',
+    'title_fr_norm': 'title_fr',
+    'description_norm': 'description',
+}
+
+
+def drop_fts(apps, schema_editor):
+    _fts.drop_index(schema_editor)
+
+
+def create_fts(apps, schema_editor):
+    """Index the normalized columns next to the original ones"""
+    _fts.create_index(schema_editor, DOCUMENT_COLUMNS)
+
+
+def create_previous_fts(apps, schema_editor):
+    _fts.create_index(schema_editor, PREVIOUS_COLUMNS)
+
+
+def populate_normalized_fields(apps, schema_editor):
+    Document = apps.get_model('findexapp', 'Document')
+    batch = []
+    for document in Document.objects.only(*NORMALIZED_FIELDS.values()).iterator(chunk_size=2000):
+        for target, source in NORMALIZED_FIELDS.items():
+            setattr(document, target, normalize_search_text(getattr(document, source)))
+        batch.append(document)
+        if len(batch) >= 2000:
+            Document.objects.bulk_update(batch, list(NORMALIZED_FIELDS))
+            batch = []
+    if batch:
+        Document.objects.bulk_update(batch, list(NORMALIZED_FIELDS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findexapp', '0003_documentcontent'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_fts, create_previous_fts),
+        migrations.AddField(
+            model_name='document',
+            name='description_norm',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='title_de_norm',
+            field=models.CharField(blank=True, editable=False, max_length=400),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='title_en_norm',
+            field=models.CharField(blank=True, editable=False, max_length=400),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='title_fr_norm',
+            field=models.CharField(blank=True, editable=False, max_length=400),
+        ),
+        migrations.RunPython(populate_normalized_fields, migrations.RunPython.noop),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findexapp', '0004_document_normalized_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='barcodeassignment',
+            index=models.Index(fields=['assigned_at'], name='barcodeassign_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='barcoderange',
+            index=models.Index(fields=['created_at'], name='barcoderange_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='barcoderange',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at'], name='barcoderange_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['uploaded_at'], name='document_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['uploaded_at'], name='document_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['project', 'uploaded_at'], name='document_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['timestamp'], name='activity_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['user', 'timestamp'], name='activity_user_idx'),
+        ),
+    ]
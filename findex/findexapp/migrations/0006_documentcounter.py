@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:52
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+SCOPES = {
+    'project': 'project_id',
+    'doc_type': 'doc_type_id',
+    'export_control': 'export_control_id',
+}
+
+
+def populate_counters(apps, schema_editor):
+    Document = apps.get_model('findexapp', 'Document')
+    DocumentCounter = apps.get_model('findexapp', 'DocumentCounter')
+    counts = dict(total=Count('id'), active=Count('id', filter=Q(is_active=True)))
+
+    counters = [DocumentCounter(scope='global', object_id=0, **Document.objects.aggregate(**counts))]
+    for scope, column in SCOPES.items():
+        for row in Document.objects.order_by().values(column).annotate(**counts):
+            counters.append(DocumentCounter(
+                scope=scope, object_id=row[column], total=row['total'], active=row['active']
+            ))
+    DocumentCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findexapp', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Global'), ('project', 'Project'), ('doc_type', 'Document Type'), ('export_control', 'Export Control')], max_length=20)),
+                ('object_id', models.BigIntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('active', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'object_id'), name='documentcounter_unique_scope')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
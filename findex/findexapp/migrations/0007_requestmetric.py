@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findexapp', '0006_documentcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view_name', models.CharField(max_length=200)),
+                ('period_start', models.DateTimeField()),
+                ('period_end', models.DateTimeField()),
+                ('requests', models.IntegerField(default=0)),
+                ('total_time_ms', models.FloatField(default=0)),
+                ('db_time_ms', models.FloatField(default=0)),
+                ('queries', models.IntegerField(default=0)),
+                ('response_bytes', models.BigIntegerField(default=0)),
+                ('p50_ms', models.FloatField(default=0)),
+                ('p95_ms', models.FloatField(default=0)),
+                ('p99_ms', models.FloatField(default=0)),
+                ('histogram', models.JSONField(default=dict)),
+                ('top_queries', models.JSONField(default=list)),
+            ],
+            options={
+                'ordering': ['-period_end'],
+                'indexes': [models.Index(fields=['period_end'], name='requestmetric_period_idx')],
+            },
+        ),
+    ]
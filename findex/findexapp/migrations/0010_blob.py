@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:21
+
+import os
+
+import django.db.models.deletion
+import findexapp.models
+import findexapp.storage
+from django.db import migrations, models
+
+from findexapp.migrations import _fts
+
+
+PREVIOUS_COLUMNS = [
+    'title_de', 'title_en', 'title_fr', 'description', 'barcode_number', 'version',
+    'document_file', 'title_de_norm', 'title_en_norm', 'title_fr_norm', 'description_norm',
+]
+# File names are searched by their original name, stored files are named by hash
+DOCUMENT_COLUMNS = [
+    'original_filename' if column == 'document_file' else column for column in PREVIOUS_COLUMNS
+]
+
+
+def drop_fts(apps, schema_editor):
+    _fts.drop_index(schema_editor)
+
+
+def create_fts(apps, schema_editor):
+    _fts.create_index(schema_editor, DOCUMENT_COLUMNS)
+
+
+def create_previous_fts(apps, schema_editor):
+    _fts.create_index(schema_editor, PREVIOUS_COLUMNS)
+
+
+def populate_original_filenames(apps, schema_editor):
+    Document = apps.get_model('findexapp', 'Document')
+    batch = []
+    for document in Document.objects.only('document_file').iterator(chunk_size=2000):
+        document.original_filename = os.path.basename(document.document_file.name)[:255]
+        batch.append(document)
+        if len(batch) >= 2000:
+            Document.objects.bulk_update(batch, ['original_filename'])
+            batch = []
+    if batch:
+        Document.objects.bulk_update(batch, ['original_filename'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findexapp', '0009_archivejob'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_fts, create_previous_fts),
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='original_filename',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='document_file',
+            field=findexapp.models.DocumentFileField(storage=findexapp.storage.get_document_storage, upload_to=findexapp.models.document_upload_path),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='documents', to='findexapp.blob'),
+        ),
+        migrations.RunPython(populate_original_filenames, migrations.RunPython.noop),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:41
+
+from django.db import migrations, models
+
+
+def fail_duplicate_jobs(apps, schema_editor):
+    """Keep the newest unfinished job per selection, the constraint allows one"""
+    ArchiveJob = apps.get_model('findexapp', 'ArchiveJob')
+    seen = set()
+    for job in ArchiveJob.objects.filter(status__in=['pending', 'running']).order_by('-created_at'):
+        if job.key in seen:
+            ArchiveJob.objects.filter(pk=job.pk).update(status='failed', error='Doppelter Auftrag')
+        seen.add(job.key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findexapp', '0012_dataversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='archivejob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('key',), name='archivejob_active_key_unique'),
+        ),
+    ]
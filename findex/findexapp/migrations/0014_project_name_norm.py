@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+from findexapp.normalization import normalize_search_text
+
+
+def populate_name_norm(apps, schema_editor):
+    Project = apps.get_model('findexapp', 'Project')
+    projects = list(Project.objects.only('name'))
+    for project in projects:
+        project.name_norm = normalize_search_text(project.name)
+    Project.objects.bulk_update(projects, ['name_norm'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findexapp', '0013_archivejob_active_key_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='name_norm',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(populate_name_norm, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+from findexapp.migrations import _fts
+from findexapp.normalization import folded_search_text, normalize_search_text
+
+
+DOCUMENT_COLUMNS = [
+    'title_de', 'title_en', 'title_fr', 'description', 'barcode_number', 'version',
+    'original_filename', 'title_de_norm', 'title_en_norm', 'title_fr_norm', 'description_norm',
+]
+NORMALIZED_FIELDS = {
+    'title_de_norm': 'title_de',
+    'title_en_norm': 'title_en',
+    'title_fr_norm': 'title_fr',
+    'description_norm': 'description',
+}
+
+
+def drop_fts(apps, schema_editor):
+    _fts.drop_index(schema_editor)
+
+
+def create_fts(apps, schema_editor):
+    _fts.create_index(schema_editor, DOCUMENT_COLUMNS)
+
+
+def populate_spellings(apps, schema_editor):
+    Document = apps.get_model('findexapp', 'Document')
+    batch = []
+    for document in Document.objects.only(*NORMALIZED_FIELDS.values()).iterator(chunk_size=2000):
+        for target, source in NORMALIZED_FIELDS.items():
+            setattr(document, target, folded_search_text(getattr(document, source)))
+        batch.append(document)
+        if len(batch) >= 2000:
+            Document.objects.bulk_update(batch, list(NORMALIZED_FIELDS))
+            batch = []
+    if batch:
+        Document.objects.bulk_update(batch, list(NORMALIZED_FIELDS))
+
+    Project = apps.get_model('findexapp', 'Project')
+    projects = list(Project.objects.only('name'))
+    for project in projects:
+        project.name_plain = normalize_search_text(project.name, expand_umlauts=False)
+    Project.objects.bulk_update(projects, ['name_plain'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findexapp', '0014_project_name_norm'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_fts, create_fts),
+        migrations.AddField(
+            model_name='project',
+            name='name_plain',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='title_de_norm',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='title_en_norm',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='title_fr_norm',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(populate_spellings, migrations.RunPython.noop),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,106 @@
+"""
+Shared SQL for the FTS5 search index used by schema migrations.
+
+Rebuilding ``findexapp_document`` on SQLite (AddField, AlterField, ...) drops
+its triggers and fails on triggers of other tables that reference it, so
+migrations touching the document table drop the index first and create it
+again afterwards. The leading underscore keeps the migration loader from
+treating this module as a migration.
+"""
+
+CONTENT_SOURCE = "coalesce(c.text, '')"
+
+
+def _sources(document_columns):
+    return ', '.join(
+        [f"coalesce(d.{column}, '')" for column in document_columns] + [CONTENT_SOURCE]
+    )
+
+
+def _reindex_sql(document_columns, document_id):
+    """Statements replacing the FTS row of one document"""
+    fts_columns = ', '.join(document_columns + ['content'])
+    return f"""
+        DELETE FROM findexapp_document_fts WHERE rowid = {document_id};
+        INSERT INTO findexapp_document_fts(rowid, {fts_columns})
+        SELECT d.id, {_sources(document_columns)}
+        FROM findexapp_document d
+        LEFT JOIN findexapp_documentcontent c ON c.document_id = d.id
+        WHERE d.id = {document_id};
+    """
+
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS findexapp_documentcontent_fts_ad',
+    'DROP TRIGGER IF EXISTS findexapp_documentcontent_fts_au',
+    'DROP TRIGGER IF EXISTS findexapp_documentcontent_fts_ai',
+    'DROP TRIGGER IF EXISTS findexapp_document_fts_au',
+    'DROP TRIGGER IF EXISTS findexapp_document_fts_ad',
+    'DROP TRIGGER IF EXISTS findexapp_document_fts_ai',
+    'DROP TABLE IF EXISTS findexapp_document_fts',
+]
+
+
+def create_sql(document_columns):
+    """Statements creating and filling the index over the given columns"""
+    fts_columns = ', '.join(document_columns + ['content'])
+    return [
+        f"""
+        CREATE VIRTUAL TABLE findexapp_document_fts USING fts5(
+            {fts_columns},
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """,
+        f"""
+        CREATE TRIGGER findexapp_document_fts_ai AFTER INSERT ON findexapp_document BEGIN
+            {_reindex_sql(document_columns, 'new.id')}
+        END
+        """,
+        """
+        CREATE TRIGGER findexapp_document_fts_ad AFTER DELETE ON findexapp_document BEGIN
+            DELETE FROM findexapp_document_fts WHERE rowid = old.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER findexapp_document_fts_au
+        AFTER UPDATE OF {', '.join(document_columns)} ON findexapp_document BEGIN
+            {_reindex_sql(document_columns, 'new.id')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER findexapp_documentcontent_fts_ai AFTER INSERT ON findexapp_documentcontent BEGIN
+            {_reindex_sql(document_columns, 'new.document_id')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER findexapp_documentcontent_fts_au AFTER UPDATE OF text ON findexapp_documentcontent BEGIN
+            {_reindex_sql(document_columns, 'new.document_id')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER findexapp_documentcontent_fts_ad AFTER DELETE ON findexapp_documentcontent BEGIN
+            {_reindex_sql(document_columns, 'old.document_id')}
+        END
+        """,
+        f"""
+        INSERT INTO findexapp_document_fts(rowid, {fts_columns})
+        SELECT d.id, {_sources(document_columns)}
+        FROM findexapp_document d
+        LEFT JOIN findexapp_documentcontent c ON c.document_id = d.id
+        """,
+    ]
+
+
+def drop_index(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+def create_index(schema_editor, document_columns):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL + create_sql(document_columns):
+        schema_editor.execute(statement)
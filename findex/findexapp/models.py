@@ -1,8 +1,14 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.fields.files import FieldFile
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.core.validators import RegexValidator
 import os
+from collections import Counter
+
+from .normalization import folded_search_text, normalize_search_text
+from .storage import blob_digest, blob_name, get_document_storage
+from .versioning import bump_version
 
 
 class User(AbstractUser):
@@ -26,6 +32,10 @@ class User(AbstractUser):
 class Project(models.Model):
     """Project model for document categorization"""
     name = models.CharField(max_length=100, unique=True)
+    # Folded like the document titles, once with umlauts expanded and once
+    # without; suggestions range-scan both indexes
+    name_norm = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+    name_plain = models.CharField(max_length=100, blank=True, editable=False, db_index=True)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -37,6 +47,14 @@ class Project(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.name_norm = normalize_search_text(self.name)
+        self.name_plain = normalize_search_text(self.name, expand_umlauts=False)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'name_norm', 'name_plain'}
+        super().save(*args, **kwargs)
+
 
 class DocType(models.Model):
     """Document type model"""
@@ -72,11 +90,130 @@ def document_upload_path(instance, filename):
     return f'documents/{instance.project.name}/{filename}'
 
 
+class DocumentFieldFile(FieldFile):
+    """Keeps the uploaded name, the storage names the file after its content"""
+
+    def save(self, name, content, save=True):
+        self.instance.original_filename = os.path.basename(name)
+        super().save(name, content, save)
+
+
+class DocumentFileField(models.FileField):
+    attr_class = DocumentFieldFile
+
+
+class Blob(models.Model):
+    """Stored file content, named by its SHA-256 (see storage.py)"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    # Number of documents using this file
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} references)"
+
+    @property
+    def name(self):
+        return blob_name(self.sha256)
+
+    @classmethod
+    def acquire(cls, sha256, size, count=1):
+        """Add references to the blob, creating its row on first use"""
+        with transaction.atomic():
+            while True:
+                blob, _ = cls.objects.get_or_create(sha256=sha256, defaults={'size': size})
+                # Zero when purge() removed the row since; it is created again then
+                if cls.objects.filter(pk=blob.pk).update(ref_count=models.F('ref_count') + count):
+                    break
+            # The row is now held, so purge() cannot remove the file any more. It may
+            # have done so just before, after the storage found the file still there.
+            if not get_document_storage().exists(blob.name):
+                raise FileNotFoundError(f'Blob {sha256} was removed while it was stored again')
+        return blob
+
+    @classmethod
+    def release(cls, pk, count=1):
+        """Drop references; the file goes with the last one once the transaction commits"""
+        cls.objects.filter(pk=pk).update(ref_count=models.F('ref_count') - count)
+        if cls.objects.filter(pk=pk, ref_count__lte=0).exists():
+            transaction.on_commit(lambda: cls.purge(pk))
+
+    @classmethod
+    def purge(cls, pk):
+        """Delete an unreferenced blob and its file; returns whether it was deleted"""
+        with transaction.atomic():
+            blob = cls.objects.filter(pk=pk, ref_count__lte=0).first()
+            # Deleting the row first keeps acquire() waiting until the file is gone
+            if blob is None or not cls.objects.filter(pk=pk, ref_count__lte=0).delete()[0]:
+                return False
+            get_document_storage().delete(blob.name)
+        return True
+
+
+# Document columns that determine which counters a document contributes to
+COUNTED_FIELDS = ('project_id', 'doc_type_id', 'export_control_id', 'is_active')
+# Columns Document.save() derives from another one
+DERIVED_FIELDS = {
+    'document_file': ('file_size', 'file_type', 'blob'),
+    'title_de': ('title_de_norm',),
+    'title_en': ('title_en_norm',),
+    'title_fr': ('title_fr_norm',),
+    'description': ('description_norm',),
+}
+
+
+class DocumentQuerySet(models.QuerySet):
+    """QuerySet that invalidates cached search results on bulk writes"""
+
+    def update(self, **kwargs):
+        from .counters import documents_regrouped, group_counts
+
+        counted = {field.removesuffix('_id') for field in COUNTED_FIELDS}
+        if counted.isdisjoint(name.removesuffix('_id') for name in kwargs):
+            rows = super().update(**kwargs)
+        else:
+            # Moving documents between projects, types or states shifts counters
+            with transaction.atomic(using=self.db):
+                ids = list(self.values_list('pk', flat=True))
+                before = group_counts(Document.objects.filter(pk__in=ids))
+                rows = super().update(**kwargs)
+                documents_regrouped(before, group_counts(Document.objects.filter(pk__in=ids)))
+        bump_version()
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        from .counters import documents_regrouped, group_counts
+
+        with transaction.atomic(using=self.db):
+            before = group_counts(self)
+            blobs = Counter(self.exclude(blob=None).values_list('blob_id', flat=True))
+            result = super().delete()
+            documents_regrouped(before, {})
+            for blob_id, count in blobs.items():
+                Blob.release(blob_id, count)
+        bump_version()
+        return result
+
+    delete.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .counters import documents_regrouped
+
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            documents_regrouped({}, Counter(obj.counted_state() for obj in objs))
+        bump_version()
+        return objs
+
+
 class Document(models.Model):
     """Main document model with all required fields"""
     # Required fields
     doc_type = models.ForeignKey(DocType, on_delete=models.PROTECT)
-    document_file = models.FileField(upload_to=document_upload_path)
+    document_file = DocumentFileField(upload_to=document_upload_path, storage=get_document_storage)
     version = models.CharField(max_length=50)
     publish_date = models.DateField(auto_now_add=True)
     project = models.ForeignKey(Project, on_delete=models.PROTECT)
@@ -103,25 +240,143 @@ class Document(models.Model):
     # File metadata
     file_size = models.BigIntegerField(null=True, blank=True)
     file_type = models.CharField(max_length=10, blank=True)
+    # Name of the uploaded file; document_file is named after its content
+    original_filename = models.CharField(max_length=255, blank=True)
+    blob = models.ForeignKey(
+        Blob, on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='documents'
+    )
+    
+    # Folded copies for accent and umlaut insensitive search, set in save()
+    title_de_norm = models.TextField(blank=True, editable=False)
+    title_en_norm = models.TextField(blank=True, editable=False)
+    title_fr_norm = models.TextField(blank=True, editable=False)
+    description_norm = models.TextField(blank=True, editable=False)
+
+    objects = DocumentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            # Listings are ordered by (uploaded_at, id); SQLite appends the rowid itself
+            models.Index(fields=['uploaded_at'], name='document_uploaded_idx'),
+            # Boolean filters compile to a bare "is_active" predicate that SQLite
+            # cannot seek on, so active documents get partial indexes instead
+            models.Index(
+                fields=['uploaded_at'], name='document_active_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(
+                fields=['project', 'uploaded_at'], name='document_project_idx',
+                condition=models.Q(is_active=True)
+            ),
+        ]
 
     def __str__(self):
         title = self.title_de or self.title_en or self.title_fr or 'Untitled'
         return f"{title} ({self.version})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Deferred fields would be loaded one query each; save() looks them up instead
+        if all(field in instance.__dict__ for field in COUNTED_FIELDS):
+            instance._counted_state = instance.counted_state()
+        if 'blob_id' in instance.__dict__ and 'document_file' in instance.__dict__:
+            instance._stored_file = (instance.blob_id, instance.__dict__['document_file'])
+        return instance
+
     def save(self, *args, **kwargs):
+        from .counters import document_changed
+
+        if self.document_file and not self.document_file._committed:
+            # Store the upload before the row, the blob it ends up in is linked below
+            self.document_file.save(self.document_file.name, self.document_file.file, save=False)
         if self.document_file:
             self.file_size = self.document_file.size
-            self.file_type = os.path.splitext(self.document_file.name)[1][1:].upper()
-        super().save(*args, **kwargs)
+            self.file_type = os.path.splitext(self.download_name)[1][1:].upper()
+        self.update_normalized_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            # The counters follow the instance and searches the updated_at watermark
+            update_fields = {*update_fields, 'updated_at', *COUNTED_FIELDS}
+            for source, derived in DERIVED_FIELDS.items():
+                if source in update_fields:
+                    update_fields.update(derived)
+            kwargs['update_fields'] = update_fields
+        saves_file = update_fields is None or 'document_file' in update_fields
+
+        previous = None
+        stored_file = (None, None)
+        if not self._state.adding:
+            previous = getattr(self, '_counted_state', None)
+            if previous is None:
+                previous = Document.objects.filter(pk=self.pk).values_list(*COUNTED_FIELDS).first()
+            stored_file = getattr(self, '_stored_file', None)
+            if stored_file is None and saves_file:
+                stored_file = Document.objects.filter(pk=self.pk).values_list('blob_id', 'document_file').first()
+        # Read by the post_save receiver that queues text extraction
+        self._file_changed = (
+            saves_file and bool(self.document_file) and self.document_file.name != (stored_file or (None, None))[1]
+        )
+        with transaction.atomic(using=kwargs.get('using')):
+            released = self._link_blob(stored_file) if saves_file else None
+            super().save(*args, **kwargs)
+            document_changed(previous, self.counted_state())
+            if released:
+                Blob.release(released)
+        self._counted_state = self.counted_state()
+        if saves_file:
+            self._stored_file = (self.blob_id, self.document_file.name)
+
+    def _link_blob(self, stored_file):
+        """Point ``blob`` at the stored content; returns the id of a blob no longer used"""
+        stored_blob_id, stored_name = stored_file or (None, None)
+        name = self.document_file.name or ''
+        if name == stored_name and self.blob_id == stored_blob_id:
+            return None
+        digest = blob_digest(name)
+        self.blob = Blob.acquire(digest, self.file_size) if digest else None
+        return stored_blob_id
+
+    def delete(self, *args, **kwargs):
+        from .counters import document_changed
+
+        # Decrement the counters of the stored row, not of unsaved changes
+        row = Document.objects.filter(pk=self.pk).values_list('blob_id', *COUNTED_FIELDS).first()
+        blob_id, stored = (row[0], row[1:]) if row else (None, None)
+        with transaction.atomic(using=kwargs.get('using')):
+            result = super().delete(*args, **kwargs)
+            document_changed(stored, None)
+            if blob_id:
+                Blob.release(blob_id)
+        return result
+
+    def counted_state(self):
+        """Values the document counters are grouped by"""
+        return tuple(getattr(self, field) for field in COUNTED_FIELDS)
+
+    def update_normalized_fields(self):
+        """Refresh the folded search copies of titles and description"""
+        self.title_de_norm = folded_search_text(self.title_de)
+        self.title_en_norm = folded_search_text(self.title_en)
+        self.title_fr_norm = folded_search_text(self.title_fr)
+        self.description_norm = folded_search_text(self.description)
 
     @property
     def primary_title(self):
         """Returns the first available title"""
         return self.title_de or self.title_en or self.title_fr or 'Untitled'
 
+    @property
+    def download_name(self):
+        """File name offered for downloads"""
+        return self.original_filename or os.path.basename(self.document_file.name)
+
+    @property
+    def content_hash(self):
+        """SHA-256 of the file, known for files in content-addressed storage"""
+        return blob_digest(self.document_file.name)
+
     @property
     def file_icon(self):
         """Returns appropriate icon class based on file type"""
@@ -145,6 +400,52 @@ class Document(models.Model):
         return icon_map.get(self.file_type, 'fa-file')
 
 
+class DocumentContent(models.Model):
+    """Plain text and file properties extracted from a document file"""
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='content')
+    text = models.TextField(blank=True)
+    page_count = models.IntegerField(null=True, blank=True)
+    sheet_names = models.JSONField(default=list, blank=True)
+    properties = models.JSONField(default=dict, blank=True)
+    is_truncated = models.BooleanField(default=False)
+    error = models.CharField(max_length=500, blank=True)
+    
+    # Source file state used to skip unchanged files
+    source_size = models.BigIntegerField(null=True, blank=True)
+    source_mtime = models.FloatField(null=True, blank=True)
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Content of {self.document}"
+
+    def matches_source(self, size, mtime):
+        """Check if the stored extraction belongs to the given file state"""
+        return self.source_size == size and self.source_mtime == mtime
+
+
+class DocumentCounter(models.Model):
+    """Denormalized document counts, maintained by counters.py"""
+    SCOPE_CHOICES = [
+        ('global', 'Global'),
+        ('project', 'Project'),
+        ('doc_type', 'Document Type'),
+        ('export_control', 'Export Control'),
+    ]
+
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    object_id = models.BigIntegerField(default=0)
+    total = models.IntegerField(default=0)
+    active = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'object_id'], name='documentcounter_unique_scope'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.object_id}: {self.active}/{self.total}"
+
+
 class BarcodeRange(models.Model):
     """Barcode range management"""
     prefix = models.CharField(max_length=10)
@@ -157,6 +458,14 @@ class BarcodeRange(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='barcoderange_created_idx'),
+            # Only a handful of ranges are active at any time
+            models.Index(
+                fields=['created_at'], name='barcoderange_active_idx',
+                condition=models.Q(is_active=True)
+            ),
+        ]
 
     def __str__(self):
         return f"{self.prefix}: {self.start_number}-{self.end_number}"
@@ -178,6 +487,9 @@ class BarcodeAssignment(models.Model):
 
     class Meta:
         ordering = ['-assigned_at']
+        indexes = [
+            models.Index(fields=['assigned_at'], name='barcodeassign_assigned_idx'),
+        ]
 
     def __str__(self):
         return f"{self.barcode_number} - {self.purpose}"
@@ -196,10 +508,9 @@ class SystemSettings(models.Model):
 
     @classmethod
     def get_setting(cls, key, default=None):
-        try:
-            return cls.objects.get(key=key).value
-        except cls.DoesNotExist:
-            return default
+        """Raw string value, served from the per-process settings cache"""
+        from .system_settings import settings_cache
+        return settings_cache.raw(key, default)
 
     @classmethod
     def set_setting(cls, key, value, user=None, description=''):
@@ -214,6 +525,15 @@ class SystemSettings(models.Model):
         return setting
 
 
+class DataVersion(models.Model):
+    """Version stamp of a data namespace that caches are keyed by (versioning.py)"""
+    namespace = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.namespace}: {self.version}"
+
+
 class UserActivity(models.Model):
     """Track user activities for audit purposes"""
     ACTION_CHOICES = [
@@ -236,6 +556,139 @@ class UserActivity(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='activity_timestamp_idx'),
+            models.Index(fields=['user', 'timestamp'], name='activity_user_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.get_action_display()} - {self.timestamp}"
+
+
+class RequestMetric(models.Model):
+    """Request statistics of one view over one flush window of one worker"""
+    view_name = models.CharField(max_length=200)
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    requests = models.IntegerField(default=0)
+    total_time_ms = models.FloatField(default=0)
+    db_time_ms = models.FloatField(default=0)
+    queries = models.IntegerField(default=0)
+    response_bytes = models.BigIntegerField(default=0)
+    p50_ms = models.FloatField(default=0)
+    p95_ms = models.FloatField(default=0)
+    p99_ms = models.FloatField(default=0)
+    # Latency histogram (bucket -> count) so windows can be merged for percentiles
+    histogram = models.JSONField(default=dict)
+    top_queries = models.JSONField(default=list)
+
+    class Meta:
+        ordering = ['-period_end']
+        indexes = [
+            models.Index(fields=['period_end'], name='requestmetric_period_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.view_name} ({self.requests} requests until {self.period_end})"
+
+
+class SlowQuery(models.Model):
+    """SQL statement slower than FINDEX_SLOW_QUERY_MS, see slow_queries.py"""
+    timestamp = models.DateTimeField(default=timezone.now)
+    duration_ms = models.FloatField()
+    sql = models.TextField()
+    # Parameters with strings and bytes replaced by their type and length
+    params = models.JSONField(default=list)
+    view_name = models.CharField(max_length=200, blank=True)
+    path = models.CharField(max_length=500, blank=True)
+    origin = models.CharField(max_length=300, blank=True)
+    template = models.CharField(max_length=300, blank=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='slowquery_timestamp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f} ms in {self.view_name or self.path}"
+
+
+class ArchiveJob(models.Model):
+    """ZIP archive of a large selection, built in the background (archive_jobs.py)"""
+    STATUS_CHOICES = [
+        ('pending', 'Wartend'),
+        ('running', 'Wird erstellt'),
+        ('done', 'Fertig'),
+        ('failed', 'Fehlgeschlagen'),
+        ('expired', 'Abgelaufen'),
+    ]
+
+    # Hash of the selected document ids; identical selections share a job
+    key = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    document_ids = models.JSONField(default=list)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    total_files = models.IntegerField(default=0)
+    processed_files = models.IntegerField(default=0)
+    archive_file = models.FileField(upload_to='archives/', blank=True)
+    archive_size = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['key', 'status'], name='archivejob_key_status_idx'),
+        ]
+        constraints = [
+            # Simultaneous requests for one selection share a job
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status__in=['pending', 'running']),
+                name='archivejob_active_key_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Archiv {self.pk} ({self.get_status_display()}, {self.total_files} Dateien)"
+
+    @property
+    def progress(self):
+        """Share of processed files in percent"""
+        if self.status == 'done':
+            return 100
+        if not self.total_files:
+            return 0
+        return int(self.processed_files * 100 / self.total_files)
+
+
+class UploadSession(models.Model):
+    """Resumable upload sent in fixed-size chunks (uploads.py)"""
+    STATUS_CHOICES = [
+        ('open', 'Offen'),
+        ('complete', 'Abgeschlossen'),
+    ]
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Upload {self.pk} ({self.filename}, {self.get_status_display()})"
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def chunk_length(self, index):
+        """Expected size of chunk ``index``; only the last one may be shorter"""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
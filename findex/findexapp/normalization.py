@@ -0,0 +1,43 @@
+"""
+Language normalization for search.
+
+Titles and descriptions are stored a second time in a folded form so that
+"Bräuer", "Braeuer" and "BRÄUER" or "référence" and "reference" compare
+equal. The same function is applied to search queries. Umlauts typed
+without their dots ("Brauer") only match a copy folded without the
+expansion, so the stored copy holds both spellings (``folded_search_text``).
+"""
+import unicodedata
+
+
+# German umlauts are expanded the way they are typed on keyboards without them
+UMLAUT_EXPANSIONS = str.maketrans({
+    'ä': 'ae',
+    'ö': 'oe',
+    'ü': 'ue',
+    'ß': 'ss',
+})
+
+
+def normalize_search_text(value, expand_umlauts=True):
+    """Casefold, expand German umlauts and strip all remaining diacritics"""
+    if not value:
+        return ''
+    # NFC first so decomposed umlauts (a + U+0308) are expanded as well
+    value = unicodedata.normalize('NFC', value).casefold()
+    if expand_umlauts:
+        value = value.translate(UMLAUT_EXPANSIONS)
+    decomposed = unicodedata.normalize('NFKD', value)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def search_variants(value):
+    """Folded spellings of ``value``: umlauts expanded and, if that differs, just undotted"""
+    expanded = normalize_search_text(value)
+    plain = normalize_search_text(value, expand_umlauts=False)
+    return [expanded] if plain == expanded else [expanded, plain]
+
+
+def folded_search_text(value):
+    """Stored search copy of ``value``, one spelling per line"""
+    return '\n'.join(search_variants(value))
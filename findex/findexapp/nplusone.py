@@ -0,0 +1,105 @@
+"""
+Detection of N+1 queries.
+
+NPlusOneDetector watches the SELECT statements of a request or a block of
+code and reports every query shape (see ``metrics.normalize_sql``) that runs
+``FINDEX_NPLUSONE_THRESHOLD`` times or more, typically a related object
+loaded once per row of a list. The report names the template line and the
+application code line the repeated query comes from.
+
+NPlusOneMiddleware logs or raises according to ``FINDEX_NPLUSONE``; tests
+use ``detect_nplusone()``, which raises by default.
+"""
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.template.base import Node
+
+from .metrics import normalize_sql
+
+
+class NPlusOneError(Exception):
+    """Raised when a query shape repeats too often and errors are enabled"""
+
+
+# Modules wrapping query execution; their frames are never the origin of a query
+_SKIPPED_FILES = {
+    os.path.normcase(os.path.join(os.path.dirname(os.path.abspath(__file__)), name))
+    for name in ('nplusone.py', 'middleware.py', 'metrics.py', 'profiling.py', 'slow_queries.py')
+}
+
+
+def _is_application_code(filename):
+    filename = os.path.normcase(os.path.abspath(filename))
+    if filename in _SKIPPED_FILES or 'site-packages' in filename or 'dist-packages' in filename:
+        return False
+    return filename.startswith(os.path.normcase(str(settings.BASE_DIR)))
+
+
+def find_origin():
+    """
+    Where the current query comes from.
+
+    Returns (template, code): ``"name.html:12"`` of the innermost template
+    node being rendered and ``"path.py:34 in function"`` of the innermost
+    application frame, either of them None if there is none.
+    """
+    template = code = None
+    frame = sys._getframe(1)
+    while frame is not None and (template is None or code is None):
+        if template is None:
+            node = frame.f_locals.get('self')
+            # type() rather than isinstance(), which would evaluate lazy objects
+            if issubclass(type(node), Node) and node.origin is not None and node.token is not None:
+                template = f'{node.origin.template_name or node.origin.name}:{node.token.lineno}'
+        if code is None and _is_application_code(frame.f_code.co_filename):
+            filename = os.path.relpath(frame.f_code.co_filename, settings.BASE_DIR)
+            code = f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return template, code
+
+
+class NPlusOneDetector:
+    """connection.execute_wrapper counting SELECT shapes"""
+
+    def __init__(self, threshold=None, raise_errors=False):
+        self.threshold = threshold or getattr(settings, 'FINDEX_NPLUSONE_THRESHOLD', 5)
+        self.raise_errors = raise_errors
+        self.shapes = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            shape = normalize_sql(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == self.threshold:
+                # The stack is only inspected once a shape becomes suspicious
+                self.origins[shape] = find_origin()
+                if self.raise_errors:
+                    raise NPlusOneError(self.describe(shape))
+        return execute(sql, params, many, context)
+
+    def describe(self, shape):
+        template, code = self.origins[shape]
+        lines = [f'Query executed {self.shapes[shape]} times: {shape}']
+        if template:
+            lines.append(f'  template: {template}')
+        if code:
+            lines.append(f'  code: {code}')
+        return '\n'.join(lines)
+
+    def report(self):
+        """Descriptions of all repeated query shapes"""
+        return [self.describe(shape) for shape in self.origins]
+
+
+@contextmanager
+def detect_nplusone(threshold=None, raise_errors=True):
+    """Detect N+1 queries inside the block, raising NPlusOneError by default"""
+    detector = NPlusOneDetector(threshold, raise_errors)
+    with connection.execute_wrapper(detector):
+        yield detector
@@ -0,0 +1,264 @@
+"""
+Keyset (cursor) pagination for document listings.
+
+Pages are addressed by the ``(uploaded_at, id)`` of a boundary row instead of
+an OFFSET, so every page costs one indexed range scan no matter how deep it
+is, and no full COUNT is needed to render the navigation. Plain ``?page=N``
+links keep working for bookmarks; they are answered with a single LIMIT/OFFSET
+query and continue with cursors from there.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+KEYSET_ORDERING = ('-uploaded_at', '-id')
+
+# Cursor directions
+AFTER = 'a'    # rows older than the boundary (next page)
+BEFORE = 'b'   # rows newer than the boundary (previous page)
+LAST = 'l'     # the oldest rows (last page)
+
+
+def encode_cursor(direction, number=None, uploaded_at=None, pk=None):
+    parts = [direction, str(number or '')]
+    if uploaded_at is not None:
+        parts += [uploaded_at.isoformat(), str(pk)]
+    raw = '|'.join(parts).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (direction, number, uploaded_at, pk) or None for invalid cursors"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        direction, number = parts[0], int(parts[1]) if parts[1] else None
+        if direction == LAST:
+            return direction, None, None, None
+        if direction not in (AFTER, BEFORE):
+            return None
+        return direction, number, datetime.fromisoformat(parts[2]), int(parts[3])
+    except (binascii.Error, IndexError, UnicodeDecodeError, ValueError):
+        return None
+
+
+def capped_count(queryset, cap):
+    """Count at most ``cap + 1`` rows; returns (count, is_capped)"""
+    if not cap:
+        return queryset.count(), False
+    count = queryset.order_by()[:cap + 1].count()
+    return min(count, cap), count > cap
+
+
+class KeysetPage:
+    """
+    One page of results.
+
+    Offers the parts of Django's ``Page`` API used by the templates
+    (iteration, ``has_next``, ``has_previous``, ``has_other_pages``,
+    ``number``) plus ``next_cursor``, ``previous_cursor`` and ``last_cursor``
+    for cursor links. ``number`` is None when the position is unknown, e.g.
+    on the last page.
+    """
+
+    def __init__(self, object_list, number=None, has_next=False, has_previous=False,
+                 next_cursor=None, previous_cursor=None, last_cursor=None):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.last_cursor = last_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1 if self.number else None
+
+    def previous_page_number(self):
+        return self.number - 1 if self.number and self.number > 1 else None
+
+
+def _cursor_page(rows, number, has_next, has_previous):
+    """KeysetPage with cursors pointing at the boundary rows"""
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            AFTER, number + 1 if number else None, last.uploaded_at, last.pk
+        )
+    if rows and has_previous:
+        first = rows[0]
+        previous_cursor = encode_cursor(
+            BEFORE, number - 1 if number and number > 1 else None, first.uploaded_at, first.pk
+        )
+    return KeysetPage(
+        rows, number, has_next, has_previous, next_cursor, previous_cursor,
+        last_cursor=encode_cursor(LAST) if has_next else None
+    )
+
+
+class KeysetPaginator:
+    """
+    Paginate a Document queryset ordered by ``(-uploaded_at, -id)``.
+
+    ``get_page`` accepts a cursor produced by a previous page and/or a
+    classic page number and never runs a COUNT query.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset.order_by(*KEYSET_ORDERING)
+        self.per_page = per_page
+
+    def get_page(self, cursor=None, page_number=None):
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self._offset_page(page_number)
+
+        direction, number, uploaded_at, pk = decoded
+        if direction == LAST:
+            return self._last_page()
+
+        if direction == AFTER:
+            rows = list(self.queryset.filter(
+                Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk)
+            )[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            return self._build(rows[:self.per_page], number, has_next, has_previous=True)
+
+        rows = list(self.queryset.filter(
+            Q(uploaded_at__gt=uploaded_at) | Q(uploaded_at=uploaded_at, id__gt=pk)
+        ).order_by('uploaded_at', 'id')[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return self._build(rows, number, has_next=True, has_previous=has_previous)
+
+    def _offset_page(self, page_number):
+        """Page addressed by number, used for the first page and bookmarks"""
+        try:
+            number = max(int(page_number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        if not rows and number > 1:
+            # Bookmark beyond the end: behave like Paginator.get_page
+            return self._last_page()
+        has_next = len(rows) > self.per_page
+        return self._build(rows[:self.per_page], number, has_next, has_previous=number > 1)
+
+    def _last_page(self):
+        rows = list(self.queryset.order_by('uploaded_at', 'id')[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return self._build(rows, None, has_next=False, has_previous=has_previous)
+
+    def _build(self, rows, number, has_next, has_previous):
+        return _cursor_page(rows, number, has_next, has_previous)
+
+
+class OffsetPaginator:
+    """
+    Count-free LIMIT/OFFSET paginator for orderings that have no stable key,
+    such as relevance ranked search results.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def get_page(self, cursor=None, page_number=None):
+        try:
+            number = max(int(page_number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], number, has_next, has_previous=number > 1)
+
+
+class IdListPaginator:
+    """
+    Paginate a cached, ordered list of primary keys.
+
+    Only the rows of the requested page are loaded, with a primary key
+    lookup on ``queryset``. Understands the same cursors and page numbers as
+    the database paginators; with ``cursors=False`` it behaves like
+    ``OffsetPaginator``. ``get_page`` returns None for pages outside of an
+    incomplete id list, the caller then asks the database.
+    """
+
+    def __init__(self, ids, queryset, per_page, complete=True, cursors=True):
+        self.ids = ids
+        self.queryset = queryset
+        self.per_page = per_page
+        self.complete = complete
+        self.cursors = cursors
+
+    def get_page(self, cursor=None, page_number=None):
+        decoded = decode_cursor(cursor) if cursor and self.cursors else None
+        if decoded is None:
+            try:
+                number = max(int(page_number), 1)
+            except (TypeError, ValueError):
+                number = 1
+            start = (number - 1) * self.per_page
+            if start >= len(self.ids) and number > 1:
+                if not self.complete:
+                    return None
+                return self._last_page() if self.cursors else self._build(start, number)
+            return self._build(start, number)
+
+        direction, number, uploaded_at, pk = decoded
+        if direction == LAST:
+            return self._last_page() if self.complete else None
+        try:
+            index = self.ids.index(pk)
+        except ValueError:
+            return None
+        if direction == AFTER:
+            return self._build(index + 1, number)
+        return self._build(max(index - self.per_page, 0), number, end=index)
+
+    def _last_page(self):
+        remainder = len(self.ids) % self.per_page or self.per_page
+        start = max(len(self.ids) - remainder, 0)
+        return self._build(start, start // self.per_page + 1)
+
+    def _build(self, start, number, end=None):
+        if end is None:
+            end = start + self.per_page
+        page_ids = self.ids[start:end]
+        if end >= len(self.ids) and not self.complete:
+            # The window ends inside the cached ids, has_next is unknown
+            return None
+        if start % self.per_page == 0:
+            number = start // self.per_page + 1
+        rows_by_pk = {row.pk: row for row in self.queryset.filter(pk__in=page_ids)}
+        rows = [rows_by_pk[pk] for pk in page_ids if pk in rows_by_pk]
+        has_next = end < len(self.ids)
+        has_previous = start > 0
+        if self.cursors:
+            return _cursor_page(rows, number, has_next, has_previous)
+        return KeysetPage(rows, number, has_next, has_previous)
@@ -0,0 +1,284 @@
+"""
+On-demand request profiling.
+
+An admin adds ``?_profile=1`` to a URL, or sends the ``X-Findex-Profile: 1``
+header, and ProfilerMiddleware runs that request under cProfile. Besides
+the profile itself it records a timeline of all SQL statements and of
+every template render; Template.render is only wrapped while a profiled
+request runs. The result is stored in ``FINDEX_PROFILE_DIR``:
+``<id>.prof`` is a regular pstats file (snakeviz, ``python -m pstats``),
+``<id>.json`` holds the summary shown at /admin/profiles/. Only the newest
+``FINDEX_PROFILE_KEEP`` profiles are kept.
+
+Query parameters are not stored, only the SQL with placeholders.
+"""
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template import base as template_base
+from django.utils import timezone
+
+
+PARAMETER = '_profile'
+HEADER = 'HTTP_X_FINDEX_PROFILE'
+
+TREE_DEPTH = 14
+TREE_MIN_FRACTION = 0.01
+TOP_FUNCTIONS = 40
+MAX_SQL_LENGTH = 2000
+
+_ID_CHARS = set('0123456789abcdef-')
+
+_active = contextvars.ContextVar('findex_profile', default=None)
+
+
+def profile_dir():
+    return str(getattr(settings, 'FINDEX_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+def is_requested(request):
+    if request.GET.get(PARAMETER) not in (None, '', '0') or request.META.get(HEADER) not in (None, '', '0'):
+        user = request.user
+        return user.is_authenticated and user.role == 'admin'
+    return False
+
+
+class Timeline:
+    """SQL statements and template renders of one request, in ms from its start"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = []
+        self.templates = []
+        self._depth = 0
+
+    def offset(self, moment):
+        return round((moment - self.start) * 1000, 3)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.queries.append({
+                'start_ms': self.offset(start),
+                'duration_ms': round((end - start) * 1000, 3),
+                'sql': sql[:MAX_SQL_LENGTH],
+                'many': many,
+            })
+
+
+_original_render = template_base.Template.render
+_timing_lock = threading.Lock()
+_timed_requests = 0
+
+
+def _timed_render(self, context):
+    timeline = _active.get()
+    if timeline is None:
+        return _original_render(self, context)
+    start = time.perf_counter()
+    timeline._depth += 1
+    try:
+        return _original_render(self, context)
+    finally:
+        timeline._depth -= 1
+        timeline.templates.append({
+            'name': (self.origin.template_name if self.origin else None) or self.name,
+            'start_ms': timeline.offset(start),
+            'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+            'depth': timeline._depth,
+        })
+
+
+@contextmanager
+def template_timing():
+    """Route Template.render through _timed_render while any request is profiled"""
+    global _original_render, _timed_requests
+    with _timing_lock:
+        if _timed_requests == 0:
+            _original_render = template_base.Template.render
+            template_base.Template.render = _timed_render
+        _timed_requests += 1
+    try:
+        yield
+    finally:
+        with _timing_lock:
+            _timed_requests -= 1
+            if _timed_requests == 0:
+                template_base.Template.render = _original_render
+
+
+def _function_name(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    if filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages', 1)[1].lstrip(os.sep)
+    return f'{filename}:{line}({name})'
+
+
+def call_tree(stats, root, total):
+    """Nested {name, calls, cumulative_ms, own_ms, children} below ``root``"""
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge))
+
+    def build(func, calls, cumulative, depth, path):
+        own = stats.stats[func][2]
+        node = {
+            'name': _function_name(func),
+            'calls': calls,
+            'cumulative_ms': round(cumulative * 1000, 2),
+            'own_ms': round(own * 1000, 2),
+            'children': [],
+        }
+        if depth >= TREE_DEPTH:
+            return node
+        for callee, edge in sorted(callees.get(func, ()), key=lambda item: -item[1][3]):
+            if edge[3] < total * TREE_MIN_FRACTION or callee in path:
+                continue
+            node['children'].append(build(callee, edge[1], edge[3], depth + 1, path | {callee}))
+        return node
+
+    entry = stats.stats[root]
+    return build(root, entry[1], entry[3], 0, {root})
+
+
+def top_functions(stats):
+    rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:TOP_FUNCTIONS]
+    return [
+        {
+            'name': _function_name(func),
+            'calls': calls,
+            'own_ms': round(own * 1000, 2),
+            'cumulative_ms': round(cumulative * 1000, 2),
+        }
+        for func, (_, calls, own, cumulative, _) in rows
+    ]
+
+
+def _root(stats):
+    """The ``run`` frame every profiled request starts in"""
+    for func in stats.stats:
+        if func[2] == 'run' and func[0] == __file__:
+            return func
+    return None
+
+
+def profile_request(request, get_response, view_name):
+    """Run ``get_response(request)`` under the profiler and store the result"""
+    from django.db import connection
+
+    timeline = Timeline()
+    profiler = cProfile.Profile()
+
+    def run():
+        with connection.execute_wrapper(timeline):
+            return get_response(request)
+
+    token = _active.set(timeline)
+    try:
+        with template_timing():
+            response = profiler.runcall(run)
+    finally:
+        _active.reset(token)
+    duration = time.perf_counter() - timeline.start
+
+    profile_id = f'{timezone.now():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}'
+    stats = pstats.Stats(profiler)
+    root = _root(stats)
+    summary = {
+        'id': profile_id,
+        'created': timezone.now().isoformat(timespec='seconds'),
+        'method': request.method,
+        'path': request.path,
+        'view': view_name(request),
+        'user': request.user.username,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'query_count': len(timeline.queries),
+        'query_ms': round(sum(query['duration_ms'] for query in timeline.queries), 2),
+        'template_ms': round(sum(item['duration_ms'] for item in timeline.templates if item['depth'] == 0), 2),
+        'queries': timeline.queries,
+        'templates': sorted(timeline.templates, key=lambda item: item['start_ms']),
+        'functions': top_functions(stats),
+        'call_tree': call_tree(stats, root, stats.total_tt) if root else None,
+    }
+    store(profile_id, profiler, summary)
+    response['X-Findex-Profile'] = profile_id
+    return response
+
+
+def store(profile_id, profiler, summary):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w', encoding='utf-8') as handle:
+        json.dump(summary, handle)
+    rotate()
+
+
+def rotate():
+    """Delete all but the newest FINDEX_PROFILE_KEEP profiles"""
+    keep = getattr(settings, 'FINDEX_PROFILE_KEEP', 50)
+    for profile_id in list_ids()[keep:]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(os.path.join(profile_dir(), f'{profile_id}.{extension}'))
+            except FileNotFoundError:
+                pass
+
+
+def list_ids():
+    """Stored profile ids, newest first"""
+    try:
+        names = os.listdir(profile_dir())
+    except FileNotFoundError:
+        return []
+    return sorted((name[:-5] for name in names if name.endswith('.json')), reverse=True)
+
+
+def _path(profile_id, extension):
+    if not profile_id or not set(profile_id) <= _ID_CHARS:
+        return None
+    path = os.path.join(profile_dir(), f'{profile_id}.{extension}')
+    return path if os.path.exists(path) else None
+
+
+def load(profile_id):
+    """Summary of a stored profile or None"""
+    path = _path(profile_id, 'json')
+    if path is None:
+        return None
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def stats_path(profile_id):
+    return _path(profile_id, 'prof')
+
+
+def recent_profiles(limit=None):
+    """Summaries without timelines and call tree, newest first"""
+    profiles = []
+    for profile_id in list_ids()[:limit]:
+        summary = load(profile_id)
+        if summary is None:
+            continue
+        for key in ('queries', 'templates', 'functions', 'call_tree'):
+            summary.pop(key, None)
+        profiles.append(summary)
+    return profiles
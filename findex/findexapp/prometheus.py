@@ -0,0 +1,246 @@
+"""
+Prometheus metrics.
+
+Counters and histograms live in process memory. Recording takes a short
+per-metric lock around a dictionary lookup and a few additions, nothing
+else; formatting happens only when ``/metrics`` is scraped. Values are per
+worker process and carry its pid as ``worker`` label, so a scrape that
+reaches another worker through the load balancer shows other series
+instead of a counter that went backwards. Complete numbers need every
+worker to be scraped; aggregate with ``sum without (worker) (rate(...))``.
+
+``render()`` returns the text exposition format, version 0.0.4.
+"""
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from django.utils import timezone
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ARCHIVE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Metric:
+    type = None
+    # Values of this process only, labelled with its pid
+    per_process = True
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def samples(self):
+        """(name, label names, label values, value) tuples"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for name, label_names, label_values, value in self.samples():
+            if self.per_process:
+                label_names = ('worker',) + label_names
+                label_values = (str(os.getpid()),) + label_values
+            lines.append(f'{name}{_format_labels(label_names, label_values)} {_format_value(value)}')
+        return lines
+
+
+class CounterMetric(Metric):
+    type = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        if not self.labels:
+            # Exported as 0 before the first increment
+            self._series[()] = 0
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, value in series:
+            yield self.name, self.labels, label_values, value
+
+
+class HistogramMetric(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per bucket counts (last one is +Inf) and the sum
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        bucket_labels = self.labels + ('le',)
+        for label_values, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket', bucket_labels,
+                       label_values + (_format_value(float(bound)),), cumulative)
+            yield f'{self.name}_sum', self.labels, label_values, total
+            yield f'{self.name}_count', self.labels, label_values, cumulative
+
+
+class CallbackMetric(Metric):
+    """Metric computed when scraped; ``callback`` returns {label values: value}"""
+    per_process = False
+
+    def __init__(self, name, documentation, callback, labels=(), type='gauge'):
+        super().__init__(name, documentation, labels)
+        self.type = type
+        self.callback = callback
+
+    def samples(self):
+        for label_values, value in sorted(self.callback().items()):
+            if value is not None:
+                yield self.name, self.labels, label_values, value
+
+
+def _result_cache_requests():
+    from .result_cache import result_cache_stats
+    stats = result_cache_stats()
+    return {('hit',): stats['hits'], ('miss',): stats['misses']}
+
+
+def _result_cache_hit_ratio():
+    from .result_cache import result_cache_stats
+    return {(): result_cache_stats()['hit_rate']}
+
+
+def _active_sessions():
+    from django.contrib.sessions.models import Session
+    return {(): Session.objects.filter(expire_date__gt=timezone.now()).count()}
+
+
+REQUEST_DURATION = HistogramMetric(
+    'findex_request_duration_seconds', 'Request latency per view.', ['view']
+)
+REQUESTS = CounterMetric(
+    'findex_requests_total', 'Requests per view and status code.', ['view', 'status']
+)
+DB_QUERIES = CounterMetric(
+    'findex_db_queries_total', 'Database queries per view.', ['view']
+)
+DB_DURATION = CounterMetric(
+    'findex_db_query_seconds_total', 'Time spent in database queries per view.', ['view']
+)
+UPLOAD_BYTES = CounterMetric(
+    'findex_upload_bytes_total', 'Bytes of uploaded document files.'
+)
+DOWNLOAD_BYTES = CounterMetric(
+    'findex_download_bytes_total', 'Bytes of downloaded document files.'
+)
+ARCHIVE_DURATION = HistogramMetric(
+    'findex_archive_duration_seconds', 'Duration of ZIP downloads and exports.', ['kind'],
+    buckets=ARCHIVE_BUCKETS,
+)
+BARCODES_ASSIGNED = CounterMetric(
+    'findex_barcodes_assigned_total', 'Assigned barcode numbers.'
+)
+RESULT_CACHE_REQUESTS = CallbackMetric(
+    'findex_result_cache_requests_total', 'Search result cache lookups of all workers.',
+    _result_cache_requests, ['result'], type='counter',
+)
+RESULT_CACHE_HIT_RATIO = CallbackMetric(
+    'findex_result_cache_hit_ratio', 'Share of search result cache lookups that were hits.',
+    _result_cache_hit_ratio,
+)
+ACTIVE_SESSIONS = CallbackMetric(
+    'findex_active_sessions', 'Sessions that have not expired.', _active_sessions
+)
+
+METRICS = [
+    REQUEST_DURATION, REQUESTS, DB_QUERIES, DB_DURATION, UPLOAD_BYTES, DOWNLOAD_BYTES,
+    ARCHIVE_DURATION, BARCODES_ASSIGNED, RESULT_CACHE_REQUESTS, RESULT_CACHE_HIT_RATIO,
+    ACTIVE_SESSIONS,
+]
+
+
+def observe_request(view, status, duration_ms, recorder):
+    """Record one request measured by RequestMetricsMiddleware"""
+    REQUEST_DURATION.observe(duration_ms / 1000, view)
+    REQUESTS.inc(view, str(status))
+    if recorder.count:
+        DB_QUERIES.inc(view, amount=recorder.count)
+        DB_DURATION.inc(view, amount=recorder.duration)
+
+
+def _observe_when_sent(content, start, kind):
+    try:
+        yield from content
+    finally:
+        ARCHIVE_DURATION.observe(time.perf_counter() - start, kind)
+
+
+def timed_archive(kind):
+    """
+    View decorator recording the view's duration in ARCHIVE_DURATION.
+
+    Streamed archives are built while they are sent, so for them the time
+    until the last chunk has gone out is recorded.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                ARCHIVE_DURATION.observe(time.perf_counter() - start, kind)
+                raise
+            if response.streaming:
+                response.streaming_content = _observe_when_sent(response.streaming_content, start, kind)
+            else:
+                ARCHIVE_DURATION.observe(time.perf_counter() - start, kind)
+            return response
+        return wrapper
+    return decorator
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,104 @@
+"""
+In-process cache of the lookup tables Project, DocType and ExportControl.
+
+Forms, views and batch endpoints resolve ids and build choice lists from
+this cache instead of querying the tables on every request. Each process
+loads a table once; writes bump the reference data version (see
+``versioning.LocalCopy``), so other processes reload within
+``FINDEX_LOCAL_CACHE_CHECK_INTERVAL`` seconds. Until then form fields
+look up ids missing from their copy in the database.
+
+The cached instances are shared between requests and must not be modified.
+"""
+from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+
+from .models import DocType, ExportControl, Project
+from .versioning import REFERENCE_DATA, LocalCopy
+
+
+class ReferenceTable:
+    """All rows of one lookup table, in the model's default ordering"""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.by_pk = {obj.pk: obj for obj in objects}
+        self.active = [obj for obj in objects if obj.is_active]
+
+
+_tables = {
+    model: LocalCopy(REFERENCE_DATA, lambda model=model: ReferenceTable(list(model.objects.all())))
+    for model in (Project, DocType, ExportControl)
+}
+
+
+def all_objects(model, active_only=False):
+    """Cached rows of a reference table"""
+    table = _tables[model].get()
+    return table.active if active_only else table.objects
+
+
+def get_object(model, pk):
+    """Cached row by primary key or None"""
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    return _tables[model].get().by_pk.get(pk)
+
+
+def invalidate():
+    for table in _tables.values():
+        table.invalidate()
+
+
+class ReferenceChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in self.field.reference_objects():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.reference_objects()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.reference_objects())
+
+
+class ReferenceChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField over a cached reference table, rendering and validating without queries"""
+
+    iterator = ReferenceChoiceIterator
+
+    def __init__(self, model, active_only=True, **kwargs):
+        self.reference_model = model
+        self.active_only = active_only
+        manager = model.objects
+        super().__init__(
+            queryset=manager.filter(is_active=True) if active_only else manager.all(), **kwargs
+        )
+
+    def reference_objects(self):
+        return all_objects(self.reference_model, self.active_only)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.reference_model):
+            value = value.pk
+        obj = get_object(self.reference_model, value)
+        if obj is None:
+            # Created by another process since this one loaded the table
+            try:
+                obj = self.queryset.filter(pk=value).first()
+            except (TypeError, ValueError):
+                obj = None
+        if obj is None or (self.active_only and not obj.is_active):
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
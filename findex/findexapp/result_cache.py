@@ -0,0 +1,93 @@
+"""
+Cached document search results.
+
+The ordered primary keys of a search are stored under a key derived from the
+normalized search form data and the current document data version, so a
+repeated search only fetches the rows of the requested page. Any write to
+documents bumps the version (see ``versioning``) and thereby retires all
+cached results at once.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .versioning import get_version
+
+
+HITS_KEY = 'findex:results:hits'
+MISSES_KEY = 'findex:results:misses'
+
+
+def max_ids():
+    """Number of ids kept per search; deeper pages go to the database"""
+    return max(
+        getattr(settings, 'FINDEX_RESULT_CACHE_MAX_IDS', 5000),
+        getattr(settings, 'FINDEX_COUNT_CAP', 1000) + 1
+    )
+
+
+def normalize_filters(cleaned_data):
+    """Canonical form of DocumentSearchForm.cleaned_data used in cache keys"""
+    filters = {}
+    for name, value in cleaned_data.items():
+        if value in (None, ''):
+            continue
+        if hasattr(value, 'pk'):
+            value = value.pk
+        elif isinstance(value, str):
+            value = ' '.join(value.lower().split())
+        filters[name] = value
+    return filters
+
+
+def _cache_key(filters):
+    raw = json.dumps(filters, sort_keys=True, default=str)
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'findex:results:{get_version()}:{digest}'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_result_ids(queryset, filters):
+    """
+    Ordered ids of ``queryset`` for the search described by ``filters``.
+
+    Returns ``(ids, complete)``; ``complete`` is False when the search has
+    more results than ``max_ids()`` and only the first ones were kept.
+    """
+    key = _cache_key(filters)
+    result = cache.get(key)
+    if result is not None:
+        _count(HITS_KEY)
+        return result['ids'], result['complete']
+
+    _count(MISSES_KEY)
+    limit = max_ids()
+    ids = list(queryset.values_list('id', flat=True)[:limit + 1])
+    result = {'ids': ids[:limit], 'complete': len(ids) <= limit}
+    cache.set(key, result, getattr(settings, 'FINDEX_RESULT_CACHE_TIMEOUT', 300))
+    return result['ids'], result['complete']
+
+
+def result_cache_stats():
+    """Hit and miss counters of the result cache since the last reset"""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 3) if total else None,
+    }
+
+
+def reset_result_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
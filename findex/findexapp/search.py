@@ -0,0 +1,228 @@
+"""
+Full-text search for documents backed by an SQLite FTS5 index.
+
+The ``findexapp_document_fts`` virtual table mirrors the searchable Document
+columns, their language-normalized copies and the text extracted into
+DocumentContent. It is kept in sync by database triggers (see migrations
+0002 to 0004), so model saves, deletes and bulk ``QuerySet.update`` calls all
+reach the index without any Python-side bookkeeping.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .normalization import normalize_search_text, search_variants
+
+
+FTS_TABLE = 'findexapp_document_fts'
+
+# Indexed columns in FTS order together with their BM25 weights
+FTS_COLUMNS = [
+    ('title_de', 10.0),
+    ('title_en', 10.0),
+    ('title_fr', 10.0),
+    ('description', 2.0),
+    ('barcode_number', 5.0),
+    ('version', 1.0),
+    ('original_filename', 1.0),
+    ('title_de_norm', 10.0),
+    ('title_en_norm', 10.0),
+    ('title_fr_norm', 10.0),
+    ('description_norm', 2.0),
+    ('content', 1.0),
+]
+
+# Source expressions for FTS columns that are not plain document columns
+FTS_SOURCES = {
+    'content': 'c.text',
+}
+
+# Control characters used as snippet markers; they never occur in user input
+# and are swapped for <mark> tags after HTML escaping.
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+SNIPPET_TOKENS = 16
+
+
+def fts_available():
+    """Check if the FTS5 index can be used on the current database"""
+    return connection.vendor == 'sqlite'
+
+
+def _prefix_phrases(query):
+    phrases = []
+    for term in query.split():
+        if not re.search(r'\w', term):
+            continue
+        phrases.append('"%s"*' % term.replace('"', '""'))
+    return ' '.join(phrases)
+
+
+def build_match_expression(query):
+    """
+    Turn free user input into a safe FTS5 MATCH expression.
+
+    Every whitespace separated term becomes a quoted prefix phrase, so
+    ``WI.EP.00`` matches ``WI.EP.0031`` and FTS5 operators typed by the
+    user are treated as plain text. When normalization changes the query
+    (``Bräuer`` -> ``braeuer``) both spellings are searched, which lets the
+    normalized columns answer umlaut transliterations.
+    """
+    raw = _prefix_phrases(query)
+    normalized = _prefix_phrases(normalize_search_text(query))
+    if not raw or normalized == _prefix_phrases(query.casefold()):
+        return raw
+    return f'({raw}) OR ({normalized})'
+
+
+def _fallback_filter(query):
+    """icontains chain used on databases without FTS5"""
+    folded = Q()
+    # The folded columns hold both spellings of stored umlauts, the query
+    # is tried in both as well ("Prüfstand" also finds a typed "Prufstand")
+    for variant in search_variants(query):
+        folded |= (
+            Q(title_de_norm__contains=variant) |
+            Q(title_en_norm__contains=variant) |
+            Q(title_fr_norm__contains=variant) |
+            Q(description_norm__contains=variant)
+        )
+    return (
+        folded |
+        Q(title_de__icontains=query) |
+        Q(title_en__icontains=query) |
+        Q(title_fr__icontains=query) |
+        Q(description__icontains=query) |
+        Q(barcode_number__icontains=query) |
+        Q(version__icontains=query) |
+        Q(original_filename__icontains=query) |
+        Q(content__text__icontains=query)
+    )
+
+
+def search_documents(queryset, query, with_snippets=False):
+    """
+    Restrict a Document queryset to rows matching ``query``.
+
+    On SQLite the queryset is joined against the FTS index and annotated with
+    ``search_rank`` (BM25, lower is better) and optionally ``search_snippet``.
+    Callers decide on ordering; ``order_by('search_rank')`` gives relevance.
+    """
+    match = build_match_expression(query)
+    if not match:
+        return queryset
+
+    if not fts_available():
+        return queryset.filter(_fallback_filter(query))
+
+    weights = ', '.join(str(weight) for _, weight in FTS_COLUMNS)
+    select = {'search_rank': f'bm25({FTS_TABLE}, {weights})'}
+    if with_snippets:
+        select['search_snippet'] = (
+            f"snippet({FTS_TABLE}, -1, char(2), char(3), '…', {SNIPPET_TOKENS})"
+        )
+
+    return queryset.extra(
+        select=select,
+        tables=[FTS_TABLE],
+        where=[
+            f'{FTS_TABLE}.rowid = findexapp_document.id',
+            f'{FTS_TABLE} MATCH %s',
+        ],
+        params=[match],
+    )
+
+
+def is_ranked(queryset):
+    """Check if a queryset carries the search_rank annotation"""
+    return 'search_rank' in queryset.query.extra_select
+
+
+def render_snippet(snippet):
+    """Escape an FTS snippet and turn its match markers into <mark> tags"""
+    if not snippet:
+        return ''
+    html = escape(snippet)
+    html = html.replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+    return mark_safe(html)
+
+
+# Index maintenance
+
+def _index_select_sql():
+    """SELECT producing FTS rows from the document table"""
+    columns = ', '.join(
+        f"coalesce({FTS_SOURCES.get(name, 'd.' + name)}, '')" for name, _ in FTS_COLUMNS
+    )
+    return (
+        f'SELECT d.id, {columns} FROM findexapp_document d '
+        'LEFT JOIN findexapp_documentcontent c ON c.document_id = d.id'
+    )
+
+
+def _index_insert_sql():
+    columns = ', '.join(name for name, _ in FTS_COLUMNS)
+    return f'INSERT INTO {FTS_TABLE}(rowid, {columns}) '
+
+
+def rebuild_index():
+    """Drop and repopulate the complete FTS index"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(_index_insert_sql() + _index_select_sql())
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def reindex_documents(document_ids, batch_size=1000):
+    """Re-index the given documents in batches, returns number of rows written"""
+    document_ids = list(document_ids)
+    indexed = 0
+    for start in range(0, len(document_ids), batch_size):
+        batch = document_ids[start:start + batch_size]
+        placeholders = ', '.join(['%s'] * len(batch))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', batch
+            )
+            cursor.execute(
+                _index_insert_sql() + _index_select_sql() + f' WHERE d.id IN ({placeholders})',
+                batch
+            )
+            indexed += cursor.rowcount
+    return indexed
+
+
+def purge_orphans():
+    """Remove index rows whose document no longer exists"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid NOT IN (SELECT id FROM findexapp_document)'
+        )
+        return cursor.rowcount
+
+
+def missing_document_ids():
+    """IDs of documents that have no row in the index"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id FROM findexapp_document WHERE id NOT IN (SELECT rowid FROM {FTS_TABLE})'
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def merge_index(pages=500):
+    """Run one bounded incremental merge step on the FTS b-trees"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('merge', %s)", [pages]
+        )
+
+
+def optimize_index():
+    """Merge all FTS segments into one (expensive, best run off-hours)"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
@@ -0,0 +1,72 @@
+import logging
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DocType, Document, DocumentContent, ExportControl, Project, SystemSettings
+from . import reference_data
+from .metrics import registry
+from .system_settings import settings_cache
+from .versioning import REFERENCE_DATA, SETTINGS, bump_version, forget_versions, remember_versions
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Document)
+def extract_document_content(sender, instance, raw=False, **kwargs):
+    """Queue text extraction of a new file once the saving transaction has committed"""
+    if raw or not getattr(settings, 'FINDEX_EXTRACT_ON_SAVE', True):
+        return
+    # Metadata edits keep the file and its extracted text
+    if not getattr(instance, '_file_changed', False):
+        return
+    from .extraction import extract_in_background
+
+    document_id = instance.pk
+    transaction.on_commit(lambda: extract_in_background(document_id))
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+@receiver(post_save, sender=DocumentContent)
+@receiver(post_delete, sender=DocumentContent)
+def invalidate_search_caches(sender, **kwargs):
+    """Cached search results and facets depend on documents and their content"""
+    bump_version()
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+@receiver(post_save, sender=DocType)
+@receiver(post_delete, sender=DocType)
+@receiver(post_save, sender=ExportControl)
+@receiver(post_delete, sender=ExportControl)
+def invalidate_reference_data(sender, **kwargs):
+    """Facet labels and the spelling vocabulary include reference data names"""
+    reference_data.invalidate()
+    bump_version(REFERENCE_DATA)
+    bump_version()
+
+
+@receiver(post_save, sender=SystemSettings)
+@receiver(post_delete, sender=SystemSettings)
+def invalidate_system_settings(sender, **kwargs):
+    settings_cache.invalidate()
+    bump_version(SETTINGS)
+
+
+@receiver(request_finished)
+def flush_request_metrics(sender, **kwargs):
+    """Write the metrics window after the response went out, not while the user waits"""
+    if registry.flush_due():
+        try:
+            registry.flush()
+        except Exception:
+            logger.exception('Writing request metrics failed')
+
+
+request_started.connect(remember_versions, dispatch_uid='findex_remember_versions')
+request_finished.connect(forget_versions, dispatch_uid='findex_forget_versions')
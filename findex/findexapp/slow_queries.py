@@ -0,0 +1,94 @@
+"""
+Slow query log.
+
+SlowQueryRecorder is a connection.execute_wrapper that notes every
+statement slower than ``FINDEX_SLOW_QUERY_MS``: the normalized SQL, its
+redacted parameters, the duration and the template and application code
+line that issued it. SlowQueryMiddleware installs it for each request and
+writes the collected entries once the response is ready, as JSON lines to
+the ``findexapp.slow_queries`` logger and into the SlowQuery table, which
+keeps the newest ``FINDEX_SLOW_QUERY_MAX_ROWS`` entries.
+"""
+import datetime
+import json
+import logging
+import time
+
+from django.conf import settings
+
+from .metrics import normalize_sql
+from .nplusone import find_origin
+
+
+logger = logging.getLogger(__name__)
+
+MAX_SQL_LENGTH = 4000
+
+
+def redact(value):
+    """Keep numbers, booleans and NULL; replace text and binary values by type and length"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return f'<str:{len(value)}>'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<bytes:{len(value)}>'
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return f'<{type(value).__name__}>'
+
+
+class SlowQueryRecorder:
+    """connection.execute_wrapper collecting statements above the threshold"""
+
+    def __init__(self, threshold_ms):
+        self.threshold = threshold_ms / 1000
+        self.entries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold:
+                template, code = find_origin()
+                self.entries.append({
+                    'duration_ms': round(duration * 1000, 2),
+                    'sql': normalize_sql(sql)[:MAX_SQL_LENGTH],
+                    'params': f'<{len(params)} rows>' if many else redact(list(params or ())),
+                    'origin': code or '',
+                    'template': template or '',
+                })
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the record's ``data`` merged in"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'data', {}))
+        return json.dumps(entry, default=str)
+
+
+def flush(entries, view_name, path):
+    """Log the entries of one request and store them in SlowQuery"""
+    from .models import SlowQuery
+
+    for entry in entries:
+        logger.warning('slow query', extra={'data': dict(entry, view=view_name, path=path)})
+
+    SlowQuery.objects.bulk_create([
+        SlowQuery(view_name=view_name or '', path=path[:500], **entry) for entry in entries
+    ])
+    max_rows = getattr(settings, 'FINDEX_SLOW_QUERY_MAX_ROWS', 10000)
+    cutoff = SlowQuery.objects.order_by('-id').values_list('id', flat=True)[max_rows:max_rows + 1].first()
+    if cutoff is not None:
+        SlowQuery.objects.filter(id__lte=cutoff).delete()
@@ -0,0 +1,285 @@
+"""
+"Did you mean" suggestions for searches without results.
+
+The vocabulary consists of the words of all document titles plus project
+names, doc type names and export control codes. It is indexed the SymSpell
+way: every term is stored under all strings obtained by deleting up to
+``MAX_EDIT_DISTANCE`` characters from its prefix, and a query word is looked
+up through its own deletes. That replaces a scan over the vocabulary with a
+handful of dict lookups.
+
+The index lives in process memory. The first search without results starts
+building it in a background thread and gets no suggestion until it is ready;
+afterwards it is refreshed incrementally whenever the document data version
+moves on: the words of documents changed since the newest ``updated_at``
+seen are added. Words are not tracked per document, so words that were
+edited or deleted stay until the next full build. A new build starts in the
+background as soon as the document counter shows fewer rows than were
+loaded, meaning some were deleted. Until it is done, the old index answers.
+"""
+import re
+import logging
+import threading
+from collections import Counter
+
+from django.db import connection
+
+from .counters import global_counts
+from .models import DocType, Document, ExportControl, Project
+from .normalization import normalize_search_text
+from .versioning import get_version
+
+
+logger = logging.getLogger(__name__)
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+MIN_TERM_LENGTH = 3
+
+# Codes such as "WI.EP.0013" or "9E001/a" stay one token
+TOKEN_PATTERN = re.compile(r'\w+(?:[./-]\w+)*')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text or '')
+
+
+def edit_distance(source, target, max_distance):
+    """
+    Optimal string alignment distance (Levenshtein plus transpositions).
+
+    Returns None as soon as the distance is known to exceed ``max_distance``.
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return None
+    previous2 = None
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        row_min = current[0]
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1 and
+                    source[i - 1] == target[j - 2] and source[i - 2] == target[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return None
+        previous2, previous = previous, current
+    distance = previous[-1]
+    return distance if distance <= max_distance else None
+
+
+def _deletes(word, max_distance):
+    """All strings reachable from ``word`` by deleting up to max_distance chars"""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {
+            candidate[:i] + candidate[i + 1:]
+            for candidate in frontier if len(candidate) > 1
+            for i in range(len(candidate))
+        } - result
+        result |= frontier
+    return result
+
+
+class SymSpellIndex:
+    """Term frequencies plus the symmetric-delete lookup table"""
+
+    def __init__(self, max_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.frequencies = Counter()
+        self.display = {}
+        self.deletes = {}
+
+    def __contains__(self, term):
+        return term in self.frequencies
+
+    def __len__(self):
+        return len(self.frequencies)
+
+    def add(self, term, display=None, count=1):
+        if term not in self.frequencies:
+            for delete in _deletes(term[:self.prefix_length], self.max_distance):
+                self.deletes.setdefault(delete, set()).add(term)
+        self.frequencies[term] += count
+        self.display[term] = display or term
+
+    def remove(self, term, count=1):
+        if term not in self.frequencies:
+            return
+        self.frequencies[term] -= count
+        if self.frequencies[term] > 0:
+            return
+        del self.frequencies[term]
+        self.display.pop(term, None)
+        for delete in _deletes(term[:self.prefix_length], self.max_distance):
+            terms = self.deletes.get(delete)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self.deletes[delete]
+
+    def lookup(self, word, max_distance=None):
+        """Closest known term as (term, distance) or None"""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        if word in self.frequencies:
+            return word, 0
+
+        best = None
+        best_key = None
+        prefix = word[:self.prefix_length]
+        seen_terms = set()
+        for delete in _deletes(prefix, max_distance):
+            for term in self.deletes.get(delete, ()):
+                if term in seen_terms:
+                    continue
+                seen_terms.add(term)
+                limit = best_key[0] if best_key else max_distance
+                distance = edit_distance(word, term, limit)
+                if distance is None:
+                    continue
+                key = (distance, -self.frequencies[term], term)
+                if best_key is None or key < best_key:
+                    best, best_key = term, key
+        return (best, best_key[0]) if best else None
+
+
+class Vocabulary:
+    """SymSpell index over the searchable names, kept in sync with the database"""
+
+    def __init__(self):
+        self.index = SymSpellIndex()
+        self.reference_terms = []
+        self.version = None
+        self.watermark = None
+        # Highest document id loaded and the number of distinct documents loaded
+        self.last_id = 0
+        self.documents = 0
+        self._builder = None
+        self._builder_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _terms(texts, whole=False):
+        terms = []
+        for text in texts:
+            for token in ([text.strip()] if whole else tokenize(text)):
+                term = normalize_search_text(token)
+                if len(term) >= MIN_TERM_LENGTH and not term.isdigit():
+                    terms.append((term, token))
+        return terms
+
+    def _load_documents(self, queryset):
+        rows = queryset.values_list('id', 'title_de', 'title_en', 'title_fr', 'updated_at')
+        for pk, title_de, title_en, title_fr, updated_at in rows.iterator(chunk_size=2000):
+            for term, display in self._terms((title_de, title_en, title_fr)):
+                self.index.add(term, display)
+            if pk > self.last_id:
+                # Ids only grow, so each document is counted once
+                self.last_id = pk
+                self.documents += 1
+            if self.watermark is None or updated_at > self.watermark:
+                self.watermark = updated_at
+
+    def _load_reference_data(self):
+        # A few hundred rows at most, always reloaded completely
+        for term, _ in self.reference_terms:
+            self.index.remove(term)
+        names = list(Project.objects.values_list('name', flat=True))
+        names += DocType.objects.values_list('name', flat=True)
+        codes = list(ExportControl.objects.values_list('code', flat=True))
+        self.reference_terms = self._terms(names) + self._terms(codes, whole=True)
+        for term, display in self.reference_terms:
+            self.index.add(term, display)
+
+    def build(self):
+        """Load the whole index; runs in the background thread started by ``refresh``"""
+        version = get_version()
+        vocabulary = Vocabulary()
+        vocabulary._load_documents(Document.objects.order_by('id'))
+        vocabulary._load_reference_data()
+        with self._lock:
+            self.index = vocabulary.index
+            self.reference_terms = vocabulary.reference_terms
+            self.watermark = vocabulary.watermark
+            self.last_id = vocabulary.last_id
+            self.documents = vocabulary.documents
+            self.version = version
+
+    def _build_in_thread(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception('Building the spelling vocabulary failed')
+        finally:
+            self._builder = None
+            connection.close()
+
+    def _start_build(self):
+        # Not self._lock, which refresh holds
+        with self._builder_lock:
+            if self._builder is None:
+                self._builder = threading.Thread(
+                    target=self._build_in_thread, name='findex-spelling', daemon=True
+                )
+                self._builder.start()
+
+    def refresh(self):
+        """
+        Bring the index up to date, loading only documents changed since the last run.
+
+        Returns False while the initial build is still running.
+        """
+        if self.version is None:
+            self._start_build()
+            return False
+
+        version = get_version()
+        with self._lock:
+            if version == self.version:
+                return True
+            changed = Document.objects.order_by('id')
+            if self.watermark is not None:
+                changed = changed.filter(updated_at__gte=self.watermark)
+            self._load_documents(changed)
+            self._load_reference_data()
+            self.version = version
+            # Every document ever loaded is counted, so fewer rows mean deletions
+            deleted = global_counts()[0] < self.documents
+        if deleted:
+            self._start_build()
+        return True
+
+    def correct(self, query):
+        """Query with unknown words replaced by their closest term, or None"""
+        if not self.refresh():
+            return None
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+
+        corrected = query
+        changed = False
+        with self._lock:
+            for token in tokens:
+                term = normalize_search_text(token)
+                if len(term) < MIN_TERM_LENGTH or term.isdigit() or term in self.index:
+                    continue
+                match = self.index.lookup(term)
+                if match:
+                    corrected = corrected.replace(token, self.index.display[match[0]], 1)
+                    changed = True
+        return corrected if changed else None
+
+
+_vocabulary = Vocabulary()
+
+
+def suggest_spelling(query):
+    """Spelling correction for a search query or None if nothing is misspelled"""
+    return _vocabulary.correct(query)
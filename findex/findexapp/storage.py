@@ -0,0 +1,95 @@
+"""
+Content-addressed document storage.
+
+Every file is stored once under the SHA-256 of its content,
+``blobs/ab/cd/abcd…``, whatever name it was uploaded with: the same
+drawing uploaded into three projects takes the disk space of one, and
+uploads with equal names no longer get renamed. The hash is computed
+while the upload is copied into place (or, for uploads Django spooled to
+a temporary file, while that file is read once before being moved).
+
+The uploaded name is kept in Document.original_filename. Blob rows count
+the documents using a file; the file is deleted after the last reference
+is released (``models.Blob.purge``). Names that are not blob names, i.e. files
+stored before and not yet moved by ``backfill_blobs``, are served like
+FileSystemStorage does.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+
+BLOB_PREFIX = 'blobs'
+CHUNK_SIZE = 1024 * 1024
+
+_BLOB_NAME = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})$')
+
+
+def blob_name(digest):
+    return f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}'
+
+
+def blob_digest(name):
+    """SHA-256 encoded in a blob name, None for other names"""
+    match = _BLOB_NAME.match(name or '')
+    return match.group(1) if match else None
+
+
+def file_digest(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        while chunk := handle.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that saves files under their content hash"""
+
+    def get_available_name(self, name, max_length=None):
+        # _save picks the name; equal content is meant to end up in one file
+        return name
+
+    def _save(self, name, content):
+        os.makedirs(self.path(BLOB_PREFIX), exist_ok=True)
+        if hasattr(content, 'temporary_file_path'):
+            source = content.temporary_file_path()
+            digest = file_digest(source)
+            target = blob_name(digest)
+            if not self.exists(target):
+                os.makedirs(os.path.dirname(self.path(target)), exist_ok=True)
+                file_move_safe(source, self.path(target))
+        else:
+            hasher = hashlib.sha256()
+            handle = tempfile.NamedTemporaryFile(dir=self.path(BLOB_PREFIX), delete=False)
+            try:
+                with handle:
+                    for chunk in content.chunks():
+                        hasher.update(chunk)
+                        handle.write(chunk)
+                target = blob_name(hasher.hexdigest())
+                if self.exists(target):
+                    os.unlink(handle.name)
+                else:
+                    os.makedirs(os.path.dirname(self.path(target)), exist_ok=True)
+                    os.replace(handle.name, self.path(target))
+            except BaseException:
+                if os.path.exists(handle.name):
+                    os.unlink(handle.name)
+                raise
+
+        if self.file_permissions_mode is not None:
+            os.chmod(self.path(target), self.file_permissions_mode)
+        return target
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    """Storage of Document.document_file, referenced by name in migrations"""
+    return document_storage
@@ -0,0 +1,174 @@
+"""
+Search-as-you-type suggestions.
+
+Titles are looked up through the FTS5 prefix index (newest documents first,
+so the scan stops after ``limit`` hits), barcodes and folded project names
+through range scans on their indexes. Inactive documents and projects are
+left out. Answers are kept in a small per-user LRU so backspacing and
+retyping does not touch the database.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Document, Project
+from .normalization import normalize_search_text, search_variants
+from .search import FTS_TABLE, build_match_expression, fts_available
+from .versioning import get_version
+
+
+SUGGEST_LIMIT = 8
+MIN_PREFIX_LENGTH = 2
+CACHE_TTL = 30
+PREFIXES_PER_USER = 64
+MAX_USERS = 1000
+
+TITLE_COLUMNS = '{title_de title_en title_fr title_de_norm title_en_norm title_fr_norm}'
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with per-entry expiry"""
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# user id -> LRUCache of prefix -> suggestions
+_user_caches = LRUCache(MAX_USERS)
+_user_caches_lock = threading.Lock()
+
+
+def _cache_for(user_id):
+    with _user_caches_lock:
+        user_cache = _user_caches.get(user_id)
+        if user_cache is None:
+            user_cache = LRUCache(PREFIXES_PER_USER, ttl=CACHE_TTL)
+            _user_caches.set(user_id, user_cache)
+        return user_cache
+
+
+def clear_caches():
+    """Forget the answers of all users"""
+    _user_caches.clear()
+
+
+def _title_suggestions(prefix, limit):
+    if not fts_available():
+        # Later spellings of the folded title each start on a line of their own
+        matches = Q()
+        for variant in search_variants(prefix):
+            matches |= Q(title_de_norm__startswith=variant) | Q(title_de_norm__contains='\n' + variant)
+        documents = Document.objects.filter(matches, is_active=True)
+        rows = documents.order_by('-id').values_list('id', 'title_de', 'title_en', 'title_fr')[:limit]
+    else:
+        match = build_match_expression(prefix)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT d.id, d.title_de, d.title_en, d.title_fr
+                FROM {FTS_TABLE} f
+                JOIN findexapp_document d ON d.id = f.rowid
+                WHERE f.{FTS_TABLE} MATCH %s AND d.is_active
+                ORDER BY f.rowid DESC
+                LIMIT %s
+                """,
+                [f'{TITLE_COLUMNS} : ({match})', limit]
+            )
+            rows = cursor.fetchall()
+
+    return [
+        {
+            'type': 'document',
+            'label': title_de or title_en or title_fr or 'Untitled',
+            'url': reverse('document_detail', args=[pk]),
+        }
+        for pk, title_de, title_en, title_fr in rows
+    ]
+
+
+def _barcode_suggestions(prefix, limit):
+    # Range scan instead of LIKE so the unique index on barcode_number is used
+    prefix = prefix.upper()
+    rows = Document.objects.filter(
+        barcode_number__gte=prefix, barcode_number__lt=prefix + '\uffff', is_active=True
+    ).order_by('barcode_number').values_list('id', 'barcode_number')[:limit]
+    return [
+        {
+            'type': 'barcode',
+            'label': barcode,
+            'url': reverse('document_detail', args=[pk]),
+        }
+        for pk, barcode in rows
+    ]
+
+
+def _project_suggestions(prefix, limit):
+    expanded = normalize_search_text(prefix)
+    plain = normalize_search_text(prefix, expand_umlauts=False)
+    projects = Project.objects.filter(
+        Q(name_norm__gte=expanded, name_norm__lt=expanded + '\uffff') |
+        Q(name_plain__gte=plain, name_plain__lt=plain + '\uffff'),
+        is_active=True
+    ).order_by('name_norm').values_list('id', 'name')[:limit]
+    return [
+        {
+            'type': 'project',
+            'label': name,
+            'url': reverse('project_documents', args=[pk]),
+        }
+        for pk, name in projects
+    ]
+
+
+def get_suggestions(user, query, limit=SUGGEST_LIMIT):
+    """Suggestions for ``query`` as a list of {type, label, url} dicts"""
+    prefix = ' '.join(query.split())
+    if len(prefix) < MIN_PREFIX_LENGTH:
+        return []
+
+    user_cache = _cache_for(user.pk)
+    key = (prefix.lower(), limit, get_version())
+    suggestions = user_cache.get(key)
+    if suggestions is None:
+        suggestions = (
+            _project_suggestions(prefix, 3) +
+            _barcode_suggestions(prefix, 3) +
+            _title_suggestions(prefix, limit)
+        )[:limit]
+        user_cache.set(key, suggestions)
+    return suggestions
@@ -0,0 +1,61 @@
+"""
+Typed, in-process access to SystemSettings.
+
+Every worker keeps all settings in memory and loads them with one query.
+The copy is checked against the settings version stamp in the database
+(see ``versioning.LocalCopy``), which writes bump, so a change made in one
+process reaches all others within ``FINDEX_LOCAL_CACHE_CHECK_INTERVAL``
+seconds. Reading a setting never queries the database in between.
+"""
+from .versioning import SETTINGS, LocalCopy
+
+
+def parse_bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on', 'ja')
+
+
+# Known settings: key -> (parser, default)
+DEFINITIONS = {
+    'recent_upload_days': (int, 7),
+    'barcode_language': (str, 'de'),
+    'barcode_module_enabled': (parse_bool, True),
+    'max_file_size_mb': (int, 100),
+}
+
+
+def _load_settings():
+    from .models import SystemSettings
+    return dict(SystemSettings.objects.values_list('key', 'value'))
+
+
+class SettingsCache:
+    """All SystemSettings rows of this process"""
+
+    def __init__(self):
+        self._copy = LocalCopy(SETTINGS, _load_settings)
+
+    def raw(self, key, default=None):
+        """Stored string value of a setting"""
+        return self._copy.get().get(key, default)
+
+    def get(self, key, default=None):
+        """Setting converted to the type of its definition"""
+        parser, fallback = DEFINITIONS.get(key, (str, None))
+        value = self.raw(key)
+        if value is None:
+            return fallback if default is None else default
+        try:
+            return parser(value)
+        except (TypeError, ValueError):
+            return fallback if default is None else default
+
+    def invalidate(self):
+        self._copy.invalidate()
+
+
+settings_cache = SettingsCache()
+
+
+def get_setting(key, default=None):
+    """Typed value of a system setting, e.g. ``get_setting('recent_upload_days')``"""
+    return settings_cache.get(key, default)
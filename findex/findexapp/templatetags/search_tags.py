@@ -0,0 +1,13 @@
+from django import template
+
+from findexapp.search import render_snippet
+
+register = template.Library()
+
+@register.filter
+def highlight_snippet(snippet):
+    """
+    Render an FTS snippet with highlighted matches.
+    Usage: {{ document.search_snippet|highlight_snippet }}
+    """
+    return render_snippet(snippet)
@@ -1,3 +1,1350 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+import zlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import LazyObject
+
+from . import (
+    archive_jobs, counters, extraction, profiling, reference_data, result_cache, search, suggest
+)
+from .archives import stream_zip
+from .benchmark import run_benchmark
+from .context_processors import common_data
+from .extractors import extract_file
+from .facets import get_facets
+from .metrics import MetricsRegistry
+from .middleware import RequestMetricsMiddleware
+from .models import (
+    ArchiveJob, BarcodeAssignment, BarcodeRange, Blob, Document, DocumentContent, DocType,
+    ExportControl, Project, RequestMetric, SlowQuery, SystemSettings, UploadSession, User, UserActivity
+)
+from .normalization import folded_search_text, normalize_search_text
+from .nplusone import NPlusOneError, detect_nplusone
+from .pagination import IdListPaginator, KeysetPaginator, capped_count
+from .slow_queries import redact
+from .spelling import Vocabulary
+from .reference_data import ReferenceChoiceField
+from .storage import blob_name
+from .system_settings import SettingsCache
+
+
+# Users, reference data and barcode ranges are a few hundred rows at most;
+# scanning them is fine. System settings are loaded completely, once per worker.
+SMALL_TABLES = {
+    'findexapp_user', 'findexapp_project', 'findexapp_doctype', 'findexapp_exportcontrol',
+    'findexapp_systemsettings', 'findexapp_barcoderange',
+}
+
+# Walking an index is a full scan as well unless a LIMIT stops it early
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?(?P<index> USING (?:COVERING )?INDEX \w+)?$')
+LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+
+
+class TemporaryMediaRootMixin:
+    """Run the test class with a MEDIA_ROOT of its own, removed afterwards
+
+    Saved files are not extracted in the background unless a test asks for it:
+    the extraction thread would compete with the test for the database.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp(prefix='findex-test-media-')
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root, FINDEX_EXTRACT_ON_SAVE=False)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+        super().setUpClass()
+
+
+def _force(value):
+    """Evaluate what a template would evaluate when rendering ``value``"""
+    if isinstance(value, LazyObject):
+        return str(value)
+    if isinstance(value, QuerySet):
+        return list(value)
+    if isinstance(value, forms.BaseForm):
+        return str(value)
+    if hasattr(value, 'object_list'):
+        return list(value)
+    if isinstance(value, dict):
+        return [_force(item) for item in value.values()]
+    return value
+
+
+def _render(request, template_name, context=None, *args, **kwargs):
+    # Stand-in for django.shortcuts.render: several templates are not part of
+    # the repository, the queries a page triggers are the same without them
+    for value in list((context or {}).values()) + list(common_data(request).values()):
+        _force(value)
+    return HttpResponse(template_name)
+
+
+def _render_rows(request, template_name, context=None, *args, **kwargs):
+    # Like _render, and like the missing templates it shows every listed row
+    # together with its related objects (not internal ones like Document.blob)
+    response = _render(request, template_name, context, *args, **kwargs)
+    for value in (context or {}).values():
+        if isinstance(value, QuerySet) or hasattr(value, 'object_list'):
+            for obj in value:
+                str(obj)
+                for field in obj._meta.concrete_fields:
+                    if field.many_to_one and field.editable:
+                        getattr(obj, field.name)
+    return response
+
+
+class QueryPlanRecorder:
+    """Collect (sql, params) of all SELECT statements run inside the block"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT') and not many:
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def plans(self):
+        with connection.cursor() as cursor:
+            for sql, params in self.queries:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                yield sql, [row[-1] for row in cursor.fetchall()]
+
+
+class HotQueryPlanTests(TemporaryMediaRootMixin, TestCase):
+    """The queries behind the busiest pages must not fall back to full table scans"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='x', role='admin')
+        cls.project = Project.objects.create(name='WI.EP.0031')
+        Project.objects.create(name='WI.EP.0013')
+        doc_type = DocType.objects.create(name='WI')
+        export_control = ExportControl.objects.create(name='Keine', code='N')
+
+        for number in range(30):
+            document = Document(
+                doc_type=doc_type, project=cls.project, export_control=export_control,
+                version='1.0', title_de=f'Prüfplan {number}', is_active=number % 3 != 0,
+            )
+            document.document_file.save(f'plan{number}.txt', ContentFile(b'plan'), save=False)
+            document.save()
+            UserActivity.objects.create(user=cls.user, action='upload', description='Upload')
+
+        barcode_range = BarcodeRange.objects.create(
+            prefix='WI', start_number=1, end_number=100, current_number=1, created_by=cls.user
+        )
+        BarcodeRange.objects.create(
+            prefix='OLD', start_number=1, end_number=10, current_number=11, is_active=False
+        )
+        BarcodeAssignment.objects.create(
+            barcode_number='WI0001', barcode_range=barcode_range, purpose='Test'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertNoFullScans(self, url, params=None):
+        with mock.patch('findexapp.views.render', _render), QueryPlanRecorder() as recorder:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(recorder.queries)
+
+        # Subqueries and CTEs show up as SCAN steps as well
+        tables = set(connection.introspection.table_names()) - SMALL_TABLES
+        for sql, plan in recorder.plans():
+            for step in plan:
+                match = FULL_SCAN.match(step)
+                if match and match.group('index') and LIMIT.search(sql):
+                    continue
+                if match and match.group(1) in tables:
+                    self.fail(f'{url}: full scan of {match.group(1)}\n{sql}\n' + '\n'.join(plan))
+
+    def test_dashboard(self):
+        self.assertNoFullScans(reverse('dashboard'))
+
+    def test_document_list(self):
+        # The facet counts of the unfiltered list group every document; they
+        # are cached per data version, so only the first request computes them
+        with mock.patch('findexapp.views.render', _render):
+            self.client.get(reverse('document_list'))
+        self.assertNoFullScans(reverse('document_list'))
+
+    def test_document_list_filtered(self):
+        self.assertNoFullScans(reverse('document_list'), {
+            'project': self.project.pk, 'is_active': 'true',
+            'date_from': (timezone.now() - timedelta(days=7)).date().isoformat(),
+        })
+
+    def test_document_list_search(self):
+        self.assertNoFullScans(reverse('document_list'), {'search_query': 'prüfplan'})
+
+    def test_search_suggest(self):
+        self.assertNoFullScans(reverse('api_search_suggest'), {'q': 'prüf'})
+
+    def test_project_documents(self):
+        self.assertNoFullScans(reverse('project_documents', args=[self.project.pk]))
+
+    def test_profile(self):
+        self.assertNoFullScans(reverse('profile'))
+
+    def test_admin_dashboard(self):
+        self.assertNoFullScans(reverse('admin_dashboard'))
+
+    def test_barcode_management(self):
+        self.assertNoFullScans(reverse('barcode_management'))
+
+    def test_barcode_assign(self):
+        self.assertNoFullScans(reverse('barcode_assign'))
+
+
+@override_settings(FINDEX_NPLUSONE_THRESHOLD=5)
+class NPlusOneTests(TemporaryMediaRootMixin, TestCase):
+    """Lists must load related objects together with their rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lister', password='x', role='admin')
+        doc_type = DocType.objects.create(name='WI')
+        export_control = ExportControl.objects.create(name='Keine', code='N')
+
+        cls.documents = []
+        for number in range(8):
+            project = Project.objects.create(name=f'WI.EP.{number:04d}')
+            document = Document(
+                doc_type=doc_type, project=project, export_control=export_control,
+                version='1.0', title_de=f'Arbeitsanweisung {number}', uploaded_by=cls.user,
+            )
+            document.document_file.save(f'wi{number}.txt', ContentFile(b'wi'), save=False)
+            document.save()
+            cls.documents.append(document)
+            UserActivity.objects.create(
+                user=cls.user, action='upload', description='Upload', document=document
+            )
+            barcode_range = BarcodeRange.objects.create(
+                prefix=f'W{number}', start_number=1, end_number=100, current_number=2,
+                created_by=cls.user
+            )
+            BarcodeAssignment.objects.create(
+                barcode_number=f'W{number}0001', barcode_range=barcode_range,
+                assigned_to=cls.user, purpose='Test'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertNoNPlusOne(self, url, data=None, method='get', render=_render_rows):
+        with mock.patch('findexapp.views.render', render), detect_nplusone():
+            response = getattr(self.client, method)(url, data or {})
+        self.assertEqual(response.status_code, 200)
+
+    def test_detector_reports_code_line(self):
+        with self.assertRaises(NPlusOneError) as raised, detect_nplusone():
+            for document in Document.objects.all():
+                document.project.name
+        self.assertIn('findexapp/tests.py', str(raised.exception))
+        self.assertIn('findexapp_project', str(raised.exception))
+
+    def test_detector_reports_template_line(self):
+        template = Template('{% for document in documents %}\n{{ document.project.name }}{% endfor %}')
+        with self.assertRaises(NPlusOneError) as raised, detect_nplusone():
+            template.render(Context({'documents': Document.objects.all()}))
+        self.assertIn('template: <unknown source>:2', str(raised.exception))
+
+    def test_detector_ignores_few_repetitions(self):
+        with detect_nplusone() as detector:
+            for document in Document.objects.all()[:4]:
+                document.project.name
+        self.assertEqual(detector.report(), [])
+
+    def test_dashboard(self):
+        # The dashboard template is part of the repository
+        from django.shortcuts import render
+        self.assertNoNPlusOne(reverse('dashboard'), render=render)
+
+    def test_document_list(self):
+        self.assertNoNPlusOne(reverse('document_list'))
+
+    def test_profile(self):
+        self.assertNoNPlusOne(reverse('profile'))
+
+    def test_admin_dashboard(self):
+        self.assertNoNPlusOne(reverse('admin_dashboard'))
+
+    def test_barcode_management(self):
+        self.assertNoNPlusOne(reverse('barcode_management'))
+
+    def test_batch_download(self):
+        self.assertNoNPlusOne(
+            reverse('batch_download'),
+            {'document_ids': [document.pk for document in self.documents]}, method='post'
+        )
+
+
+@override_settings(FINDEX_SLOW_QUERY_MS=0.0001, FINDEX_SLOW_QUERY_MAX_ROWS=3)
+class SlowQueryLogTests(TestCase):
+    """Every statement counts as slow with a threshold this low"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('tracer', password='x', role='admin')
+        self.client.force_login(self.user)
+
+    def test_redact_keeps_numbers_only(self):
+        self.assertEqual(
+            redact([42, 1.5, None, True, 'geheim', b'\x00\x01']),
+            [42, 1.5, None, True, '<str:6>', '<bytes:2>']
+        )
+
+    def test_request_is_logged_and_table_capped(self):
+        with self.assertLogs('findexapp.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('document_list'), {'search_query': 'geheim'})
+        entries = [record.data for record in logs.records]
+        self.assertTrue(any('<str:' in str(entry['params']) for entry in entries))
+        self.assertNotIn('geheim', str(entries))
+        self.assertEqual(SlowQuery.objects.count(), 3)
+        entry = SlowQuery.objects.first()
+        self.assertEqual(entry.view_name, 'findexapp.views.document_list')
+        self.assertTrue(entry.origin.startswith('findexapp/'))
+
+
+class DocumentDownloadTests(TemporaryMediaRootMixin, TestCase):
+    """Downloads are streamed and support ranges and conditional requests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('loader', password='x', role='admin')
+        cls.document = Document(
+            doc_type=DocType.objects.create(name='WI'),
+            project=Project.objects.create(name='WI.EP.0031'),
+            export_control=ExportControl.objects.create(name='Keine', code='N'),
+            version='1.0', title_de='Zeichnung',
+        )
+        cls.document.document_file.save('zeichnung.txt', ContentFile(b'0123456789' * 10), save=False)
+        cls.document.save()
+        cls.url = reverse('document_download', args=[cls.document.pk])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_full_download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789' * 10)
+        self.assertEqual(UserActivity.objects.filter(action='download').count(), 1)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-14')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-14/100')
+        self.assertEqual(b''.join(response.streaming_content), b'01234')
+        # Resuming is not logged as another download
+        self.assertFalse(UserActivity.objects.filter(action='download').exists())
+
+    def test_suffix_and_unsatisfiable_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    @override_settings(FINDEX_DOWNLOAD_OFFLOAD='x-accel-redirect')
+    def test_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.document.document_file.name)
+        self.assertEqual(response.content, b'')
+
+
+class StreamZipTests(TestCase):
+    """Archives are written while the files are read"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as handle:
+            handle.write(content)
+        return path
+
+    def test_entries(self):
+        text = self.write('a.txt', b'text ' * 1000)
+        pdf = self.write('b.pdf', b'%PDF' * 1000)
+        chunks = list(stream_zip([
+            (text, 'Plan.txt'), (pdf, 'Plan.pdf'), (pdf, 'plan.PDF'),
+            (os.path.join(self.directory.name, 'missing.txt'), 'Fehlt.txt'), (pdf, 'a/b.pdf'),
+        ]))
+        self.assertGreater(len(chunks), 1)
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertIsNone(archive.testzip())
+        entries = {info.filename: info for info in archive.infolist()}
+        self.assertEqual(list(entries), ['Plan.txt', 'Plan.pdf', 'plan (2).PDF', 'a_b.pdf'])
+        self.assertEqual(entries['Plan.txt'].compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(entries['Plan.pdf'].compress_type, zipfile.ZIP_STORED)
+        # Sizes follow the data in a data descriptor
+        self.assertTrue(entries['Plan.txt'].flag_bits & 0x08)
+        self.assertEqual(archive.read('plan (2).PDF'), b'%PDF' * 1000)
+
+
+@override_settings(FINDEX_ARCHIVE_JOB_MIN_FILES=3)
+class ArchiveJobTests(TemporaryMediaRootMixin, TestCase):
+    """Large selections are archived in the background"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('archivar', password='x', role='admin')
+        doc_type = DocType.objects.create(name='WI')
+        export_control = ExportControl.objects.create(name='Keine', code='N')
+        project = Project.objects.create(name='WI.EP.0031')
+        cls.ids = []
+        for number in range(4):
+            document = Document(
+                doc_type=doc_type, project=project, export_control=export_control,
+                version='1.0', title_de='Gleicher Titel',
+            )
+            document.document_file.save(f'archiv{number}.txt', ContentFile(b'inhalt' * 100), save=False)
+            document.save()
+            cls.ids.append(document.pk)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def request_archive(self, ids):
+        # Run the job here instead of in the worker thread
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post(reverse('batch_download'), {'document_ids': ids})
+        job = ArchiveJob.objects.order_by('-pk').first()
+        if job.status == 'pending':
+            archive_jobs.run_job(job.pk)
+        self.addCleanup(lambda: archive_jobs._expire(ArchiveJob.objects.get(pk=job.pk)))
+        return response, job
+
+    def test_small_selection_is_streamed(self):
+        response = self.client.post(reverse('batch_download'), {'document_ids': self.ids[:2]})
+        self.assertTrue(response.streaming)
+        self.assertFalse(ArchiveJob.objects.exists())
+
+    def test_job(self):
+        response, job = self.request_archive(self.ids)
+        self.assertRedirects(response, reverse('archive_job', args=[job.pk]))
+
+        state = self.client.get(reverse('api_archive_job', args=[job.pk])).json()
+        self.assertEqual(state['status'], 'done')
+        self.assertEqual(state['progress'], 100)
+
+        download = self.client.get(state['download_url'])
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(download.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(len(set(archive.namelist())), 4)
+
+    def test_jobs_of_other_users_are_hidden(self):
+        _, job = self.request_archive(self.ids)
+        urls = [reverse(name, args=[job.pk]) for name in ('archive_job', 'api_archive_job', 'archive_job_download')]
+        other = User.objects.create_user('kollege', password='x', role='admin')
+        self.client.force_login(other)
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 404)
+        # The same selection gets a job of its own
+        self.assertNotEqual(self.request_archive(self.ids)[1], job)
+
+        other.is_staff = True
+        other.save(update_fields=['is_staff'])
+        self.assertEqual(self.client.get(urls[1]).json()['status'], 'done')
+
+    def test_identical_selection_reuses_job(self):
+        _, job = self.request_archive(self.ids)
+        response = self.client.post(reverse('batch_download'), {'document_ids': list(reversed(self.ids))})
+        self.assertRedirects(response, reverse('archive_job', args=[job.pk]))
+        self.assertEqual(ArchiveJob.objects.count(), 1)
+
+    def test_expiry_by_disk_budget(self):
+        _, job = self.request_archive(self.ids)
+        path = ArchiveJob.objects.get(pk=job.pk).archive_file.path
+        with override_settings(FINDEX_ARCHIVE_DISK_BUDGET_MB=0):
+            self.assertEqual(archive_jobs.expire_archives(), 1)
+        self.assertEqual(ArchiveJob.objects.get(pk=job.pk).status, 'expired')
+        self.assertFalse(os.path.exists(path))
+
+    def test_timed_out_job_loses_partial_files(self):
+        job = ArchiveJob.objects.create(key='x', document_ids=self.ids, status='running')
+        ArchiveJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(days=1))
+        partial = os.path.join(settings.MEDIA_ROOT, 'archives', str(job.pk), 'tmpabc')
+        os.makedirs(partial)
+        call_command('expire_archives', stdout=io.StringIO())
+        self.assertEqual(ArchiveJob.objects.get(pk=job.pk).status, 'failed')
+        self.assertFalse(os.path.exists(os.path.dirname(partial)))
+
+    def test_simultaneous_requests_share_job(self):
+        documents = list(Document.objects.filter(pk__in=self.ids))
+        with self.captureOnCommitCallbacks(execute=False):
+            job, created = archive_jobs.create_job(documents, self.user)
+            # The second request did not see the first job yet
+            with mock.patch.object(archive_jobs, 'find_reusable', return_value=None):
+                again, created_again = archive_jobs.create_job(documents, self.user)
+        self.assertTrue(created)
+        self.assertEqual((again, created_again), (job, False))
+
+
+class ContentAddressedStorageTests(TemporaryMediaRootMixin, TestCase):
+    """Equal files are stored once and removed with their last document"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('speicher', password='x', role='admin')
+        cls.references = {
+            'doc_type': DocType.objects.create(name='WI'),
+            'project': Project.objects.create(name='WI.EP.0031'),
+            'export_control': ExportControl.objects.create(name='Keine', code='N'),
+        }
+
+    def upload(self, name, content):
+        document = Document(version='1.0', title_de='Zeichnung', **self.references)
+        document.document_file.save(name, ContentFile(content), save=False)
+        document.save()
+        return document
+
+    def test_equal_content_shares_blob(self):
+        content = f'{self.id()}'.encode() * 100
+        first = self.upload('plan.txt', content)
+        second = self.upload('Kopie von plan.txt', content)
+
+        self.assertEqual(first.document_file.name, second.document_file.name)
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(Blob.objects.get(pk=first.blob_id).ref_count, 2)
+        self.assertEqual(second.download_name, 'Kopie von plan.txt')
+
+        path = first.document_file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_download_uses_original_name_and_hash(self):
+        document = self.upload('Prüfbericht.txt', f'{self.id()}'.encode())
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('document_download', args=[document.pk]))
+        self.assertEqual(response['ETag'], f'"{document.content_hash}"')
+        self.assertIn("Pr%C3%BCfbericht.txt", response['Content-Disposition'])
+
+    def test_content_uploaded_again_before_purge_keeps_file(self):
+        content = f'{self.id()}'.encode()
+        first = self.upload('plan.txt', content)
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        second = self.upload('plan.txt', content)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(second.document_file.path))
+
+    def test_acquire_fails_when_file_was_purged(self):
+        with self.assertRaises(FileNotFoundError):
+            Blob.acquire('e' * 64, 10)
+
+    def test_verify_removes_files_without_blob(self):
+        path = os.path.join(settings.MEDIA_ROOT, blob_name('f' * 64))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as orphan:
+            orphan.write(b'abgebrochen')
+        os.utime(path, (0, 0))
+        call_command('backfill_blobs', '--verify', stdout=io.StringIO())
+        self.assertFalse(os.path.exists(path))
+
+    def test_replacing_file_releases_old_blob(self):
+        document = self.upload('alt.txt', f'{self.id()} alt'.encode())
+        old_blob = document.blob_id
+        document.document_file.save('neu.txt', ContentFile(f'{self.id()} neu'.encode()), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            document.save()
+        self.assertFalse(Blob.objects.filter(pk=old_blob).exists())
+        self.assertEqual(document.download_name, 'neu.txt')
+
+
+@override_settings(FINDEX_UPLOAD_CHUNK_SIZE=10)
+class ChunkedUploadTests(TemporaryMediaRootMixin, TestCase):
+    """Large files are uploaded in resumable, checksummed chunks"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('scanner', password='x', role='admin')
+        cls.doc_type = DocType.objects.create(name='WI')
+        cls.project = Project.objects.create(name='WI.EP.0031')
+        cls.export_control = ExportControl.objects.create(name='Keine', code='N')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.content = f'{self.id()}: Scan einer Zeichnung'.encode()
+        response = self.client.post(
+            reverse('api_upload_sessions'),
+            {'filename': 'Scan 42.pdf', 'size': len(self.content)}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.session = response.json()
+
+    def send(self, index, checksum=None):
+        data = self.content[index * 10:(index + 1) * 10]
+        checksum = checksum or 'sha256=' + hashlib.sha256(data).hexdigest()
+        return self.client.put(
+            reverse('api_upload_chunk', args=[self.session['id'], index]), data,
+            content_type='application/octet-stream', HTTP_X_CHUNK_CHECKSUM=checksum,
+        )
+
+    def complete(self):
+        return self.client.post(reverse('api_upload_complete', args=[self.session['id']]), {
+            'doc_type': self.doc_type.pk, 'project': self.project.pk,
+            'export_control': self.export_control.pk, 'version': '1.0', 'title_de': 'Scan',
+        }).json()
+
+    def test_resumed_upload_creates_document(self):
+        count = self.session['chunk_count']
+        for index in reversed(range(1, count)):
+            self.assertEqual(self.send(index).status_code, 200)
+
+        result = self.complete()
+        self.assertFalse(result['success'])
+        self.assertEqual(result['missing'], [0])
+
+        state = self.client.get(reverse('api_upload_session', args=[self.session['id']])).json()
+        self.assertEqual(state['received'], list(range(1, count)))
+        crc = zlib.crc32(self.content[:10])
+        self.assertEqual(self.send(0, f'crc32={crc:08x}').status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.complete()
+        self.assertTrue(result['success'])
+        document = Document.objects.get(pk=result['document_id'])
+        self.assertEqual(document.download_name, 'Scan 42.pdf')
+        with document.document_file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'uploads', str(self.session['id']))))
+
+        # A repeated request after a lost response creates no second document
+        self.assertEqual(self.complete()['document_id'], document.pk)
+        self.assertEqual(Document.objects.count(), 1)
+
+    def test_rejects_bad_chunks(self):
+        self.assertEqual(self.send(0, 'sha256=' + '0' * 64).status_code, 400)
+        wrong_length = self.client.put(
+            reverse('api_upload_chunk', args=[self.session['id'], 0]), b'kurz',
+            content_type='application/octet-stream', HTTP_X_CHUNK_CHECKSUM='crc32=00000000',
+        )
+        self.assertEqual(wrong_length.status_code, 400)
+        self.assertEqual(self.send(99).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_upload_session', args=[self.session['id']])).json()['received'], [])
+
+    def test_rejected_retransmission_keeps_received_chunk(self):
+        for index in range(self.session['chunk_count']):
+            self.send(index)
+        corrupted = self.client.put(
+            reverse('api_upload_chunk', args=[self.session['id'], 0]), b'x' * 10,
+            content_type='application/octet-stream',
+            HTTP_X_CHUNK_CHECKSUM='sha256=' + hashlib.sha256(self.content[:10]).hexdigest(),
+        )
+        self.assertEqual(corrupted.status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.complete()
+        self.assertTrue(result['success'])
+        with Document.objects.get(pk=result['document_id']).document_file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+
+    def test_sessions_belong_to_their_user(self):
+        other = User.objects.create_user('fremd', password='x', role='admin')
+        self.client.force_login(other)
+        self.assertEqual(self.send(0).status_code, 404)
+        self.assertEqual(UploadSession.objects.get().created_by, self.user)
+
+
+@override_settings(FINDEX_LOCAL_CACHE_CHECK_INTERVAL=0)
+class LocalCopyTests(TestCase):
+    """Per-process copies follow writes made by other processes"""
+
+    def test_setting_change_reaches_other_processes(self):
+        # A second SettingsCache stands for the copy of another worker
+        other = SettingsCache()
+        self.assertEqual(other.get('recent_upload_days'), 7)
+        # Visible to other processes as soon as the write commits
+        SystemSettings.set_setting('recent_upload_days', '14')
+        self.assertEqual(other.get('recent_upload_days'), 14)
+
+    @override_settings(FINDEX_LOCAL_CACHE_CHECK_INTERVAL=60)
+    def test_reference_created_elsewhere_is_accepted(self):
+        field = ReferenceChoiceField(Project)
+        reference_data.invalidate()
+        field.reference_objects()
+        # bulk_create sends no signals, like a write in another process before its stamp is read
+        project = Project.objects.bulk_create([Project(name='WI.EP.0032')])[0]
+        self.assertNotIn(project, field.reference_objects())
+        self.assertEqual(field.clean(str(project.pk)), project)
+        with self.assertRaises(forms.ValidationError):
+            field.clean('999999')
+
+
+def _extract_or_crash(path, file_type, max_chars):
+    """extract_file for ExtractionTests; the worker dies on files containing CRASH"""
+    with open(path, 'rb') as handle:
+        if b'CRASH' in handle.read():
+            os._exit(1)
+    return extract_file(path, file_type, max_chars)
+
+
+@override_settings(FINDEX_EXTRACT_ON_SAVE=False)
+class ExtractionTests(TemporaryMediaRootMixin, TestCase):
+    """Text extraction survives cut characters and dying workers"""
+
+    def test_utf8_cut_at_read_limit(self):
+        with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as handle:
+            handle.write('Prüfung'.encode() * 10)
+        self.addCleanup(os.unlink, handle.name)
+        # 3 characters * 4 bytes end in the middle of an ü
+        result = extract_file(handle.name, 'TXT', 3)
+        self.assertEqual(result['text'], 'Prü')
+        self.assertTrue(result['truncated'])
+
+    def test_backfill_survives_dead_worker(self):
+        references = {
+            'doc_type': DocType.objects.create(name='WI'),
+            'project': Project.objects.create(name='WI.EP.0031'),
+            'export_control': ExportControl.objects.create(name='Keine', code='N'),
+        }
+        for name, content in (('gut.txt', b'Lesbarer Text'), ('kaputt.txt', b'CRASH')):
+            document = Document(version='1.0', title_de=name, **references)
+            document.document_file.save(name, ContentFile(content + self.id().encode()), save=False)
+            document.save()
+
+        with mock.patch('findexapp.extraction.extract_file', _extract_or_crash):
+            stats = extraction.backfill(Document.objects.all(), workers=2)
+        self.assertEqual((stats['extracted'], stats['failed']), (1, 1))
+        self.assertEqual(DocumentContent.objects.get(document__title_de='kaputt.txt').error, extraction.WORKER_DIED)
+        self.assertIn('Lesbarer Text', DocumentContent.objects.get(document__title_de='gut.txt').text)
+
+    @override_settings(FINDEX_EXTRACT_ON_SAVE=True)
+    def test_only_new_files_are_queued(self):
+        document = Document(
+            version='1.0', title_de='Notiz', doc_type=DocType.objects.create(name='WI'),
+            project=Project.objects.create(name='WI.EP.0032'),
+            export_control=ExportControl.objects.create(name='Keine', code='N'),
+        )
+        document.document_file.save('notiz.txt', ContentFile(b'Hydraulikplan ' + self.id().encode()), save=False)
+        with mock.patch('findexapp.extraction.extract_in_background') as queue:
+            with self.captureOnCommitCallbacks(execute=True):
+                document.save()
+            queue.assert_called_once_with(document.pk)
+
+            queue.reset_mock()
+            document.title_de = 'Notiz 2'
+            with self.captureOnCommitCallbacks(execute=True):
+                document.save()
+                Document.objects.get(pk=document.pk).save()
+            queue.assert_not_called()
+
+        self.assertTrue(extraction.extract_saved_document(document.pk))
+        self.assertIn('Hydraulikplan', DocumentContent.objects.get(document=document).text)
+
+
+@override_settings(FINDEX_METRICS_TOKEN='geheim', FINDEX_METRICS_ALLOWED_IPS=[])
+class PrometheusEndpointTests(TestCase):
+    """/metrics needs a token or an admin, even from the local proxy"""
+
+    def test_loopback_is_not_trusted(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer falsch').status_code, 403)
+
+    def test_token(self):
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer geheim')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'findex_upload_bytes_total{{worker="{os.getpid()}"}}', response.content.decode())
+
+
+@override_settings(FINDEX_EXTRACT_ON_SAVE=False)
+class SpellingTests(TestCase):
+    """The vocabulary is built in the background and then follows changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.references = {
+            'doc_type': DocType.objects.create(name='WI'),
+            'project': Project.objects.create(name='WI.EP.0033'),
+            'export_control': ExportControl.objects.create(name='Keine', code='N'),
+        }
+
+    def _document(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Document.objects.create(version='1.0', title_de=title, **self.references)
+
+    def test_first_request_does_not_wait_for_build(self):
+        vocabulary = Vocabulary()
+        with mock.patch('findexapp.spelling.threading.Thread') as thread:
+            self.assertIsNone(vocabulary.correct('Kalibirerung'))
+            self.assertIsNone(vocabulary.correct('Kalibirerung'))
+        thread.return_value.start.assert_called_once_with()
+
+    def test_refresh_follows_changes(self):
+        document = self._document('Kalibrierung')
+        vocabulary = Vocabulary()
+        vocabulary.build()
+        self.assertEqual(vocabulary.correct('Kalibirerung'), 'Kalibrierung')
+
+        other = self._document('Dichtheitsprüfung')
+        self.assertEqual(vocabulary.correct('Dichtheitsprüfnug'), 'Dichtheitsprüfung')
+        other.title_de = 'Druckprüfung'
+        with self.captureOnCommitCallbacks(execute=True):
+            other.save()
+        # Version, changed documents, reference data and the document counter
+        with self.assertNumQueries(6):
+            self.assertEqual(vocabulary.correct('Druckprüfnug'), 'Druckprüfung')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            document.delete()
+        with mock.patch('findexapp.spelling.threading.Thread') as thread:
+            # The old index answers until the rebuild is done
+            self.assertEqual(vocabulary.correct('Kalibirerung'), 'Kalibrierung')
+        thread.return_value.start.assert_called_once_with()
+        vocabulary.build()
+        self.assertIsNone(vocabulary.correct('Kalibirerung'))
+        self.assertEqual(vocabulary.documents, 1)
+
+
+@override_settings(FINDEX_EXTRACT_ON_SAVE=False)
+class SuggestTests(TestCase):
+    """Suggestions match folded prefixes of active rows only"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tipper', password='x', role='admin')
+        references = {
+            'doc_type': DocType.objects.create(name='WI'),
+            'project': Project.objects.create(name='Prüfstand Nord'),
+            'export_control': ExportControl.objects.create(name='Keine', code='N'),
+        }
+        Project.objects.create(name='Pruefstand Süd', is_active=False)
+        Project.objects.create(name='Neuer Prüfstand')
+        Document.objects.create(version='1.0', title_de='Prüfstandsordnung', **references)
+        Document.objects.create(
+            version='1.0', title_de='Prüfstandsbetrieb alt', is_active=False, **references
+        )
+
+    def setUp(self):
+        suggest.clear_caches()
+
+    def test_inactive_rows_are_left_out(self):
+        labels = [item['label'] for item in suggest.get_suggestions(self.user, 'PRUEFSTAND')]
+        self.assertEqual(labels, ['Prüfstand Nord', 'Prüfstandsordnung'])
+
+    def test_umlauts_typed_without_dots(self):
+        labels = [item['label'] for item in suggest.get_suggestions(self.user, 'Prufstand')]
+        self.assertEqual(labels, ['Prüfstand Nord', 'Prüfstandsordnung'])
+        with mock.patch('findexapp.suggest.fts_available', return_value=False):
+            suggest.clear_caches()
+            labels = [item['label'] for item in suggest.get_suggestions(self.user, 'Prufstand')]
+        self.assertEqual(labels, ['Prüfstand Nord', 'Prüfstandsordnung'])
+
+
+@override_settings(FINDEX_EXTRACT_ON_SAVE=False)
+class DocumentCounterTests(TestCase):
+    """Counters match the document table after every kind of write"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doc_type = DocType.objects.create(name='WI')
+        cls.export_control = ExportControl.objects.create(name='Keine', code='N')
+        cls.projects = [Project.objects.create(name=f'WI.EP.004{number}') for number in range(2)]
+
+    def _documents(self, count):
+        return [
+            Document(
+                doc_type=self.doc_type, export_control=self.export_control, version='1.0',
+                project=self.projects[number % 2], title_de=f'Zähler {number}',
+                is_active=number % 3 != 0,
+            )
+            for number in range(count)
+        ]
+
+    def assertCountersMatch(self):
+        self.assertEqual(counters.reconcile(dry_run=True), [])
+
+    def test_bulk_writes(self):
+        # One update per touched counter (global, 2 projects, type, export control), not per row,
+        # plus the documents version bump
+        with self.assertNumQueries(10):
+            Document.objects.bulk_create(self._documents(20))
+        self.assertCountersMatch()
+        self.assertEqual(counters.global_counts(), (20, 13))
+
+        Document.objects.filter(project=self.projects[0]).update(is_active=False)
+        self.assertCountersMatch()
+        Document.objects.filter(is_active=True).update(project=self.projects[0])
+        self.assertCountersMatch()
+        Document.objects.filter(pk__in=Document.objects.values('pk')[:4]).delete()
+        self.assertCountersMatch()
+
+    def test_single_writes(self):
+        for document in self._documents(4):
+            document.save()
+        document.is_active = not document.is_active
+        document.project = self.projects[0]
+        document.save()
+        Document.objects.first().delete()
+        self.assertCountersMatch()
+
+    def test_update_fields_include_derived_columns(self):
+        document = self._documents(1)[0]
+        document.save()
+        document = Document.objects.get(pk=document.pk)
+        document.title_de = 'Übersicht'
+        document.project = self.projects[1 - self.projects.index(document.project)]
+        document.save(update_fields=['title_de'])
+        self.assertCountersMatch()
+        stored = Document.objects.get(pk=document.pk)
+        self.assertEqual(stored.title_de_norm, 'uebersicht\nubersicht')
+        self.assertEqual(stored.project, document.project)
+
+    def test_deferred_fields_are_not_loaded_per_row(self):
+        Document.objects.bulk_create(self._documents(10))
+        with self.assertNumQueries(1):
+            titles = [document.title_de for document in Document.objects.only('title_de')]
+        self.assertEqual(len(titles), 10)
+        document = Document.objects.only('title_de').first()
+        document.is_active = False
+        document.save()
+        self.assertCountersMatch()
+
+
+def _streamed_view(request):
+    return StreamingHttpResponse(iter([b'a' * 100, b'b' * 50]))
+
+
+@override_settings(FINDEX_METRICS_ENABLED=True, FINDEX_METRICS_FLUSH_INTERVAL=0)
+class RequestMetricsTests(TestCase):
+    """Metrics are recorded completely and written after the response"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        for target in ('findexapp.middleware.registry', 'findexapp.signals.registry'):
+            patcher = mock.patch(target, self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _request(self, view, user=None):
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(func=view)
+        request.user = user or User(role='viewer')
+        return RequestMetricsMiddleware(view)(request)
+
+    def test_streamed_size_and_flush_after_response(self):
+        response = self._request(_streamed_view)
+        self.assertEqual(b''.join(response.streaming_content), b'a' * 100 + b'b' * 50)
+        self.assertFalse(RequestMetric.objects.exists())
+
+        request_finished.send(sender=self.__class__)
+        metric = RequestMetric.objects.get()
+        self.assertEqual((metric.requests, metric.response_bytes), (1, 150))
+
+    def test_server_timing_only_for_admins(self):
+        self.assertNotIn('Server-Timing', self._request(_streamed_view))
+        self.assertIn('Server-Timing', self._request(_streamed_view, User(role='admin')))
+        with override_settings(FINDEX_SERVER_TIMING='all'):
+            self.assertIn('Server-Timing', self._request(_streamed_view))
+
+
+class BenchmarkTests(TemporaryMediaRootMixin, TestCase):
+    """Benchmarks leave the real data alone"""
+
+    def test_placeholder_files_are_temporary(self):
+        Document.objects.bulk_create([Document(
+            doc_type=DocType.objects.create(name='WI'),
+            project=Project.objects.create(name='WI.EP.0050'),
+            export_control=ExportControl.objects.create(name='Keine', code='N'),
+            version='1.0', title_de='Synthetisch', document_file='synthetic/wi.pdf', file_size=10,
+        )])
+        run = run_benchmark(['document_download'], repeat=1, warmup=0)
+        self.assertEqual(run['endpoints']['document_download']['status'], 200)
+        self.assertEqual(os.listdir(settings.MEDIA_ROOT), [])
+
+
+class ProfilingTests(TestCase):
+    """Profiled requests record template renders without affecting others"""
+
+    def setUp(self):
+        profile_dir = tempfile.mkdtemp(prefix='findex-profiles-')
+        self.addCleanup(shutil.rmtree, profile_dir, ignore_errors=True)
+        profile_settings = override_settings(FINDEX_PROFILE_DIR=profile_dir)
+        profile_settings.enable()
+        self.addCleanup(profile_settings.disable)
+
+    def test_render_is_wrapped_only_while_profiling(self):
+        original = Template.render
+
+        def view(request):
+            self.assertIsNot(Template.render, original)
+            return HttpResponse(Template('{{ title }}').render(Context({'title': 'Prüfplan'})))
+
+        request = RequestFactory().get('/', {'_profile': '1'})
+        request.user = User(username='profiler', role='admin')
+        response = profiling.profile_request(request, view, lambda request: 'view')
+        self.assertIs(Template.render, original)
+        summary = profiling.load(response['X-Findex-Profile'])
+        self.assertEqual(len(summary['templates']), 1)
+
+
+@override_settings(FINDEX_EXTRACT_ON_SAVE=False)
+class FullTextSearchTests(TestCase):
+    """The FTS index follows every kind of write and ranks title hits first"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.references = {
+            'doc_type': DocType.objects.create(name='WI'),
+            'project': Project.objects.create(name='WI.EP.0060'),
+            'export_control': ExportControl.objects.create(name='Keine', code='N'),
+        }
+
+    def _document(self, **fields):
+        return Document.objects.create(version='1.0', **self.references, **fields)
+
+    def _search(self, query):
+        return list(search.search_documents(Document.objects.all(), query).order_by('search_rank'))
+
+    def _index_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {search.FTS_TABLE} ORDER BY rowid')
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_triggers_follow_writes(self):
+        document = self._document(title_de='Kalibrierschein Waage')
+        self.assertEqual(self._search('kalibrier'), [document])
+
+        document.title_de = 'Wartungsplan Waage'
+        document.save()
+        self.assertEqual(self._search('kalibrier'), [])
+        self.assertEqual(self._search('wartung'), [document])
+
+        Document.objects.filter(pk=document.pk).update(description='Druckbehälter')
+        self.assertEqual(self._search('Druckbehälter'), [document])
+        DocumentContent.objects.create(document=document, text='Anhang Schweißnaht')
+        self.assertEqual(self._search('Schweißnaht'), [document])
+
+        document.delete()
+        self.assertEqual(self._index_rows(), [])
+
+    def test_title_hits_rank_first(self):
+        in_description = self._document(title_de='Prüfplan', description='Flansch prüfen')
+        in_title = self._document(title_de='Flansch DN50')
+        self.assertEqual(self._search('flansch'), [in_title, in_description])
+        self.assertTrue(search.is_ranked(search.search_documents(Document.objects.all(), 'flansch')))
+
+    def test_operators_are_plain_text(self):
+        document = self._document(title_de='Anleitung NOT-AUS')
+        self.assertEqual(self._search('NOT-AUS'), [document])
+        self.assertEqual(self._search('OR Anleitung'), [])
+        # Nothing searchable: the queryset is returned unfiltered and unranked
+        queryset = search.search_documents(Document.objects.all(), '" *')
+        self.assertFalse(search.is_ranked(queryset))
+        self.assertEqual(list(queryset), [document])
+
+    def test_fallback_without_fts(self):
+        document = self._document(title_de='Bräuer Gutachten')
+        self._document(title_de='Anderes')
+        with mock.patch('findexapp.search.fts_available', return_value=False):
+            queryset = search.search_documents(Document.objects.all(), 'braeuer')
+            self.assertFalse(search.is_ranked(queryset))
+            self.assertEqual(list(queryset), [document])
+            for query in ('Brauer', 'BRÄUER'):
+                self.assertEqual(list(search.search_documents(Document.objects.all(), query)), [document])
+
+    def test_rebuild_search_index(self):
+        documents = [self._document(title_de=f'Zeichnung {number}') for number in range(3)]
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE} WHERE rowid = %s', [documents[0].pk])
+            # Orphaned row of a document that no longer exists
+            cursor.execute(
+                f'INSERT INTO {search.FTS_TABLE}(rowid, title_de) VALUES (%s, %s)', [999999, 'Zeichnung']
+            )
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self._index_rows(), [document.pk for document in documents])
+        self.assertEqual(len(self._search('zeichnung')), 3)
+
+        output = io.StringIO()
+        call_command('rebuild_search_index', '--full', '--optimize', stdout=output)
+        self.assertIn('Indexed 3 documents', output.getvalue())
+        self.assertEqual(len(self._search('zeichnung')), 3)
+
+
+@override_settings(FINDEX_EXTRACT_ON_SAVE=False)
+class KeysetPaginationTests(TestCase):
+    """Cursor pages cover every row once, in order, without COUNT queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        references = {
+            'doc_type': DocType.objects.create(name='WI'),
+            'project': Project.objects.create(name='WI.EP.0070'),
+            'export_control': ExportControl.objects.create(name='Keine', code='N'),
+        }
+        Document.objects.bulk_create([
+            Document(version='1.0', title_de=f'Blatt {number}', **references) for number in range(8)
+        ])
+        # Equal timestamps must be ordered by id
+        now = timezone.now()
+        for number, pk in enumerate(Document.objects.order_by('pk').values_list('pk', flat=True)):
+            Document.objects.filter(pk=pk).update(uploaded_at=now - timedelta(hours=number // 3))
+        cls.expected = list(Document.objects.order_by('-uploaded_at', '-id').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(Document.objects.all(), 3)
+
+    def _pks(self, page):
+        return [document.pk for document in page]
+
+    def test_forward_and_backward(self):
+        with self.assertNumQueries(1):
+            page = self.paginator.get_page()
+        seen = self._pks(page)
+        while page.has_next():
+            with self.assertNumQueries(1):
+                page = self.paginator.get_page(page.next_cursor)
+            seen += self._pks(page)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(page.number, 3)
+
+        page = self.paginator.get_page(self.paginator.get_page().last_cursor)
+        self.assertIsNone(page.number)
+        seen = self._pks(page)
+        while page.has_previous():
+            page = self.paginator.get_page(page.previous_cursor)
+            seen = self._pks(page) + seen
+        self.assertEqual(seen, self.expected)
+
+    def test_page_numbers_and_invalid_cursors(self):
+        self.assertEqual(self._pks(self.paginator.get_page(page_number='2')), self.expected[3:6])
+        # Without a count the last page is the oldest per_page rows
+        self.assertEqual(self._pks(self.paginator.get_page(page_number='99')), self.expected[-3:])
+        self.assertEqual(self._pks(self.paginator.get_page('kaputt', 'x')), self.expected[:3])
+
+    def test_cached_ids_give_the_same_pages(self):
+        cached = IdListPaginator(self.expected, Document.objects.all(), 3)
+        page, cached_page = self.paginator.get_page(), cached.get_page()
+        while True:
+            self.assertEqual(self._pks(cached_page), self._pks(page))
+            if not page.has_next():
+                break
+            self.assertEqual(cached_page.next_cursor, page.next_cursor)
+            page = self.paginator.get_page(page.next_cursor)
+            cached_page = cached.get_page(cached_page.next_cursor)
+
+    def test_capped_count(self):
+        self.assertEqual(capped_count(Document.objects.all(), 5), (5, True))
+        self.assertEqual(capped_count(Document.objects.all(), 100), (8, False))
+
+
+@override_settings(FINDEX_EXTRACT_ON_SAVE=False)
+class ResultCacheTests(TestCase):
+    """Cached search results are reused until a document write commits"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.references = {
+            'doc_type': DocType.objects.create(name='WI'),
+            'project': Project.objects.create(name='WI.EP.0080'),
+            'export_control': ExportControl.objects.create(name='Keine', code='N'),
+        }
+        cls.documents = Document.objects.bulk_create([
+            Document(version='1.0', title_de=f'Stückliste {number}', **cls.references)
+            for number in range(3)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.filters = {'search_query': 'stückliste'}
+
+    def _ids(self):
+        queryset = Document.objects.filter(is_active=True).order_by('-id')
+        return result_cache.get_result_ids(queryset, self.filters)[0]
+
+    def _write(self, write):
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+
+    def test_repeated_search_is_served_from_cache(self):
+        ids = self._ids()
+        # Only the version is read
+        with self.assertNumQueries(1):
+            self.assertEqual(self._ids(), ids)
+        self.assertEqual(result_cache.result_cache_stats()['hits'], 1)
+
+    def test_writes_retire_cached_results(self):
+        first, second, third = self.documents
+        self.assertEqual(self._ids(), [third.pk, second.pk, first.pk])
+
+        new = Document(version='1.0', title_de='Stückliste 3', **self.references)
+        self._write(new.save)
+        self.assertEqual(self._ids(), [new.pk, third.pk, second.pk, first.pk])
+        self._write(lambda: Document.objects.filter(pk=second.pk).update(is_active=False))
+        self.assertEqual(self._ids(), [new.pk, third.pk, first.pk])
+        self._write(third.delete)
+        self.assertEqual(self._ids(), [new.pk, first.pk])
+
+    def test_rolled_back_writes_keep_cache(self):
+        ids = self._ids()
+        with transaction.atomic():
+            Document.objects.filter(pk=self.documents[0].pk).update(is_active=False)
+            # Inside the writing transaction the new version is already visible
+            self.assertNotIn(self.documents[0].pk, self._ids())
+            transaction.set_rollback(True)
+        self.assertEqual(self._ids(), ids)
+        self.assertEqual(result_cache.result_cache_stats()['hits'], 1)
+
+    @override_settings(FINDEX_RESULT_CACHE_MAX_IDS=2, FINDEX_COUNT_CAP=1)
+    def test_long_results_are_truncated(self):
+        ids, complete = result_cache.get_result_ids(Document.objects.order_by('id'), self.filters)
+        self.assertEqual(ids, [document.pk for document in self.documents[:2]])
+        self.assertFalse(complete)
+
+
+@override_settings(FINDEX_EXTRACT_ON_SAVE=False)
+class FacetTests(TestCase):
+    """Each facet counts its values under the selections of all other facets"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wi, cls.aa = DocType.objects.create(name='WI'), DocType.objects.create(name='AA')
+        cls.north, cls.south = Project.objects.create(name='Nord'), Project.objects.create(name='Süd')
+        export_control = ExportControl.objects.create(name='Keine', code='N')
+        rows = [
+            (cls.wi, cls.north, True), (cls.wi, cls.north, True), (cls.wi, cls.south, True),
+            (cls.aa, cls.north, False), (cls.aa, cls.south, True), (cls.aa, cls.south, True),
+            (cls.aa, cls.south, True),
+        ]
+        Document.objects.bulk_create([
+            Document(
+                version='1.0', title_de=f'Dokument {number}', doc_type=doc_type, project=project,
+                export_control=export_control, is_active=is_active,
+            )
+            for number, (doc_type, project, is_active) in enumerate(rows)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def _counts(self, selected):
+        facets = get_facets(Document.objects.all(), selected, {})
+        return {
+            name: {item['value']: item['count'] for item in facets[name]}
+            for name in ('doc_type', 'project', 'is_active')
+        }
+
+    def test_counts_respect_other_selections(self):
+        counts = self._counts({'project': self.north.pk})
+        self.assertEqual(counts['doc_type'], {self.wi.pk: 2, self.aa.pk: 1})
+        # The selected facet still offers all of its values
+        self.assertEqual(counts['project'], {self.north.pk: 3, self.south.pk: 4})
+        self.assertEqual(counts['is_active'], {True: 2, False: 1})
+
+        counts = self._counts({'project': self.north.pk, 'doc_type': self.aa.pk})
+        self.assertEqual(counts['doc_type'], {self.wi.pk: 2, self.aa.pk: 1})
+        self.assertEqual(counts['project'], {self.north.pk: 1, self.south.pk: 3})
+        self.assertEqual(counts['is_active'], {False: 1})
+
+    def test_one_grouped_query(self):
+        with CaptureQueriesContext(connection) as context:
+            self._counts({'project': self.north.pk, 'is_active': True})
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if 'findexapp_dataversion' not in query['sql']
+        ]
+        self.assertEqual(len(queries), 1)
+        self.assertIn('GROUP BY', queries[0])
+
+
+@override_settings(FINDEX_EXTRACT_ON_SAVE=False)
+class CommonDataTests(TestCase):
+    """Sidebar and header values are lazy and cached per documents version"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('leser', password='x', role='viewer')
+        cls.project = Project.objects.create(name='WI.EP.0070')
+        cls.references = {
+            'doc_type': DocType.objects.create(name='WI'),
+            'project': cls.project,
+            'export_control': ExportControl.objects.create(name='Keine', code='N'),
+        }
+        Document.objects.create(version='1.0', title_de='Lageplan', **cls.references)
+
+    def setUp(self):
+        cache.clear()
+        reference_data.invalidate()
+
+    def _context(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return common_data(request)
+
+    def test_unused_values_are_not_loaded(self):
+        with CaptureQueriesContext(connection) as context:
+            data = self._context()
+            self.assertEqual(data['total_documents'], 1)
+        tables = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertNotIn('findexapp_project', tables)
+        self.assertNotIn('findexapp_doctype', tables)
+        self.assertNotIn('findexapp_exportcontrol', tables)
+
+    def test_cached_values_follow_version(self):
+        self.assertEqual(self._context()['total_documents'], 1)
+        # Only the version is read
+        with self.assertNumQueries(1):
+            self.assertEqual(self._context()['total_documents'], 1)
+
+        Document.objects.create(version='1.0', title_de='Lageplan 2', **self.references)
+        self.assertEqual(self._context()['total_documents'], 2)
+        self.project.name = 'WI.EP.0071'
+        self.project.save()
+        self.assertEqual([project.name for project in self._context()['all_projects']], ['WI.EP.0071'])
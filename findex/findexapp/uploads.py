@@ -0,0 +1,205 @@
+"""
+Resumable chunked uploads.
+
+Large scans are sent as an UploadSession in chunks of
+``FINDEX_UPLOAD_CHUNK_SIZE`` bytes instead of one multipart POST. Every
+chunk is first stored on its own and checked against its checksum
+(``X-Chunk-Checksum: sha256=…`` or ``crc32=…``); only then is it written at
+its offset into MEDIA_ROOT/uploads/<id>/data and marked as received.
+Rejected chunks never reach the data; the browser can ask which chunks
+are missing after a disconnect and send only those, several at a time. Completing the session creates the Document in one
+transaction; the assembled file is handed to the document storage, which
+moves it into place instead of copying it.
+
+Sessions without a new chunk for ``FINDEX_UPLOAD_SESSION_MAX_AGE_HOURS``
+are deleted by ``expire_sessions``.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+
+from .models import UploadSession
+from .system_settings import get_setting
+
+
+# Bytes read from the request per write
+READ_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """A chunk or session request that cannot be accepted"""
+
+
+class _Crc32:
+    # Browsers only offer SHA-256 on HTTPS pages; CRC32 is the fallback
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f'{self.value:08x}'
+
+
+CHECKSUMS = {'sha256': hashlib.sha256, 'crc32': _Crc32}
+
+
+def chunk_size():
+    return getattr(settings, 'FINDEX_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def session_dir(session):
+    return default_storage.path(f'uploads/{session.pk}')
+
+
+def _data_path(session):
+    return os.path.join(session_dir(session), 'data')
+
+
+def _chunk_dir(session):
+    return os.path.join(session_dir(session), 'chunks')
+
+
+def create_session(user, filename, size):
+    """Open a session for a file of ``size`` bytes"""
+    filename = os.path.basename(str(filename or '').replace('\\', '/')).strip()
+    if not filename:
+        raise ChunkError('Dateiname fehlt.')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise ChunkError('Ungültige Dateigröße.')
+    max_size_mb = get_setting('max_file_size_mb')
+    if size < 0 or (max_size_mb and size > max_size_mb * 1024 * 1024):
+        raise ChunkError(f'Die Datei ist größer als {max_size_mb} MB.')
+
+    expire_sessions()
+    session = UploadSession.objects.create(
+        created_by=user, filename=filename[:255], size=size, chunk_size=chunk_size()
+    )
+    os.makedirs(_chunk_dir(session), exist_ok=True)
+    # Sparse until the chunks arrive
+    with open(_data_path(session), 'wb') as data:
+        data.truncate(size)
+    return session
+
+
+def received_chunks(session):
+    """Indexes of the chunks stored so far, ascending"""
+    try:
+        names = os.listdir(_chunk_dir(session))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name) for name in names if name.isdigit())
+
+
+def parse_checksum(header):
+    """(algorithm, hex digest) from an ``X-Chunk-Checksum`` header"""
+    algorithm, _, digest = (header or '').partition('=')
+    algorithm = algorithm.strip().lower()
+    if algorithm not in CHECKSUMS or not digest.strip():
+        raise ChunkError('Prüfsumme fehlt (sha256=… oder crc32=…).')
+    return algorithm, digest.strip().lower()
+
+
+def write_chunk(session, index, stream, length, checksum):
+    """Write chunk ``index`` read from ``stream`` at its offset and mark it received"""
+    if session.status != 'open':
+        raise ChunkError('Der Upload ist bereits abgeschlossen.')
+    if not 0 <= index < session.chunk_count:
+        raise ChunkError(f'Ungültiger Abschnitt {index}.')
+    expected = session.chunk_length(index)
+    if length != expected:
+        raise ChunkError(f'Abschnitt {index} muss {expected} Bytes lang sein.')
+    algorithm, digest = parse_checksum(checksum)
+
+    hasher = CHECKSUMS[algorithm]()
+    # The chunk is checked in a file of its own; a rejected retransmission
+    # of a received chunk must not overwrite the data
+    part = tempfile.NamedTemporaryFile(
+        dir=_chunk_dir(session), prefix=f'{index}-', suffix='.part', delete=False
+    )
+    try:
+        with part:
+            written = 0
+            while written < expected:
+                data = stream.read(min(READ_SIZE, expected - written))
+                if not data:
+                    raise ChunkError(f'Abschnitt {index} ist unvollständig.')
+                hasher.update(data)
+                part.write(data)
+                written += len(data)
+        if hasher.hexdigest() != digest:
+            raise ChunkError(f'Prüfsumme von Abschnitt {index} stimmt nicht.')
+
+        marker = os.path.join(_chunk_dir(session), str(index))
+        if os.path.exists(marker):
+            os.unlink(marker)
+        offset = index * session.chunk_size
+        descriptor = os.open(_data_path(session), os.O_WRONLY)
+        try:
+            with open(part.name, 'rb') as source:
+                while data := source.read(READ_SIZE):
+                    os.pwrite(descriptor, data, offset)
+                    offset += len(data)
+            # Received means on disk, so a crash cannot lose acknowledged chunks
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+        open(marker, 'w').close()
+    finally:
+        os.unlink(part.name)
+
+
+def missing_chunks(session):
+    return sorted(set(range(session.chunk_count)) - set(received_chunks(session)))
+
+
+class AssembledFile(UploadedFile):
+    """The completed data file, offered to the storage as a file it may move"""
+
+    def __init__(self, session):
+        path = _data_path(session)
+        # The storage moves a hard link, so the data stays until the transaction commits
+        self._path = os.path.join(session_dir(session), 'assembled')
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        os.link(path, self._path)
+        super().__init__(
+            open(self._path, 'rb'), session.filename, 'application/octet-stream', session.size
+        )
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def discard(session):
+    """Delete the partial data of a session"""
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+
+
+def expire_sessions():
+    """Delete sessions idle for too long; returns the number deleted"""
+    now = timezone.now()
+    cutoff = now - timedelta(hours=getattr(settings, 'FINDEX_UPLOAD_SESSION_MAX_AGE_HOURS', 48))
+    expired = 0
+    for session in UploadSession.objects.filter(created_at__lt=cutoff):
+        try:
+            # The directory changes with every received chunk
+            last_chunk = os.path.getmtime(_chunk_dir(session))
+        except FileNotFoundError:
+            last_chunk = None
+        if last_chunk is None or last_chunk < cutoff.timestamp():
+            discard(session)
+            session.delete()
+            expired += 1
+    return expired
@@ -23,10 +23,17 @@ urlpatterns = [
     
     # Admin views
     path('admin/dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin/metrics/', views.admin_metrics, name='admin_metrics'),
+    path('admin/profiles/', views.admin_profiles, name='admin_profiles'),
+    path('admin/profiles/<str:profile_id>/', views.admin_profile_detail, name='admin_profile_detail'),
+    path('admin/profiles/<str:profile_id>/download/', views.admin_profile_download, name='admin_profile_download'),
     path('admin/users/', views.user_management, name='user_management'),
     path('admin/users/create/', views.user_create, name='user_create'),
     path('admin/users/<int:pk>/edit/', views.user_edit, name='user_edit'),
     
+    # Monitoring
+    path('metrics', views.prometheus_metrics, name='prometheus_metrics'),
+    
     # Barcode management
     path('barcode/', views.barcode_management, name='barcode_management'),
     path('barcode/range/create/', views.barcode_range_create, name='barcode_range_create'),
@@ -35,9 +42,17 @@ urlpatterns = [
     # API endpoints
     path('api/document-stats/', views.api_document_stats, name='api_document_stats'),
     path('api/batch-edit/', views.api_batch_edit, name='api_batch_edit'),
+    path('api/search/suggest/', views.api_search_suggest, name='api_search_suggest'),
+    path('api/archive-jobs/<int:pk>/', views.api_archive_job, name='api_archive_job'),
+    path('api/uploads/', views.api_upload_sessions, name='api_upload_sessions'),
+    path('api/uploads/<int:pk>/', views.api_upload_session, name='api_upload_session'),
+    path('api/uploads/<int:pk>/chunks/<int:index>/', views.api_upload_chunk, name='api_upload_chunk'),
+    path('api/uploads/<int:pk>/complete/', views.api_upload_complete, name='api_upload_complete'),
     
     # Batch operations
     path('batch/download/', views.batch_download, name='batch_download'),
+    path('batch/download/<int:pk>/', views.archive_job, name='archive_job'),
+    path('batch/download/<int:pk>/file/', views.archive_job_download, name='archive_job_download'),
     path('batch/edit/', views.batch_edit, name='batch_edit'),
     path('export/documents/', views.export_documents, name='export_documents'),
 ] 
\ No newline at end of file
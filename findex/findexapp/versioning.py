@@ -0,0 +1,101 @@
+"""
+Data version counters for cache invalidation.
+
+Caches of derived data embed the current version of the data they were built
+from in their keys, so old entries are simply never looked up again and
+expire on their own. Every namespace is a DataVersion row bumped inside the
+writing transaction: all workers see the new stamp together with the new
+data, whatever cache backend is configured, and a rolled back write leaves
+it alone. Reading a version is one indexed lookup in a tiny table, done
+once per request and namespace.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+
+DOCUMENTS = 'documents'
+SETTINGS = 'settings'
+REFERENCE_DATA = 'reference'
+
+
+_request_versions = threading.local()
+
+
+def remember_versions(sender=None, **kwargs):
+    """request_started receiver: read each version at most once per request"""
+    _request_versions.versions = {}
+
+
+def forget_versions(sender=None, **kwargs):
+    """request_finished receiver"""
+    _request_versions.versions = None
+
+
+def get_version(namespace=DOCUMENTS):
+    """Current version number of a data namespace"""
+    from .models import DataVersion
+    versions = getattr(_request_versions, 'versions', None)
+    if versions is not None and namespace in versions:
+        return versions[namespace]
+    version = DataVersion.objects.filter(namespace=namespace).values_list('version', flat=True).first() or 0
+    if versions is not None:
+        versions[namespace] = version
+    return version
+
+
+def bump_version(namespace=DOCUMENTS):
+    """Invalidate caches of a namespace; part of the current transaction"""
+    from .models import DataVersion
+    if not DataVersion.objects.filter(namespace=namespace).update(version=F('version') + 1):
+        DataVersion.objects.get_or_create(namespace=namespace)
+        DataVersion.objects.filter(namespace=namespace).update(version=F('version') + 1)
+    versions = getattr(_request_versions, 'versions', None)
+    if versions is not None:
+        versions.pop(namespace, None)
+
+
+def check_interval():
+    """Seconds a process trusts its local copies before comparing versions"""
+    return getattr(settings, 'FINDEX_LOCAL_CACHE_CHECK_INTERVAL', 5)
+
+
+class LocalCopy:
+    """
+    Per-process copy of the result of ``load()`` for a version namespace.
+
+    The shared version stamp is compared at most every ``check_interval()``
+    seconds, so reads in between touch neither the database nor the cache
+    and writes from other processes are picked up within that interval.
+    """
+
+    def __init__(self, namespace, load):
+        self.namespace = namespace
+        self.load = load
+        self._value = None
+        self._version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        # One read: invalidate() may reset the attribute concurrently
+        value = self._value
+        if value is not None and now - self._checked_at < check_interval():
+            return value
+
+        # Read the stamp first: a write racing with the load bumps it again
+        version = get_version(self.namespace)
+        with self._lock:
+            if self._value is None or version != self._version:
+                self._value = self.load()
+                self._version = version
+            self._checked_at = now
+            return self._value
+
+    def invalidate(self):
+        """Forget the local copy; other processes follow via the version stamp"""
+        with self._lock:
+            self._value = None
@@ -2,26 +2,46 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import (
+    FileResponse, JsonResponse, HttpResponse, HttpResponseForbidden, Http404, StreamingHttpResponse
+)
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import Q, Count
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from django.urls import reverse
 import os
+import hmac
 import json
 from datetime import datetime, timedelta
+from functools import wraps
 
 from .models import (
     Document, Project, DocType, ExportControl, User, 
-    BarcodeRange, BarcodeAssignment, SystemSettings, UserActivity
+    BarcodeRange, BarcodeAssignment, SystemSettings, UserActivity, RequestMetric,
+    SlowQuery, ArchiveJob, UploadSession
 )
 from .forms import (
     LoginForm, DocumentUploadForm, DocumentEditForm, DocumentSearchForm,
     UserForm, ProjectForm, DocTypeForm, ExportControlForm, 
     BarcodeRangeForm, BarcodeAssignmentForm, PasswordChangeForm, BatchEditForm
 )
+from . import reference_data
+from .search import search_documents, is_ranked
+from .pagination import KEYSET_ORDERING, IdListPaginator, KeysetPaginator, OffsetPaginator, capped_count
+from .facets import get_facets
+from .result_cache import get_result_ids, normalize_filters, result_cache_stats
+from . import archive_jobs, downloads, profiling, prometheus, uploads
+from .archives import member_name, stream_zip
+from .metrics import merge_metrics, registry as metrics_registry
+from .spelling import suggest_spelling
+from .context_processors import document_totals
+from .counters import counts_by, global_counts
+from .system_settings import get_setting
+from .suggest import SUGGEST_LIMIT, get_suggestions
 
 
 def is_admin(user):
@@ -39,6 +59,17 @@ def is_editor_or_above(user):
     return user.is_authenticated and user.role in ['editor', 'full_control', 'admin']
 
 
+def barcode_module_required(view_func):
+    """Redirect to the dashboard while the barcode module is switched off"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not get_setting('barcode_module_enabled'):
+            messages.error(request, 'Das Barcode-Modul ist deaktiviert.')
+            return redirect('dashboard')
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
 def log_user_activity(user, action, description, ip_address=None, document=None):
     """Helper function to log user activities"""
     UserActivity.objects.create(
@@ -100,20 +131,21 @@ def user_logout(request):
 @login_required
 def dashboard(request):
     """Main dashboard view"""
-    # Get statistics
-    total_documents = Document.objects.count()
-    active_documents = Document.objects.filter(is_active=True).count()
-    total_projects = Project.objects.filter(is_active=True).count()
+    # Get statistics, shared with the header counters of common_data
+    totals = document_totals()
+    total_documents = totals['total']
+    active_documents = totals['active']
+    total_projects = len(reference_data.all_objects(Project, active_only=True))
     
     # Recent uploads based on system setting
-    recent_days = int(SystemSettings.get_setting('recent_upload_days', 7))
+    recent_days = get_setting('recent_upload_days')
     recent_date = timezone.now() - timedelta(days=recent_days)
     recent_documents = Document.objects.filter(
         uploaded_at__gte=recent_date
-    ).order_by('-uploaded_at')[:10]
+    ).select_related('project', 'doc_type', 'uploaded_by').order_by('-uploaded_at')[:10]
     
     # Projects for navigation
-    projects = Project.objects.filter(is_active=True).order_by('name')
+    projects = reference_data.all_objects(Project, active_only=True)
     
     # Search form
     search_form = DocumentSearchForm()
@@ -136,53 +168,88 @@ def document_list(request):
     """Document listing with search and filtering"""
     documents = Document.objects.select_related('project', 'doc_type', 'export_control', 'uploaded_by')
     search_form = DocumentSearchForm(request.GET)
+    search_query = ''
+    selected_facets = {}
+    cache_filters = {}
+    result_filters = {}
     
-    # Apply filters
+    # Apply filters: non-facet filters first, they define the facet base
     if search_form.is_valid():
-        if search_form.cleaned_data['search_query']:
-            query = search_form.cleaned_data['search_query']
-            documents = documents.filter(
-                Q(title_de__icontains=query) |
-                Q(title_en__icontains=query) |
-                Q(title_fr__icontains=query) |
-                Q(description__icontains=query) |
-                Q(barcode_number__icontains=query) |
-                Q(version__icontains=query) |
-                Q(document_file__icontains=query)
-            )
+        cleaned = search_form.cleaned_data
+        if cleaned['search_query']:
+            query = cleaned['search_query']
+            documents = search_documents(documents, query, with_snippets=True)
+            search_query = query
         
-        if search_form.cleaned_data['doc_type']:
-            documents = documents.filter(doc_type=search_form.cleaned_data['doc_type'])
+        if cleaned['date_from']:
+            documents = documents.filter(uploaded_at__gte=cleaned['date_from'])
         
-        if search_form.cleaned_data['project']:
-            documents = documents.filter(project=search_form.cleaned_data['project'])
+        if cleaned['date_to']:
+            documents = documents.filter(uploaded_at__lte=cleaned['date_to'])
         
-        if search_form.cleaned_data['export_control']:
-            documents = documents.filter(export_control=search_form.cleaned_data['export_control'])
+        cache_filters = {
+            'search_query': search_query.strip().lower(),
+            'date_from': cleaned['date_from'],
+            'date_to': cleaned['date_to'],
+        }
         
-        if search_form.cleaned_data['is_active']:
-            is_active = search_form.cleaned_data['is_active'] == 'true'
-            documents = documents.filter(is_active=is_active)
+        for facet in ('doc_type', 'project', 'export_control'):
+            if cleaned[facet]:
+                selected_facets[facet] = cleaned[facet].pk
         
-        if search_form.cleaned_data['date_from']:
-            documents = documents.filter(uploaded_at__gte=search_form.cleaned_data['date_from'])
+        if cleaned['is_active']:
+            selected_facets['is_active'] = cleaned['is_active'] == 'true'
         
-        if search_form.cleaned_data['date_to']:
-            documents = documents.filter(uploaded_at__lte=search_form.cleaned_data['date_to'])
+        result_filters = normalize_filters(cleaned)
     
-    # Pagination
-    paginator = Paginator(documents.order_by('-uploaded_at'), 25)
-    page_number = request.GET.get('page')
-    documents_page = paginator.get_page(page_number)
+    facets = get_facets(documents, selected_facets, cache_filters)
+    
+    for facet, value in selected_facets.items():
+        documents = documents.filter(**{facet: value})
+    
+    # Ranked results are paged by offset, everything else by (uploaded_at, id) cursor
+    ranked = is_ranked(documents)
+    if ranked:
+        ordered = documents.order_by('search_rank', '-uploaded_at')
+        paginator = OffsetPaginator(ordered, 25)
+    else:
+        ordered = documents.order_by(*KEYSET_ORDERING)
+        paginator = KeysetPaginator(documents, 25)
+    
+    # Repeated searches page through the cached id list of the first run
+    result_ids, complete = get_result_ids(ordered, result_filters)
+    cached_paginator = IdListPaginator(result_ids, documents, 25, complete, cursors=not ranked)
+    documents_page = cached_paginator.get_page(request.GET.get('cursor'), request.GET.get('page'))
+    if documents_page is None:
+        documents_page = paginator.get_page(request.GET.get('cursor'), request.GET.get('page'))
+    
+    # The id list is always longer than the count cap, so it doubles as the count
+    count_cap = settings.FINDEX_COUNT_CAP
+    if complete or count_cap:
+        total_results = min(len(result_ids), count_cap or len(result_ids))
+        total_capped = len(result_ids) > total_results
+    else:
+        total_results, total_capped = capped_count(documents, count_cap)
+    
+    # Offer a corrected query instead of an empty result list
+    did_you_mean = None
+    if search_query and not total_results:
+        did_you_mean = suggest_spelling(search_query)
     
     # Additional data for template
-    export_controls = ExportControl.objects.filter(is_active=True).order_by('name')
+    export_controls = sorted(
+        reference_data.all_objects(ExportControl, active_only=True), key=lambda ec: ec.name
+    )
     
     context = {
         'documents': documents_page,
         'search_form': search_form,
         'export_controls': export_controls,
-        'total_results': documents.count(),
+        'search_query': search_query,
+        'facets': facets,
+        'total_results': total_results,
+        'total_capped': total_capped,
+        'did_you_mean': did_you_mean,
     }
     
     return render(request, 'findexapp/document_list.html', context)
@@ -197,40 +264,59 @@ def document_upload(request):
         if request.content_type.startswith('multipart/form-data'):
             form = DocumentUploadForm(request.POST, request.FILES)
             if form.is_valid():
-                document = form.save(commit=False)
-                document.uploaded_by = request.user
-                document.save()
-                
-                log_user_activity(
-                    request.user, 'upload', 
-                    f'Uploaded document: {document.primary_title}',
-                    get_client_ip(request), document
-                )
-                
-                return JsonResponse({
-                    'success': True,
-                    'message': f'Dokument "{document.primary_title}" erfolgreich hochgeladen!',
-                    'document_id': document.pk
-                })
+                return _upload_success(_save_upload(request, form))
             else:
-                errors = {}
-                for field, field_errors in form.errors.items():
-                    errors[field] = field_errors
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Validation errors occurred',
-                    'errors': errors
-                })
+                return _upload_errors(form)
     
     # GET request - show upload form
     form = DocumentUploadForm()
-    return render(request, 'findexapp/document_upload.html', {'form': form})
+    return render(request, 'findexapp/document_upload.html', {
+        'form': form,
+        'upload_chunk_size': uploads.chunk_size(),
+    })
+
+
+def _save_upload(request, form):
+    """Create the document of a valid upload form"""
+    document = form.save(commit=False)
+    document.uploaded_by = request.user
+    document.save()
+    prometheus.UPLOAD_BYTES.inc(amount=document.file_size or 0)
+    
+    log_user_activity(
+        request.user, 'upload', 
+        f'Uploaded document: {document.primary_title}',
+        get_client_ip(request), document
+    )
+    return document
+
+
+def _upload_success(document):
+    return JsonResponse({
+        'success': True,
+        'message': f'Dokument "{document.primary_title}" erfolgreich hochgeladen!',
+        'document_id': document.pk
+    })
+
+
+def _upload_errors(form):
+    errors = {}
+    for field, field_errors in form.errors.items():
+        errors[field] = field_errors
+    return JsonResponse({
+        'success': False,
+        'message': 'Validation errors occurred',
+        'errors': errors
+    })
 
 
 @login_required
 def document_detail(request, pk):
     """Document detail view"""
-    document = get_object_or_404(Document, pk=pk)
+    document = get_object_or_404(
+        Document.objects.select_related('project', 'doc_type', 'export_control', 'uploaded_by'),
+        pk=pk
+    )
     return render(request, 'findexapp/document_detail.html', {'document': document})
 
 
@@ -270,17 +356,13 @@ def document_download(request, pk):
     if not document.document_file:
         raise Http404("File not found")
     
-    log_user_activity(
-        request.user, 'download', 
-        f'Downloaded document: {document.primary_title}',
-        get_client_ip(request), document
-    )
-    
-    response = HttpResponse(
-        document.document_file.read(),
-        content_type='application/octet-stream'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{os.path.basename(document.document_file.name)}"'
+    response = downloads.serve_file(request, document.document_file, filename=document.download_name)
+    if downloads.is_new_download(response):
+        log_user_activity(
+            request.user, 'download', 
+            f'Downloaded document: {document.primary_title}',
+            get_client_ip(request), document
+        )
     return response
 
 
@@ -312,19 +394,20 @@ def project_documents(request, project_id):
     project = get_object_or_404(Project, pk=project_id)
     documents = Document.objects.filter(project=project, is_active=True)
     
-    # Pagination
-    paginator = Paginator(documents.order_by('-uploaded_at'), 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination
+    paginator = KeysetPaginator(documents, 25)
+    page_obj = paginator.get_page(request.GET.get('cursor'), request.GET.get('page'))
+    total_results, total_capped = capped_count(documents, settings.FINDEX_COUNT_CAP)
     
     # Projects for navigation
-    projects = Project.objects.filter(is_active=True).order_by('name')
+    projects = reference_data.all_objects(Project, active_only=True)
     
     context = {
         'page_obj': page_obj,
         'current_project': project,
         'projects': projects,
-        'total_results': documents.count(),
+        'total_results': total_results,
+        'total_capped': total_capped,
     }
     
     return render(request, 'findexapp/project_documents.html', context)
@@ -338,11 +421,11 @@ def admin_dashboard(request):
     # Statistics
     total_users = User.objects.count()
     active_users = User.objects.filter(is_active=True).count()
-    total_documents = Document.objects.count()
-    total_projects = Project.objects.count()
+    total_documents = document_totals()['total']
+    total_projects = len(reference_data.all_objects(Project))
     
     # Recent activities
-    recent_activities = UserActivity.objects.all()[:20]
+    recent_activities = UserActivity.objects.select_related('user', 'document')[:20]
     
     context = {
         'total_users': total_users,
@@ -350,11 +433,91 @@ def admin_dashboard(request):
         'total_documents': total_documents,
         'total_projects': total_projects,
         'recent_activities': recent_activities,
+        'result_cache': result_cache_stats(),
+        'recent_profiles': profiling.recent_profiles(10),
     }
     
     return render(request, 'findexapp/admin/dashboard.html', context)
 
 
+@login_required
+@user_passes_test(is_admin)
+def admin_metrics(request):
+    """Request metrics per view, ranked by total time spent"""
+    try:
+        hours = min(max(int(request.GET.get('hours', 24)), 1), 24 * 14)
+    except ValueError:
+        hours = 24
+
+    since = timezone.now() - timedelta(hours=hours)
+    rows = list(RequestMetric.objects.filter(period_end__gte=since).values(
+        'view_name', 'requests', 'total_time_ms', 'db_time_ms', 'queries',
+        'response_bytes', 'histogram', 'top_queries'
+    ))
+    # Include the not yet written window of this worker
+    for name, fields in metrics_registry.snapshot().items():
+        rows.append(dict(fields, view_name=name))
+
+    context = {
+        'report': merge_metrics(rows),
+        'hours': hours,
+        'hour_choices': [1, 6, 24, 72, 168],
+        'slow_queries': SlowQuery.objects.all()[:20],
+        'slow_query_ms': getattr(settings, 'FINDEX_SLOW_QUERY_MS', 200),
+    }
+    return render(request, 'findexapp/admin/metrics.html', context)
+
+
+@login_required
+@user_passes_test(is_admin)
+def admin_profiles(request):
+    """Stored request profiles, newest first"""
+    return render(request, 'findexapp/admin/profiles.html', {
+        'profiles': profiling.recent_profiles(),
+        'parameter': profiling.PARAMETER,
+    })
+
+
+@login_required
+@user_passes_test(is_admin)
+def admin_profile_detail(request, profile_id):
+    """Call tree, SQL timeline and template renders of one profile"""
+    profile = profiling.load(profile_id)
+    if profile is None:
+        raise Http404('Profile not found')
+    return render(request, 'findexapp/admin/profile_detail.html', {'profile': profile})
+
+
+@login_required
+@user_passes_test(is_admin)
+def admin_profile_download(request, profile_id):
+    """The raw pstats file, e.g. for snakeviz"""
+    path = profiling.stats_path(profile_id)
+    if path is None:
+        raise Http404('Profile not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.prof')
+
+
+def _has_metrics_token(request):
+    token = getattr(settings, 'FINDEX_METRICS_TOKEN', None)
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(
+        credentials.strip().encode(), token.encode()
+    )
+
+
+def prometheus_metrics(request):
+    """Prometheus metrics for admins and the monitoring hosts"""
+    allowed = getattr(settings, 'FINDEX_METRICS_ALLOWED_IPS', [])
+    if not (
+        _has_metrics_token(request)
+        or request.META.get('REMOTE_ADDR') in allowed
+        or (request.user.is_authenticated and is_admin(request.user))
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(prometheus.render(), content_type=prometheus.CONTENT_TYPE)
+
+
 @login_required
 @user_passes_test(is_admin)
 def user_management(request):
@@ -460,7 +623,9 @@ def profile(request):
         form = PasswordChangeForm()
     
     # Recent user activities
-    recent_activities = UserActivity.objects.filter(user=request.user)[:10]
+    recent_activities = UserActivity.objects.filter(
+        user=request.user
+    ).select_related('user', 'document')[:10]
     
     return render(request, 'findexapp/profile.html', {
         'form': form,
@@ -471,10 +636,13 @@ def profile(request):
 # Barcode Management Views (for full_control and admin users)
 @login_required
 @user_passes_test(is_full_control_or_admin)
+@barcode_module_required
 def barcode_management(request):
     """Barcode management dashboard"""
-    ranges = BarcodeRange.objects.all().order_by('-created_at')
-    recent_assignments = BarcodeAssignment.objects.all().order_by('-assigned_at')[:10]
+    ranges = BarcodeRange.objects.select_related('created_by').order_by('-created_at')
+    recent_assignments = BarcodeAssignment.objects.select_related(
+        'barcode_range', 'assigned_to'
+    ).order_by('-assigned_at')[:10]
     
     context = {
         'ranges': ranges,
@@ -486,6 +654,7 @@ def barcode_management(request):
 
 @login_required
 @user_passes_test(is_full_control_or_admin)
+@barcode_module_required
 def barcode_range_create(request):
     """Create new barcode range"""
     if request.method == 'POST':
@@ -512,6 +681,7 @@ def barcode_range_create(request):
 
 @login_required
 @user_passes_test(is_full_control_or_admin)
+@barcode_module_required
 def barcode_assign(request):
     """Assign barcodes to user"""
     active_ranges = BarcodeRange.objects.filter(is_active=True)
@@ -541,6 +711,7 @@ def barcode_assign(request):
                         barcode_range.current_number += 1
                     
                     barcode_range.save()
+                    prometheus.BARCODES_ASSIGNED.inc(amount=quantity)
                     
                     log_user_activity(
                         request.user, 'barcode_assign', 
@@ -567,15 +738,41 @@ def barcode_assign(request):
 @login_required
 def api_document_stats(request):
     """API endpoint for document statistics"""
+    total, active = global_counts()
+    project_names = {project.pk: project.name for project in reference_data.all_objects(Project)}
+    type_names = {doc_type.pk: doc_type.name for doc_type in reference_data.all_objects(DocType)}
     stats = {
-        'total': Document.objects.count(),
-        'active': Document.objects.filter(is_active=True).count(),
-        'by_project': list(Document.objects.values('project__name').annotate(count=Count('id'))),
-        'by_type': list(Document.objects.values('doc_type__name').annotate(count=Count('id'))),
+        'total': total,
+        'active': active,
+        'by_project': [
+            {'project__name': project_names.get(pk), 'count': counts[0]}
+            for pk, counts in counts_by('project').items() if counts[0]
+        ],
+        'by_type': [
+            {'doc_type__name': type_names.get(pk), 'count': counts[0]}
+            for pk, counts in counts_by('doc_type').items() if counts[0]
+        ],
     }
+    if is_admin(request.user):
+        stats['result_cache'] = result_cache_stats()
     return JsonResponse(stats)
 
 
+@login_required
+def api_search_suggest(request):
+    """API endpoint for search-as-you-type suggestions"""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', SUGGEST_LIMIT)), 1), 20)
+    except ValueError:
+        limit = SUGGEST_LIMIT
+    
+    return JsonResponse({
+        'query': query,
+        'results': get_suggestions(request.user, query, limit),
+    })
+
+
 @login_required
 @require_http_methods(["POST"])
 def api_batch_edit(request):
@@ -589,19 +786,20 @@ def api_batch_edit(request):
         field = data.get('field')
         value = data.get('value')
         
+        # Resolve the new value once instead of per document
+        reference_models = {'project': Project, 'doc_type': DocType, 'export_control': ExportControl}
+        if field in reference_models and value:
+            value = reference_data.get_object(reference_models[field], value)
+            if value is None:
+                return JsonResponse({'error': f'Unknown {field}'}, status=400)
+        
         documents = Document.objects.filter(id__in=document_ids)
         updated_count = 0
         
         for document in documents:
-            if field == 'project' and value:
-                project = Project.objects.get(id=value)
-                document.project = project
-            elif field == 'doc_type' and value:
-                doc_type = DocType.objects.get(id=value)
-                document.doc_type = doc_type
-            elif field == 'export_control' and value:
-                export_control = ExportControl.objects.get(id=value)
-                document.export_control = export_control
+            if field in reference_models and value:
+                # The cached instance is shared between requests
+                setattr(document, f'{field}_id', value.pk)
             elif field == 'is_active':
                 document.is_active = value
             
@@ -622,42 +820,175 @@ def api_batch_edit(request):
 
 @login_required
 @require_http_methods(["POST"])
+@prometheus.timed_archive('batch_download')
 def batch_download(request):
     """Download multiple documents as ZIP"""
-    import zipfile
-    from io import BytesIO
-    
     document_ids = request.POST.getlist('document_ids')
     if not document_ids:
         return JsonResponse({'success': False, 'message': 'No documents selected'})
     
-    documents = Document.objects.filter(id__in=document_ids)
+    documents = list(Document.objects.filter(id__in=document_ids).select_related('project'))
     
-    # Create ZIP file in memory
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for document in documents:
-            if document.document_file and os.path.exists(document.document_file.path):
-                # Add file to ZIP
-                zip_file.write(
-                    document.document_file.path,
-                    f"{document.project.name}_{document.primary_title}_{document.version}.{document.file_type}"
-                )
+    if archive_jobs.needs_job(documents):
+        job, created = archive_jobs.create_job(documents, request.user)
+        if created:
+            log_user_activity(
+                request.user, 'download', 
+                f'Batch download of {len(documents)} documents as background archive',
+                get_client_ip(request)
+            )
+        return redirect('archive_job', pk=job.pk)
     
-    zip_buffer.seek(0)
+    files = [
+        (document.document_file.path, member_name(document))
+        for document in documents if document.document_file
+    ]
     
     # Log activity
     log_user_activity(
         request.user, 'download', 
-        f'Batch downloaded {documents.count()} documents',
+        f'Batch downloaded {len(files)} documents',
         get_client_ip(request)
     )
     
-    response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
+    # The archive is built while it is sent
+    response = StreamingHttpResponse(stream_zip(files), content_type='application/zip')
     response['Content-Disposition'] = f'attachment; filename="FINDEX_Documents_{timezone.now().strftime("%Y%m%d_%H%M%S")}.zip"'
     return response
 
 
+def _upload_session_state(session):
+    return {
+        'id': session.pk,
+        'filename': session.filename,
+        'size': session.size,
+        'chunk_size': session.chunk_size,
+        'chunk_count': session.chunk_count,
+        'status': session.status,
+        'received': uploads.received_chunks(session),
+        'document_id': session.document_id,
+    }
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_upload_sessions(request):
+    """API endpoint opening a resumable chunked upload"""
+    if not is_editor_or_above(request.user):
+        return JsonResponse({'error': 'Insufficient permissions'}, status=403)
+    
+    try:
+        data = json.loads(request.body)
+        session = uploads.create_session(request.user, data.get('filename'), data.get('size'))
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=400)
+    except uploads.ChunkError as error:
+        return JsonResponse({'success': False, 'message': str(error)}, status=400)
+    return JsonResponse(_upload_session_state(session), status=201)
+
+
+@login_required
+@require_http_methods(["GET", "DELETE"])
+def api_upload_session(request, pk):
+    """API endpoint for the received chunks of an upload; DELETE cancels it"""
+    session = get_object_or_404(UploadSession, pk=pk, created_by=request.user)
+    if request.method == 'DELETE':
+        uploads.discard(session)
+        session.delete()
+        return JsonResponse({'success': True})
+    return JsonResponse(_upload_session_state(session))
+
+
+@login_required
+@require_http_methods(["PUT"])
+def api_upload_chunk(request, pk, index):
+    """API endpoint receiving one chunk, checked against its X-Chunk-Checksum"""
+    session = get_object_or_404(UploadSession, pk=pk, created_by=request.user)
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        uploads.write_chunk(session, index, request, length, request.headers.get('X-Chunk-Checksum'))
+    except uploads.ChunkError as error:
+        return JsonResponse({'success': False, 'message': str(error)}, status=400)
+    return JsonResponse({'success': True, 'index': index, 'offset': index * session.chunk_size})
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_upload_complete(request, pk):
+    """API endpoint creating the document once all chunks arrived"""
+    if not is_editor_or_above(request.user):
+        return JsonResponse({'error': 'Insufficient permissions'}, status=403)
+    
+    with transaction.atomic():
+        session = get_object_or_404(
+            UploadSession.objects.select_for_update(), pk=pk, created_by=request.user
+        )
+        # A repeated request after a lost response gets the same document
+        if session.status == 'complete' and session.document is not None:
+            return _upload_success(session.document)
+        
+        missing = uploads.missing_chunks(session)
+        if missing:
+            return JsonResponse({
+                'success': False,
+                'message': f'{len(missing)} Abschnitte fehlen noch.',
+                'missing': missing,
+            }, status=400)
+        
+        upload = uploads.AssembledFile(session)
+        try:
+            form = DocumentUploadForm(request.POST, {'document_file': upload})
+            if not form.is_valid():
+                return _upload_errors(form)
+            document = _save_upload(request, form)
+        finally:
+            upload.close()
+        
+        session.status = 'complete'
+        session.document = document
+        session.completed_at = timezone.now()
+        session.save(update_fields=['status', 'document', 'completed_at'])
+        transaction.on_commit(lambda: uploads.discard(session))
+    return _upload_success(document)
+
+
+def _archive_jobs(user):
+    """Archive jobs ``user`` may see: their own, staff sees all"""
+    jobs = ArchiveJob.objects.all()
+    return jobs if user.is_staff else jobs.filter(created_by=user)
+
+
+@login_required
+def archive_job(request, pk):
+    """Progress page of a background archive, polling api_archive_job"""
+    job = get_object_or_404(_archive_jobs(request.user), pk=pk)
+    return render(request, 'findexapp/archive_job.html', {'job': job})
+
+
+@login_required
+def api_archive_job(request, pk):
+    """API endpoint for the state of a background archive"""
+    archive_jobs.expire_archives_periodically()
+    job = get_object_or_404(_archive_jobs(request.user), pk=pk)
+    return JsonResponse({
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'processed_files': job.processed_files,
+        'total_files': job.total_files,
+        'archive_size': job.archive_size,
+        'download_url': reverse('archive_job_download', args=[job.pk]) if job.status == 'done' else None,
+        'error': job.error,
+    })
+
+
+@login_required
+def archive_job_download(request, pk):
+    """Download a finished background archive"""
+    job = get_object_or_404(_archive_jobs(request.user), pk=pk, status='done')
+    return downloads.serve_file(request, job.archive_file, content_type='application/zip')
+
+
 @login_required
 @user_passes_test(is_editor_or_above)
 @require_http_methods(["POST"])
@@ -675,7 +1006,9 @@ def batch_edit(request):
         
         # Apply updates
         if request.POST.get('project'):
-            project = get_object_or_404(Project, id=request.POST.get('project'))
+            project = reference_data.get_object(Project, request.POST.get('project'))
+            if project is None:
+                raise Http404('Project not found')
             documents.update(project=project)
             updated_count += 1
         
@@ -685,7 +1018,9 @@ def batch_edit(request):
             updated_count += 1
         
         if request.POST.get('export_control'):
-            export_control = get_object_or_404(ExportControl, id=request.POST.get('export_control'))
+            export_control = reference_data.get_object(ExportControl, request.POST.get('export_control'))
+            if export_control is None:
+                raise Http404('Export control not found')
             documents.update(export_control=export_control)
             updated_count += 1
         
@@ -706,6 +1041,7 @@ def batch_edit(request):
 
 
 @login_required
+@prometheus.timed_archive('export_documents')
 def export_documents(request):
     """Export document list as Excel"""
     try:
@@ -723,7 +1059,7 @@ def export_documents(request):
             data.append({
                 'ID': doc.id,
                 'Dokumenttyp': doc.doc_type.name,
-                'Name': doc.document_file.name if doc.document_file else '',
+                'Name': doc.download_name if doc.document_file else '',
                 'Titel DE': doc.title_de,
                 'Titel EN': doc.title_en,
                 'Titel FR': doc.title_fr,
@@ -776,7 +1112,7 @@ def export_documents(request):
             writer.writerow([
                 doc.id,
                 doc.doc_type.name,
-                doc.document_file.name if doc.document_file else '',
+                doc.download_name if doc.document_file else '',
                 doc.title_de,
                 doc.title_en,
                 doc.title_fr,
@@ -5,10 +5,13 @@ const FINDEX = {
     apiEndpoints: {
         documentStats: '/api/document-stats/',
         batchEdit: '/api/batch-edit/',
+        searchSuggest: '/api/search/suggest/',
     },
     settings: {
         animationDuration: 300,
         toastDuration: 5000,
+        suggestDebounce: 150,
+        suggestMinLength: 2,
     }
 };
 
@@ -123,21 +126,10 @@ function handleFileDrop(e) {
 // Search Functionality
 function initializeSearch() {
     const searchForm = document.getElementById('searchForm');
-    const searchInput = document.querySelector('input[name="search_query"]');
+    const searchInputs = document.querySelectorAll('input[name="search_query"]');
     
-    if (searchInput) {
-        // Real-time search suggestions
-        let searchTimeout;
-        searchInput.addEventListener('input', function() {
-            clearTimeout(searchTimeout);
-            searchTimeout = setTimeout(() => {
-                if (this.value.length >= 3) {
-                    // Implement search suggestions here
-                    console.log('Searching for:', this.value);
-                }
-            }, 300);
-        });
-    }
+    // Real-time search suggestions
+    searchInputs.forEach(searchInput => setupSearchSuggestions(searchInput));
 
     // Advanced search toggle
     const advancedToggle = document.getElementById('advancedSearchToggle');
@@ -158,6 +150,104 @@ function initializeSearch() {
     }
 }
 
+// Search Suggestions
+function setupSearchSuggestions(input) {
+    const cache = new Map();
+    const dropdown = document.createElement('div');
+    dropdown.className = 'list-group search-suggestions d-none';
+    input.parentElement.classList.add('position-relative');
+    input.parentElement.appendChild(dropdown);
+    input.setAttribute('autocomplete', 'off');
+
+    let searchTimeout;
+    let controller;
+
+    input.addEventListener('input', function() {
+        clearTimeout(searchTimeout);
+        const query = this.value.trim();
+
+        if (query.length < FINDEX.settings.suggestMinLength) {
+            hideSuggestions();
+            return;
+        }
+
+        searchTimeout = setTimeout(() => fetchSuggestions(query), FINDEX.settings.suggestDebounce);
+    });
+
+    input.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape') {
+            hideSuggestions();
+        }
+    });
+
+    input.addEventListener('blur', function() {
+        // Delay so clicks on suggestions still register
+        setTimeout(hideSuggestions, 200);
+    });
+
+    async function fetchSuggestions(query) {
+        const key = query.toLowerCase();
+        if (cache.has(key)) {
+            renderSuggestions(cache.get(key));
+            return;
+        }
+
+        // Only the latest keystroke matters
+        if (controller) {
+            controller.abort();
+        }
+        controller = new AbortController();
+
+        try {
+            const url = `${FINDEX.apiEndpoints.searchSuggest}?q=${encodeURIComponent(query)}`;
+            const response = await fetch(url, { signal: controller.signal });
+            if (response.ok) {
+                const data = await response.json();
+                cache.set(key, data.results);
+                if (input.value.trim().toLowerCase() === key) {
+                    renderSuggestions(data.results);
+                }
+            }
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.error('Error loading search suggestions:', error);
+            }
+        }
+    }
+
+    function renderSuggestions(results) {
+        dropdown.innerHTML = '';
+        if (results.length === 0) {
+            hideSuggestions();
+            return;
+        }
+
+        const icons = {
+            document: 'fa-file-alt',
+            barcode: 'fa-barcode',
+            project: 'fa-folder',
+        };
+
+        results.forEach(result => {
+            const item = document.createElement('a');
+            item.className = 'list-group-item list-group-item-action';
+            item.href = result.url;
+
+            const icon = document.createElement('i');
+            icon.className = `fas ${icons[result.type] || 'fa-search'} me-2 text-muted`;
+            item.appendChild(icon);
+            item.appendChild(document.createTextNode(result.label));
+
+            dropdown.appendChild(item);
+        });
+        dropdown.classList.remove('d-none');
+    }
+
+    function hideSuggestions() {
+        dropdown.classList.add('d-none');
+    }
+}
+
 // Form Validation
 function setupFormValidation() {
     const forms = document.querySelectorAll('.needs-validation');